@@ -11,4 +11,17 @@ export function setAuthToken(token) {
   else delete api.defaults.headers.common["Authorization"];
 }
 
+// Server-sent order events; EventSource cannot send headers, so the access
+// token goes in the query string. Returns a function closing the stream.
+export function subscribeToOrderEvents(onEvent) {
+  const auth = api.defaults.headers.common["Authorization"];
+  if (!auth) return () => {};
+  const token = encodeURIComponent(auth.replace("Bearer ", ""));
+  const source = new EventSource(`${API_BASE}api/orders/events/?token=${token}`);
+  ["order.created", "order.status"].forEach((type) =>
+    source.addEventListener(type, (e) => onEvent(JSON.parse(e.data)))
+  );
+  return () => source.close();
+}
+
 export default api;
@@ -1,5 +1,5 @@
 import React, { useEffect, useState, useContext } from "react";
-import api from "../api/api";
+import api, { subscribeToOrderEvents } from "../api/api";
 import { AuthContext } from "../contexts/AuthContext";
 
 export default function AdminDashboard() {
@@ -25,6 +25,9 @@ export default function AdminDashboard() {
   const [loadingUsers, setLoadingUsers] = useState(false);
   const [newSupplier, setNewSupplier] = useState({ username: '', email: '', password: '', first_name: '', last_name: '' });
 
+  // Cursor of the next page for each paginated list
+  const [nextPages, setNextPages] = useState({ products: null, orders: null, users: null });
+
   const { user, logout } = useContext(AuthContext);
 
   useEffect(() => {
@@ -61,15 +64,42 @@ export default function AdminDashboard() {
     }
   }, [user]);
 
+  // Live order updates instead of re-fetching the order list
+  useEffect(() => {
+    if (!user || !user.profile) return;
+    const { role, is_approved } = user.profile;
+    if (role !== 'Admin' && !(role === 'Supplier' && is_approved)) return;
+    return subscribeToOrderEvents((event) => {
+      if (event.type === "order.status") {
+        setOrders(prev => prev.map(o => o.id === event.order.id ? { ...o, status: event.order.status, is_seen: event.order.is_seen } : o));
+      } else if (event.type === "order.created") {
+        api.get(`orders/${event.order.id}/`)
+          .then(res => setOrders(prev => prev.some(o => o.id === res.data.id) ? prev : [res.data, ...prev]))
+          .catch(e => console.error("Error fetching new order", e));
+      }
+    });
+  }, [user]);
+
+  const setNextPage = (list, next) => {
+    setNextPages(prev => ({ ...prev, [list]: next }));
+  };
+
+  const loadMore = (list, setItems) => {
+    api.get(nextPages[list])
+      .then((res) => {
+        setItems(prev => [...prev, ...res.data.results]);
+        setNextPage(list, res.data.next);
+      })
+      .catch((e) => console.error(e));
+  };
+
   const fetchProducts = () => {
+    const params = user && user.profile && user.profile.role === 'Supplier' ? { supplier: user.id } : {};
     api
-      .get("products/")
+      .get("products/", { params })
       .then((res) => {
-        if (user && user.profile && user.profile.role === 'Supplier') {
-          setProducts(res.data.filter(p => p.supplier && p.supplier.id === user.id));
-        } else {
-          setProducts(res.data);
-        }
+        setProducts(res.data.results);
+        setNextPage("products", res.data.next);
       })
       .catch((e) => console.error(e))
       .finally(() => setLoading(false));
@@ -85,15 +115,18 @@ export default function AdminDashboard() {
   const fetchOrders = () => {
     let url = "orders/";
     api.get(url)
-        .then(res => setOrders(res.data))
+        .then(res => {
+            setOrders(res.data.results);
+            setNextPage("orders", res.data.next);
+        })
         .catch(e => console.error("Error fetching orders", e))
         .finally(() => setLoadingOrders(false));
   };
 
   const handleStatusChange = (orderId, newStatus) => {
     api.post(`orders/${orderId}/update_status/`, { status: newStatus })
-        .then(() => {
-            fetchOrders(); // Refresh orders
+        .then(res => {
+            setOrders(prev => prev.map(o => o.id === orderId ? res.data : o));
         })
         .catch(e => {
             console.error("Error updating order status", e);
@@ -220,7 +253,10 @@ export default function AdminDashboard() {
 
   const fetchUsers = () => {
     api.get("users/")
-        .then(res => setUsers(res.data))
+        .then(res => {
+            setUsers(res.data.results);
+            setNextPage("users", res.data.next);
+        })
         .catch(e => console.error("Error fetching users", e))
         .finally(() => setLoadingUsers(false));
   };
@@ -264,7 +300,7 @@ export default function AdminDashboard() {
     if (window.confirm("Are you sure you want to delete this user?")) {
         api.delete(`users/${userId}/delete/`)
             .then(() => {
-                alert("User deleted successfully.");
+                alert("User deactivated; their data is being deleted.");
                 fetchUsers();
             })
             .catch(e => {
@@ -484,6 +520,9 @@ export default function AdminDashboard() {
               ))}
             </tbody>
           </table>
+          {nextPages.products && (
+            <button className="btn-secondary" onClick={() => loadMore("products", setProducts)}>Load more products</button>
+          )}
         </div>
       )}
 
@@ -526,6 +565,9 @@ export default function AdminDashboard() {
                   </tbody>
               </table>
           )}
+          {nextPages.orders && (
+              <button className="btn-secondary" onClick={() => loadMore("orders", setOrders)}>Load more orders</button>
+          )}
         </div>
       )}
 
@@ -580,6 +622,9 @@ export default function AdminDashboard() {
               ))}
             </tbody>
           </table>
+          {nextPages.users && (
+            <button className="btn-secondary" onClick={() => loadMore("users", setUsers)}>Load more users</button>
+          )}
         </div>
       )}
     </div>
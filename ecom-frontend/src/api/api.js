@@ -13,4 +13,19 @@ export function setAuthToken(token) {
 
 export const markOrderAsSeen = (orderId) => api.patch(`/orders/${orderId}/mark_as_seen/`);
 
+export const markAllOrdersAsSeen = () => api.post('/my-orders/mark-all-seen/');
+
+// Server-sent order events; EventSource cannot send headers, so the access
+// token goes in the query string. Returns a function closing the stream.
+export function subscribeToOrderEvents(onEvent) {
+  const auth = api.defaults.headers.common["Authorization"];
+  if (!auth) return () => {};
+  const token = encodeURIComponent(auth.replace("Bearer ", ""));
+  const source = new EventSource(`${API_BASE}api/orders/events/?token=${token}`);
+  ["order.created", "order.status"].forEach((type) =>
+    source.addEventListener(type, (e) => onEvent(JSON.parse(e.data)))
+  );
+  return () => source.close();
+}
+
 export default api;
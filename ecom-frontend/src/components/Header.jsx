@@ -32,19 +32,9 @@ export default function Header() {
   const fetchSuggestions = useCallback((searchQuery) => {
     if (searchQuery.length > 1) {
       setLoadingSuggestions(true);
-      api.get(`/products/search/?q=${searchQuery}`)
+      api.get("/products/suggest/", { params: { q: searchQuery } })
         .then(res => {
-          const products = res.data;
-          const words = new Set();
-          products.forEach(product => {
-            product.name.toLowerCase().split(/\s+/).forEach(word => {
-              const cleanedWord = word.replace(/[^a-z0-9]/gi, '');
-              if(cleanedWord) {
-                words.add(cleanedWord);
-              }
-            });
-          });
-          setSuggestions(Array.from(words));
+          setSuggestions(res.data);
         })
         .catch(err => {
           console.error("Error fetching suggestions", err);
@@ -70,10 +60,9 @@ export default function Header() {
 
   useEffect(() => {
     if (user) {
-      api.get('/my-orders/')
+      api.get('/my-orders/unseen-count/')
         .then(response => {
-          const unseen = response.data.some(order => !order.is_seen);
-          setHasUnseenOrders(unseen);
+          setHasUnseenOrders(response.data.unseen > 0);
         })
         .catch(error => {
           console.error('Error fetching orders for notification:', error);
@@ -1,15 +1,24 @@
 import React from "react";
 import { Link } from "react-router-dom";
 
+// Rendered width of a card image in the catalog grid, for the browser to
+// pick a resized variant from the srcset.
+const CARD_SIZES = "(max-width: 600px) 50vw, 280px";
+
 export default function ProductCard({ product }){
   const imgSrc = product.image ? product.image : "/placeholders/placeholder.png";
- 
+  const srcset = product.srcset || {};
   
   return (
     <div className="card">
       <div className="card-image-container">
         <Link to={`/product/${product.id}`}>
-          <img src={imgSrc} alt={product.name} />
+          <picture>
+            {Object.entries(srcset).map(([type, set]) => (
+              <source key={type} type={type} srcSet={set} sizes={CARD_SIZES} />
+            ))}
+            <img src={imgSrc} alt={product.name} loading="lazy" />
+          </picture>
         </Link>
         {product.stock <= 0 && <div className="out-of-stock-badge">Out of Stock</div>}
       </div>
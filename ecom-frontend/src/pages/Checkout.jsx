@@ -34,7 +34,7 @@ export default function Checkout(){
       // Optionally show a success toast
     } catch (err) {
       console.error(err);
-      alert("Failed to place order. An error occurred.");
+      alert(err.response?.data?.error || "Failed to place order. An error occurred.");
     } finally {
       setLoading(false);
     }
@@ -7,37 +7,43 @@ export default function Home() {
   const [categories, setCategories] = useState([]);
   const [selectedCategory, setSelectedCategory] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [nextPage, setNextPage] = useState(null);
 
   useEffect(() => {
-    setLoading(true);
-    Promise.all([
-        api.get("products/"),
-        api.get("categories/")
-    ]).then(([productsRes, categoriesRes]) => {
-        setProducts(productsRes.data);
-        setCategories(categoriesRes.data);
-    }).catch(err => {
-        console.error("Failed to load data", err);
-    }).finally(() => {
-        setLoading(false);
-    });
+    api.get("categories/")
+      .then(res => setCategories(res.data))
+      .catch(err => console.error("Failed to load categories", err));
   }, []);
 
-  const filteredProducts = selectedCategory
-    ? products.filter((p) => p.category.id === selectedCategory)
-    : products;
+  // The product list is cursor-paginated and filtered by category on the server.
+  useEffect(() => {
+    setLoading(true);
+    api.get("products/", { params: selectedCategory ? { category: selectedCategory } : {} })
+      .then(res => {
+        setProducts(res.data.results);
+        setNextPage(res.data.next);
+      })
+      .catch(err => console.error("Failed to load products", err))
+      .finally(() => setLoading(false));
+  }, [selectedCategory]);
+
+  const loadMore = () => {
+    api.get(nextPage)
+      .then(res => {
+        setProducts(prev => [...prev, ...res.data.results]);
+        setNextPage(res.data.next);
+      })
+      .catch(err => console.error("Failed to load more products", err));
+  };
 
   const renderProducts = () => {
     if (loading) {
       return <p>Loading products...</p>;
     }
     if (products.length === 0) {
-      return <p>No products available.</p>;
-    }
-    if (filteredProducts.length === 0) {
-      return <p>N  this category.</p>;
+      return <p>{selectedCategory ? "No products in this category." : "No products available."}</p>;
     }
-    return filteredProducts.map((p) => <ProductCard key={p.id} product={p} />);
+    return products.map((p) => <ProductCard key={p.id} product={p} />);
   }
 
   return (
@@ -63,6 +69,9 @@ export default function Home() {
       <div className="grid">
         {renderProducts()}
       </div>
+      {nextPage && !loading && (
+        <button onClick={loadMore} className="btn-secondary load-more">Load more</button>
+      )}
     </div>
   );
 }
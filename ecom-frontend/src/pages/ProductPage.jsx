@@ -3,15 +3,20 @@ import { useParams } from "react-router-dom";
 import api from "../api/api";
 import { CartContext } from "../contexts/CartContext";
 import QuantityPicker from "../components/QuantityPicker";
+import ProductCard from "../components/ProductCard";
 
 export default function ProductPage(){
   const { id } = useParams();
   const [product, setProduct] = useState(null);
+  const [related, setRelated] = useState([]);
   const [qty, setQty] = useState(1);
   const { add } = useContext(CartContext);
 
   useEffect(() => {
     api.get(`products/${id}/`).then(res => setProduct(res.data)).catch(()=>{});
+    // Loaded on its own so the product never waits for its recommendations.
+    setRelated([]);
+    api.get(`products/${id}/related/`).then(res => setRelated(res.data)).catch(()=>{});
   }, [id]);
 
   if (!product) return <div className="container">Loading...</div>;
@@ -42,6 +47,15 @@ export default function ProductPage(){
           </div>
         </div>
       </div>
+
+      {related.length > 0 && (
+        <section className="related-products">
+          <h2>Frequently bought together</h2>
+          <div className="grid">
+            {related.map(p => <ProductCard key={p.id} product={p} />)}
+          </div>
+        </section>
+      )}
     </div>
   );
 }
@@ -1,36 +1,55 @@
 import React, { useState, useEffect, useContext } from 'react';
-import api, { markOrderAsSeen } from '../api/api';
+import api, { markAllOrdersAsSeen, subscribeToOrderEvents } from '../api/api';
 import { AuthContext } from '../contexts/AuthContext';
 
 export default function UserProfile() {
   const [orders, setOrders] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextPage, setNextPage] = useState(null);
   const { user } = useContext(AuthContext);
 
+  // Orders are cursor-paginated, newest first; older pages load on demand.
   useEffect(() => {
     if (user) {
       api.get('/my-orders/')
         .then(response => {
-          console.log('Orders fetched:', response.data);
-          setOrders(response.data);
+          setOrders(response.data.results);
+          setNextPage(response.data.next);
           setLoading(false);
-
-          // Mark unseen orders as seen
-          response.data.forEach(order => {
-            if (!order.is_seen) {
-              markOrderAsSeen(order.id)
-                .then(() => console.log(`Order ${order.id} marked as seen`))
-                .catch(error => console.error(`Error marking order ${order.id} as seen:`, error));
-            }
-          });
         })
         .catch(error => {
           console.error('Error fetching orders:', error);
           setLoading(false);
         });
+
+      // Unseen orders may be on any page, so ask the server rather than the first page.
+      api.get('/my-orders/unseen-count/')
+        .then(response => {
+          if (response.data.unseen > 0) return markAllOrdersAsSeen();
+        })
+        .catch(error => console.error('Error marking orders as seen:', error));
     }
   }, [user]);
 
+  const loadMore = () => {
+    api.get(nextPage)
+      .then(response => {
+        setOrders(prev => [...prev, ...response.data.results]);
+        setNextPage(response.data.next);
+      })
+      .catch(error => console.error('Error fetching more orders:', error));
+  };
+
+  // Status changes arrive as server-sent events
+  useEffect(() => {
+    if (!user) return;
+    return subscribeToOrderEvents((event) => {
+      if (event.type === 'order.status') {
+        setOrders(prev => prev.map(order => order.id === event.order.id ? { ...order, status: event.order.status } : order));
+      }
+    });
+  }, [user]);
+
   const getStatusClassName = (status) => {
     switch (status) {
       case 'Pending':
@@ -91,6 +110,9 @@ export default function UserProfile() {
       ) : (
         <p>You have no orders.</p>
       )}
+      {nextPage && (
+        <button onClick={loadMore} className="btn-secondary load-more">Load more</button>
+      )}
     </div>
   );
 }
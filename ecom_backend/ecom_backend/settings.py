@@ -55,7 +55,7 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "store.authentication.ProfileJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
@@ -104,6 +104,73 @@ DATABASES = {
 }
 
 
+# Cache
+# Catalog responses are cached by store.cache; LocMemCache evicts least
+# recently used entries once MAX_ENTRIES is reached. Point STORE_CACHE_ALIAS
+# at a file or redis cache to share entries between processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+STORE_CACHE_ALIAS = 'default'
+STORE_CACHE_TIMEOUT = 300
+
+# Serve compact product/order lists through the values()-based fast path
+# in store.fast instead of DRF serializers.
+STORE_FAST_SERIALIZATION = False
+
+# Seconds store.authentication keeps a JWT user and profile in process
+# memory between requests; 0 loads them on every request.
+STORE_AUTH_CACHE_TTL = 0
+# Users kept in that cache at most, least recently cached evicted first.
+STORE_AUTH_CACHE_USERS = 10000
+
+# Route the product, search, category and my-orders reads to the async
+# views in store.async_views. Only worth it under an ASGI server.
+STORE_ASYNC_VIEWS = False
+
+# Order events (store.events). MemoryBackend only reaches subscribers in
+# the publishing process; use store.events.CacheBackend with a shared
+# cache when running several workers.
+STORE_EVENTS_BACKEND = 'store.events.MemoryBackend'
+# An SSE response ends after this many seconds and the browser reconnects.
+STORE_EVENTS_STREAM_SECONDS = 300
+
+# Product image derivatives (store.images): widths written for each upload.
+STORE_IMAGE_WIDTHS = (160, 320, 640, 1280)
+
+# Background tasks (store.tasks). ThreadPoolBackend runs them in
+# STORE_TASKS_WORKERS threads of each web process; DatabaseBackend queues
+# them in the database for `manage.py run_tasks` workers, which survives
+# restarts.
+STORE_TASKS_BACKEND = 'store.tasks.ThreadPoolBackend'
+STORE_TASKS_WORKERS = 2
+
+# Rows store.deletion removes per transaction when purging a deleted user.
+STORE_DELETE_BATCH = 500
+
+# Rows store.imports validates and upserts per transaction (product import).
+STORE_IMPORT_BATCH = 1000
+
+# Neighbours kept per product by store.recommend (products/{id}/related/).
+STORE_RELATED_TOP_K = 10
+# Orders younger than this many seconds are left to the next build, so
+# ones still committing are not skipped.
+STORE_RELATED_SETTLE = 60
+
+# Media serving (store.media). Behind nginx set STORE_MEDIA_ACCEL = 'nginx'
+# and an internal location at STORE_MEDIA_ACCEL_PREFIX aliased to
+# MEDIA_ROOT; 'sendfile' uses X-Sendfile (Apache, lighttpd). None sends the
+# files from Django. Names without a content hash are cached this long.
+STORE_MEDIA_ACCEL = None
+STORE_MEDIA_ACCEL_PREFIX = '/protected-media/'
+STORE_MEDIA_MAX_AGE = 3600
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
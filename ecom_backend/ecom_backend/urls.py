@@ -1,11 +1,15 @@
 
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from store import media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('store.urls')) 
 ]
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Uploaded media; see store.media for proxy offload and caching headers.
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), media.serve),
+]
\ No newline at end of file
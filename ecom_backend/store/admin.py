@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 
-from .models import Category, Product, Order, OrderItem, Profile
+from .models import BackgroundTask, Category, Product, Order, OrderItem, Profile
 
 # Register your models here.
 
@@ -21,9 +21,14 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ("id","user","created_at","status")
+    list_display = ("id","user","created_at","status","total","item_count")
     inlines = [OrderItemInline]
 
+@admin.register(BackgroundTask)
+class BackgroundTaskAdmin(admin.ModelAdmin):
+    list_display = ("id","name","status","attempts","run_after","created_at")
+    list_filter = ("status",)
+
 class ProfileInline(admin.StackedInline):
     model = Profile
     can_delete = False
@@ -32,6 +37,7 @@ class ProfileInline(admin.StackedInline):
 class UserAdmin(BaseUserAdmin):
     inlines = (ProfileInline,)
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'profile_role', 'profile_approved')
+    list_select_related = ('profile',)
 
     def profile_role(self, obj):
         return obj.profile.role
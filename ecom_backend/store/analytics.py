@@ -0,0 +1,172 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Category, Order, OrderItem, Product, SalesRollup, StatusRollup
+
+# Sales analytics for the admin and supplier dashboards.
+#
+# Reports never read the orders. Two rollup tables hold the numbers instead:
+# SalesRollup has orders, units and revenue per day and supplier, overall
+# and per category and per product; StatusRollup has the number of orders
+# in each status per supplier. A report is a GROUP BY over rollup rows
+# (days x suppliers x categories or products), however long the order
+# history is.
+#
+# place_order and the update_status action add to the rollups in the
+# order's transaction, with one INSERT ... ON CONFLICT DO UPDATE statement
+# each. Other writes (admin edits, purged users' orders) are not followed;
+# `manage.py rebuild_analytics` recomputes both tables from the orders
+# with a handful of INSERT ... SELECT ... GROUP BY statements.
+
+# report group: (SalesRollup dimension, column grouped by)
+GROUPS = {
+    "day": ("order", "day"),
+    "supplier": ("order", "supplier_id"),
+    "category": ("category", "key"),
+    "product": ("product", "key"),
+}
+
+LINE_REVENUE = ExpressionWrapper(F("quantity") * F("price"), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def upsert(model, conflict, rows):
+    """
+    Add ``rows`` (dicts of the conflict columns plus increments) to
+    ``model``'s table: a new row per unseen key, otherwise the increments
+    are added to the stored counts.
+    """
+    if not rows:
+        return
+    table = model._meta.db_table
+    columns = list(rows[0])
+    increments = [column for column in columns if column not in conflict]
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET "
+        + ", ".join(f"{column} = {table}.{column} + excluded.{column}" for column in increments)
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [[row[column] for column in columns] for row in rows])
+
+
+def record_order(order, items):
+    """Count a new ``order`` with its ``items`` (OrderItems with products loaded)."""
+    day, supplier = timezone.localdate(order.created_at), order.supplier_id or 0
+    rows = {("order", 0): {"units": order.item_count, "revenue": order.total}}
+    for item in items:
+        # place_order merges repeated products, so each key is one order.
+        for key in (("category", item.product.category_id), ("product", item.product_id)):
+            row = rows.setdefault(key, {"units": 0, "revenue": Decimal(0)})
+            row["units"] += item.quantity
+            row["revenue"] += item.quantity * item.price
+    upsert(SalesRollup, ["dimension", "supplier_id", "key", "day"], [
+        {"dimension": dimension, "supplier_id": supplier, "key": key, "day": day, "orders": 1, **counts}
+        for (dimension, key), counts in rows.items()
+    ])
+    upsert(StatusRollup, ["supplier_id", "status"], [{"supplier_id": supplier, "status": order.status, "orders": 1}])
+
+
+def record_status_change(order, previous):
+    """Move ``order`` from status ``previous`` to its current one."""
+    if previous == order.status:
+        return
+    supplier = order.supplier_id or 0
+    upsert(StatusRollup, ["supplier_id", "status"], [
+        {"supplier_id": supplier, "status": previous, "orders": -1},
+        {"supplier_id": supplier, "status": order.status, "orders": 1},
+    ])
+
+
+def names(group, ids):
+    if group == "supplier":
+        return dict(User.objects.filter(pk__in=ids).values_list("pk", "username"))
+    model = Category if group == "category" else Product
+    return dict(model.objects.filter(pk__in=ids).values_list("pk", "name"))
+
+
+def sales_report(group, start=None, end=None, supplier_id=None, limit=50):
+    """
+    Orders, units and revenue per ``group`` (a GROUPS key) between the
+    dates ``start`` and ``end`` (inclusive), for one supplier or all. Days
+    come most recent first, the other groups by revenue.
+    """
+    dimension, column = GROUPS[group]
+    rollups = SalesRollup.objects.filter(dimension=dimension)
+    if start:
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        rollups = rollups.filter(day__lte=end)
+    if supplier_id is not None:
+        rollups = rollups.filter(supplier_id=supplier_id)
+    rows = list(rollups.values(column).annotate(
+        total_orders=Sum("orders"), total_units=Sum("units"), total_revenue=Sum("revenue"),
+    ).order_by("-day" if group == "day" else "-total_revenue", column)[:limit])
+
+    labels = {} if group == "day" else names(group, [row[column] for row in rows])
+    return [{
+        **({"day": row["day"]} if group == "day" else {"id": row[column] or None, "name": labels.get(row[column])}),
+        "orders": row["total_orders"], "units": row["total_units"], "revenue": row["total_revenue"],
+    } for row in rows]
+
+
+def status_funnel(supplier_id=None):
+    """Number of orders in each status, in the order of Order.STATUS_CHOICES."""
+    rollups = StatusRollup.objects.all()
+    if supplier_id is not None:
+        rollups = rollups.filter(supplier_id=supplier_id)
+    counts = dict(rollups.values_list("status").annotate(total=Sum("orders")))
+    return {status: counts.get(status, 0) for status, _ in Order.STATUS_CHOICES}
+
+
+def insert_from(queryset, model, selected, constants=None):
+    """
+    One INSERT ... SELECT into ``model`` from ``queryset``, a values()
+    aggregate: ``selected`` maps columns to the names the queryset selects
+    them under, ``constants`` columns to fixed values. The database both
+    computes and writes the rows; none pass through Python.
+    """
+    constants = constants or {}
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {model._meta.db_table} ({', '.join([*constants, *selected])}) "
+            f"SELECT {', '.join(['%s'] * len(constants) + list(selected.values()))} FROM ({sql}) rollup",
+            [*constants.values(), *params],
+        )
+        return cursor.rowcount
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute both rollup tables from the orders; returns the rows written per table."""
+    SalesRollup.objects.all().delete()
+    StatusRollup.objects.all().delete()
+    sums = {"supplier_id": "supplier_key", "day": "day", "orders": "orders", "units": "units", "revenue": "revenue"}
+
+    orders = Order.objects.annotate(
+        supplier_key=Coalesce("supplier_id", Value(0)), day=TruncDate("created_at"),
+    ).values("supplier_key", "day").annotate(
+        orders=Count("pk"), units=Sum("item_count"), revenue=Sum("total"),
+    ).order_by()
+    written = {"sales": insert_from(orders, SalesRollup, sums, {"dimension": "order", "key": 0})}
+    for dimension, key in (("category", "product__category_id"), ("product", "product_id")):
+        items = OrderItem.objects.annotate(
+            supplier_key=Coalesce("order__supplier_id", Value(0)), day=TruncDate("order__created_at"),
+            key=Coalesce(key, Value(0)),
+        ).values("supplier_key", "day", "key").annotate(
+            orders=Count("order_id", distinct=True), units=Sum("quantity"), revenue=Sum(LINE_REVENUE),
+        ).order_by()
+        written["sales"] += insert_from(items, SalesRollup, {**sums, "key": "key"}, {"dimension": dimension})
+
+    statuses = Order.objects.annotate(supplier_key=Coalesce("supplier_id", Value(0))).values(
+        "supplier_key", "status"
+    ).annotate(orders=Count("pk")).order_by()
+    written["status"] = insert_from(
+        statuses, StatusRollup, {"supplier_id": "supplier_key", "status": "status", "orders": "orders"},
+    )
+    return written
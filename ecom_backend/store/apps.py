@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        # Register the signal handlers that keep search indexes and cached
+        # responses in sync with the catalog, the auth cache in sync with
+        # users and profiles, and image derivatives in sync with uploads.
+        from . import authentication, cache, images, search, suggest  # noqa: F401
@@ -0,0 +1,235 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.urls import path
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.request import Request
+
+from . import fast
+from .authentication import ProfileJWTAuthentication
+from .cache import acached_data
+from .conditional import acollection_validators, adetail_validators
+from .models import Category, Order, Product
+from .pagination import CreatedAtCursorPagination, SearchPagination
+from .queries import order_queryset, product_queryset
+from .search import get_search_backend
+from .serializers import CategorySerializer, OrderSerializer, ProductSerializer
+from .views import CategoryViewSet, ProductSearchView, ProductViewSet, UserOrderListView
+
+# Async variants of the read endpoints for ASGI deployments
+# (STORE_ASYNC_VIEWS). Under an ASGI server every sync DRF view runs in a
+# worker thread; these run on the event loop and only hop to a thread for
+# each query through the async ORM. Pagination, caching, conditional GET
+# and serialization reuse the sync code paths, so responses are the same
+# bytes. Other methods on the same URLs fall through to the DRF views.
+
+
+class PendingQuery(Exception):
+    def __init__(self, key, run):
+        self.key = key
+        self.run = run
+
+
+class PageQuery:
+    """
+    Stands in for a queryset while a DRF paginator works out its page. The
+    first time the paginator counts or slices, the real query is handed
+    back to be awaited; the paginator is then run again with the answer.
+    """
+
+    def __init__(self, queryset, answers):
+        self.queryset = queryset
+        self.answers = answers
+
+    def order_by(self, *fields):
+        return PageQuery(self.queryset.order_by(*fields), self.answers)
+
+    def filter(self, *args, **kwargs):
+        return PageQuery(self.queryset.filter(*args, **kwargs), self.answers)
+
+    def count(self):
+        if "count" not in self.answers:
+            raise PendingQuery("count", self.queryset.acount)
+        return self.answers["count"]
+
+    def __getitem__(self, bounds):
+        if "rows" not in self.answers:
+            raise PendingQuery("rows", functools.partial(fetch, self.queryset[bounds]))
+        return self.answers["rows"]
+
+
+async def fetch(queryset):
+    return [row async for row in queryset]
+
+
+async def paginate(paginator, queryset, request):
+    """Run ``paginator`` over ``queryset`` with its queries awaited."""
+    answers = {}
+    while True:
+        try:
+            return paginator.paginate_queryset(PageQuery(queryset, answers), request)
+        except PendingQuery as pending:
+            answers[pending.key] = await pending.run()
+
+
+async def page_data(paginator, queryset, request, serialize):
+    page = await paginate(paginator, queryset, request)
+    if page is None:
+        return serialize(await fetch(queryset))
+    return paginator.get_paginated_response(serialize(page)).data
+
+
+def json_response(data, status=200):
+    response = HttpResponse(fast.dumps(data), content_type="application/json", status=status)
+    response["Vary"] = "Accept"
+    return response
+
+
+def error_response(exc):
+    # The body DRF's default exception handler would render.
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = json_response(data, status=exc.status_code)
+    if exc.status_code == 401:
+        response["WWW-Authenticate"] = ProfileJWTAuthentication().authenticate_header(None)
+    return response
+
+
+def read_view(fallback):
+    """
+    Serve GET/HEAD with the decorated coroutine and every other method with
+    the sync ``fallback`` view.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+            try:
+                return await view(Request(request), *args, **kwargs)
+            except APIException as exc:
+                return error_response(exc)
+        # DRF enforces CSRF itself for session-authenticated requests.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def cached_conditional(request, validators, generations, produce):
+    """The async counterpart of conditional_response + cached_response."""
+    etag, last_modified = validators
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified["ETag"] = etag
+        return not_modified
+    data, hit = await acached_data(request, generations, produce)
+    response = json_response(data)
+    response["X-Cache"] = "HIT" if hit else "MISS"
+    if etag:
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def compact(request):
+    return not request.query_params.get("expand")
+
+
+def serializer(serializer_class, request):
+    context = {"request": request, "compact": True}
+    return lambda rows: serializer_class(rows, many=True, context=context).data
+
+
+def product_list_data(queryset, request, paginator):
+    if fast.enabled(request):
+        return page_data(paginator, fast.product_values(queryset), request, lambda rows: fast.serialize_products(rows, request))
+    return page_data(paginator, product_queryset(queryset, compact=compact(request)), request, serializer(ProductSerializer, request))
+
+
+@read_view(ProductViewSet.as_view({"get": "list", "post": "create"}))
+async def product_list(request):
+    queryset = Product.objects.order_by("-created_at")
+    category = request.query_params.get("category")
+    supplier = request.query_params.get("supplier")
+    if category and category.isdigit():
+        queryset = queryset.filter(category_id=category)
+    if supplier and supplier.isdigit():
+        queryset = queryset.filter(supplier_id=supplier)
+    return await cached_conditional(
+        request,
+        await acollection_validators(queryset, request, ("product",)),
+        ("product", "category"),
+        lambda: product_list_data(queryset, request, CreatedAtCursorPagination()),
+    )
+
+
+@read_view(ProductViewSet.as_view({"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"}))
+async def product_detail(request, pk):
+    async def produce():
+        product = await product_queryset().filter(pk=pk).afirst()
+        if product is None:
+            raise NotFound("No Product matches the given query.")
+        return ProductSerializer(product, context={"request": request}).data
+
+    validators = await adetail_validators(Product, pk, request, ("product",))
+    if validators == (None, None):
+        raise NotFound("No Product matches the given query.")
+    return await cached_conditional(request, validators, ("product", "category"), produce)
+
+
+@read_view(ProductSearchView.as_view())
+async def product_search(request):
+    query = request.query_params.get("q", "")
+    # The first call may introspect the database, so it runs in a thread.
+    backend = await sync_to_async(get_search_backend)()
+    queryset = backend.search(query) if query else Product.objects.none()
+    return await cached_conditional(
+        request, (None, None), ("product", "category"),
+        lambda: product_list_data(queryset, request, SearchPagination()),
+    )
+
+
+@read_view(CategoryViewSet.as_view({"get": "list", "post": "create"}))
+async def category_list(request):
+    queryset = Category.objects.all()
+
+    async def produce():
+        return CategorySerializer(await fetch(queryset), many=True, context={"request": request}).data
+
+    return await cached_conditional(
+        request, await acollection_validators(queryset, request, ("category",)), ("category",), produce,
+    )
+
+
+@read_view(UserOrderListView.as_view())
+async def my_orders(request):
+    authenticated = await ProfileJWTAuthentication().aauthenticate(request)
+    if authenticated is None:
+        raise NotAuthenticated()
+    request.user = authenticated[0]
+    queryset = Order.objects.filter(user=request.user).order_by("-created_at")
+    paginator = CreatedAtCursorPagination()
+
+    if fast.enabled(request):
+        async def build(rows):
+            items = await fetch(fast.order_item_values([row["id"] for row in rows]))
+            return fast.build_orders(rows, items, request)
+
+        page = await paginate(paginator, fast.order_values(queryset), request)
+        return json_response(paginator.get_paginated_response(await build(page)).data)
+    data = await page_data(
+        paginator, order_queryset(queryset, compact(request)), request, serializer(OrderSerializer, request),
+    )
+    return json_response(data)
+
+
+urlpatterns = [
+    path("products/", product_list),
+    path("products/search/", product_search),
+    path("products/<int:pk>/", product_detail),
+    path("categories/", category_list),
+    path("my-orders/", my_orders),
+]
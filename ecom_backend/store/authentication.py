@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import Profile
+
+# JWT authentication that loads the user and their profile in one joined
+# query, so permissions and views can read request.user.profile for free.
+#
+# With STORE_AUTH_CACHE_TTL > 0 the loaded rows are also kept in a
+# process-local cache keyed on (user id, token iat) for that many seconds.
+# Ids are keyed as strings since that is how simplejwt puts them in tokens.
+# Caching a token drops the user's expired tokens, and the cache holds at
+# most STORE_AUTH_CACHE_USERS users, evicting the least recently cached, so
+# its size follows active users rather than logins. Saving or deleting the user or profile drops their entries in this
+# process; other worker processes see the change once the TTL runs out.
+
+AuthContext = namedtuple("AuthContext", "is_authenticated is_staff role is_approved")
+
+ANONYMOUS = AuthContext(False, False, None, False)
+
+_users = OrderedDict()
+_lock = threading.Lock()
+
+
+def _snapshot(user):
+    profile = getattr(user, "profile", None)
+    return (
+        user._state.db,
+        tuple(getattr(user, field.attname) for field in User._meta.concrete_fields),
+        tuple(getattr(profile, field.attname) for field in Profile._meta.concrete_fields) if profile else None,
+    )
+
+
+def _restore(snapshot):
+    # Fresh instances on every hit, so requests never share mutable state.
+    db, user_values, profile_values = snapshot
+    user = User.from_db(db, [field.attname for field in User._meta.concrete_fields], user_values)
+    if profile_values is None:
+        User.profile.related.set_cached_value(user, None)
+    else:
+        user.profile = Profile.from_db(db, [field.attname for field in Profile._meta.concrete_fields], profile_values)
+    return user
+
+
+def cached_user(user_id, issued_at):
+    entry = _users.get(str(user_id), {}).get(issued_at)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return _restore(entry[1])
+
+
+def cache_user(user, issued_at, ttl):
+    now = time.monotonic()
+    with _lock:
+        tokens = {iat: entry for iat, entry in _users.pop(str(user.pk), {}).items() if entry[0] >= now}
+        tokens[issued_at] = (now + ttl, _snapshot(user))
+        _users[str(user.pk)] = tokens
+        while len(_users) > getattr(settings, "STORE_AUTH_CACHE_USERS", 10000):
+            _users.popitem(last=False)
+
+
+def invalidate(user_id):
+    with _lock:
+        _users.pop(str(user_id), None)
+
+
+def clear():
+    with _lock:
+        _users.clear()
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that selects the profile along with the user."""
+
+    def get_user(self, validated_token):
+        user = self.cached_user(validated_token)
+        if user is None:
+            try:
+                user = User.objects.select_related("profile").get(**self.user_lookup(validated_token))
+            except User.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            self.cache_user(user, validated_token)
+        return self.check_user(user, validated_token)
+
+    async def aget_user(self, validated_token):
+        """get_user for async views, querying through the async ORM."""
+        user = self.cached_user(validated_token)
+        if user is None:
+            try:
+                user = await User.objects.select_related("profile").aget(**self.user_lookup(validated_token))
+            except User.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            self.cache_user(user, validated_token)
+        return self.check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def user_lookup(self, validated_token):
+        try:
+            return {api_settings.USER_ID_FIELD: validated_token[api_settings.USER_ID_CLAIM]}
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def cached_user(self, validated_token):
+        if not getattr(settings, "STORE_AUTH_CACHE_TTL", 0):
+            return None
+        return cached_user(self.user_lookup(validated_token)[api_settings.USER_ID_FIELD], validated_token.get("iat"))
+
+    def cache_user(self, user, validated_token):
+        ttl = getattr(settings, "STORE_AUTH_CACHE_TTL", 0)
+        if ttl:
+            cache_user(user, validated_token.get("iat"), ttl)
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+class QueryTokenJWTAuthentication(ProfileJWTAuthentication):
+    """
+    Reads the access token from ?token=, for clients that cannot set an
+    Authorization header (EventSource). Only enable it on such endpoints:
+    URLs end up in access logs.
+    """
+
+    def authenticate(self, request):
+        raw_token = request.query_params.get("token")
+        if not raw_token:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return self.get_user(validated_token), validated_token
+
+
+def auth_context(request):
+    """
+    Role and approval of the requesting user, computed once per request.
+    Reads the profile the authenticator already joined in; users without a
+    profile get role None.
+    """
+    context = getattr(request, "_store_auth_context", None)
+    if context is None:
+        user = request.user
+        if not (user and user.is_authenticated):
+            context = ANONYMOUS
+        else:
+            profile = getattr(user, "profile", None)
+            context = AuthContext(
+                True,
+                user.is_staff,
+                profile.role if profile else None,
+                profile.is_approved if profile else False,
+            )
+        request._store_auth_context = context
+    return context
+
+
+def is_approved_supplier(context):
+    return context.role == "Supplier" and context.is_approved
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate(instance.user_id)
@@ -0,0 +1,762 @@
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Category, Product
+
+# Benchmark scenarios for `manage.py benchmark`. Every scenario seeds its own
+# data inside a transaction that is rolled back, so it can be pointed at a
+# development database without leaving rows behind. Scenarios registered
+# with atomic=False serve requests from other threads, which could not see
+# uncommitted rows; they commit their data and delete it again.
+
+SCENARIOS = {}
+
+WORDS = (
+    "phone laptop tablet case charger cable wireless gaming mouse keyboard monitor "
+    "ultra pro mini max lite red blue black white steel leather cotton shirt jacket "
+    "shoe running trail camera lens tripod speaker headphone studio desk chair lamp"
+).split()
+
+# Brand/model-like tokens so generated names are not all made of the same
+# few dozen words; these keep query selectivity close to a real catalog.
+SYLLABLES = "ka ze ro mi tu va lo pe si na gu de fo ri xa be no qu ta le".split()
+BRANDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+
+def scenario(name, atomic=True):
+    def register(func):
+        func.atomic = atomic
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def run(name, sizes, out):
+    func = SCENARIOS[name]
+    if not func.atomic:
+        try:
+            func(sizes, out)
+        finally:
+            delete_seeded()
+        return
+    with transaction.atomic():
+        func(sizes, out)
+        transaction.set_rollback(True)
+
+
+def timed(func, repeat):
+    """Call ``func`` ``repeat`` times and return the timings in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    return f"p50={statistics.median(timings):.2f}ms p99={p99:.2f}ms"
+
+
+def measured(func):
+    """Run ``func`` once and return (milliseconds, peak traced memory in MiB)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = (time.perf_counter() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def seed_products(count, batch_size=5000):
+    """Top the catalog up to ``count`` generated products and return it."""
+    supplier, _ = User.objects.get_or_create(username="benchmark-supplier")
+    categories = [
+        Category.objects.get_or_create(slug=f"benchmark-{word}", defaults={"name": word.title()})[0]
+        for word in WORDS[:8]
+    ]
+    rng = random.Random(count)
+    existing = Product.objects.filter(slug__startswith="benchmark-").count()
+    for start in range(existing, count, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, count)):
+            name = " ".join([rng.choice(BRANDS), *rng.sample(WORDS, 2)])
+            batch.append(Product(
+                supplier=supplier, category=categories[i % len(categories)], name=name,
+                slug=f"benchmark-{i}", description=" ".join(rng.sample(WORDS, 12)),
+                price=Decimal(rng.randint(100, 100000)) / 100, stock=rng.randint(0, 500),
+            ))
+        Product.objects.bulk_create(batch)
+    return categories
+
+
+def delete_seeded():
+    Product.objects.filter(slug__startswith="benchmark-").delete()
+    Category.objects.filter(slug__startswith="benchmark-").delete()
+    User.objects.filter(username="benchmark-supplier").delete()
+
+
+@scenario("search")
+def search_benchmark(sizes, out):
+    from .search import BasicSearchBackend, get_search_backend
+
+    indexed, basic = get_search_backend(), BasicSearchBackend()
+    rng = random.Random(0)
+    queries = [f"{rng.choice(BRANDS)} {rng.choice(WORDS)}" for _ in range(50)]
+    for size in sizes:
+        seed_products(size)
+        indexed.rebuild()
+        for label, backend in (("indexed", indexed), ("icontains", basic)):
+            it = iter(queries * 2)
+            timings = timed(lambda: list(backend.search(next(it))[:20].values_list("id", flat=True)), len(queries))
+            out.write(f"search size={size} backend={label} {summarize(timings)}")
+
+
+@scenario("suggest")
+def suggest_benchmark(sizes, out):
+    from . import suggest
+
+    rng = random.Random(0)
+    prefixes = [rng.choice(BRANDS + WORDS)[:rng.randint(2, 5)] for _ in range(1000)]
+    for size in sizes:
+        seed_products(size)
+        suggest.invalidate()
+        build = timed(suggest.get_index, 1)[0]
+        it = iter(prefixes)
+        timings = timed(lambda: suggest.suggest(next(it)), len(prefixes))
+        out.write(f"suggest size={size} build={build:.0f}ms lookup {summarize(timings)}")
+
+
+@scenario("pagination")
+def pagination_benchmark(sizes, out):
+    from rest_framework.test import APIRequestFactory
+
+    from .queries import product_queryset
+    from .serializers import ProductSerializer
+    from .views import ProductViewSet
+
+    factory = APIRequestFactory(SERVER_NAME="localhost")
+    view = ProductViewSet.as_view({"get": "list"})
+
+    def page(depth):
+        response = view(factory.get("/api/products/"))
+        for _ in range(depth):
+            response = view(factory.get(response.data["next"]))
+        return response.data
+
+    for size in sizes:
+        seed_products(size)
+        for label, func in (
+            ("full-dump", lambda: ProductSerializer(product_queryset(), many=True).data),
+            ("cursor-page-1", lambda: page(0)),
+            ("cursor-page-10", lambda: page(9)),
+        ):
+            elapsed, peak = measured(func)
+            out.write(f"pagination size={size} {label} time={elapsed:.1f}ms peak={peak:.1f}MiB")
+
+
+@scenario("conditional")
+def conditional_benchmark(sizes, out):
+    from rest_framework.test import APIRequestFactory
+
+    from .cache import generation_key, get_cache, get_generation
+    from .views import ProductViewSet
+
+    factory = APIRequestFactory(SERVER_NAME="localhost")
+    list_view = ProductViewSet.as_view({"get": "list"})
+    detail_view = ProductViewSet.as_view({"get": "retrieve"})
+
+    def fetch(view, url, etag=None, **kwargs):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        response = view(factory.get(url, **headers), **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    def drop_cached_responses():
+        # Measure the uncached path while keeping the generations (and so
+        # the ETags) stable.
+        generations = {name: get_generation(name) for name in ("product", "category")}
+        get_cache().clear()
+        for name, value in generations.items():
+            get_cache().set(generation_key(name), value, timeout=None)
+
+    for size in sizes:
+        seed_products(size)
+        product_id = Product.objects.values_list("id", flat=True).first()
+        for label, view, url, kwargs in (
+            ("list", list_view, "/api/products/", {}),
+            ("detail", detail_view, f"/api/products/{product_id}/", {"pk": product_id}),
+        ):
+            etag = fetch(view, url, **kwargs)["ETag"]
+            for mode, tag in (("200", None), ("304", etag)):
+                responses = []
+
+                def request():
+                    drop_cached_responses()
+                    responses.append(fetch(view, url, tag, **kwargs))
+
+                timings = timed(request, 50)
+                size_bytes = len(responses[-1].content)
+                out.write(
+                    f"conditional size={size} {label} status={mode} bytes={size_bytes} {summarize(timings)}"
+                )
+
+
+@scenario("serializers")
+def serializer_benchmark(sizes, out):
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from .queries import product_queryset
+    from .serializers import ProductSerializer
+
+    request = Request(APIRequestFactory(SERVER_NAME="localhost").get("/api/products/"))
+    for size in sizes:
+        seed_products(size)
+        for label, compact in (("full", False), ("compact", True)):
+            rendered = []
+
+            def serialize():
+                queryset = product_queryset(compact=compact)[:size]
+                data = ProductSerializer(queryset, many=True, context={"request": request, "compact": compact}).data
+                rendered.append(JSONRenderer().render(data))
+
+            elapsed = timed(serialize, 3)
+            out.write(
+                f"serializers size={size} {label} bytes={len(rendered[-1])} "
+                f"rows/s={size / (min(elapsed) / 1000):.0f} {summarize(elapsed)}"
+            )
+
+
+@scenario("fast-serialization")
+def fast_serialization_benchmark(sizes, out):
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from . import fast
+    from .queries import product_queryset
+    from .serializers import ProductSerializer
+
+    request = Request(APIRequestFactory(SERVER_NAME="localhost").get("/api/products/"))
+    context = {"request": request, "compact": True}
+    paths = {
+        "drf": lambda size: JSONRenderer().render(
+            ProductSerializer(product_queryset(compact=True)[:size], many=True, context=context).data
+        ),
+        "fast": lambda size: fast.FastJSONRenderer().render(
+            fast.serialize_products(fast.product_values(product_queryset())[:size], request)
+        ),
+    }
+    for size in sizes:
+        seed_products(size)
+        for label, render in paths.items():
+            elapsed = timed(lambda: render(size), 3)
+            out.write(f"fast-serialization size={size} {label} rows/s={size / (min(elapsed) / 1000):.0f} {summarize(elapsed)}")
+
+
+@scenario("export")
+def export_benchmark(sizes, out):
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from . import exports, fast
+    from .queries import product_queryset
+
+    request = Request(APIRequestFactory(SERVER_NAME="localhost").get("/api/products/export/"))
+
+    def consume(response):
+        for _ in response.streaming_content:
+            pass
+
+    paths = {
+        "in-memory": lambda: fast.dumps(fast.serialize_products(fast.product_values(product_queryset()), request)),
+        "ndjson": lambda: consume(exports.export_response(
+            exports.product_objects(product_queryset(), request), exports.product_csv_rows, "ndjson", "products"
+        )),
+        "csv": lambda: consume(exports.export_response(
+            exports.product_objects(product_queryset(), request), exports.product_csv_rows, "csv", "products"
+        )),
+    }
+    for size in sizes:
+        seed_products(size)
+        for label, export in paths.items():
+            elapsed, peak = measured(export)
+            out.write(f"export size={size} {label} rows/s={size / (elapsed / 1000):.0f} peak={peak:.1f}MiB")
+
+
+@scenario("asgi", atomic=False)
+def asgi_benchmark(sizes, out):
+    import asyncio
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+    from urllib.parse import urlsplit
+
+    from django.core.handlers.asgi import ASGIHandler
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import override_settings
+    from django.urls import include, path
+
+    from . import async_views, urls
+
+    class AsyncURLConf:
+        urlpatterns = [path("api/", include(async_views.urlpatterns + urls.urlpatterns))]
+
+    def wsgi_request(handler, url):
+        parts = urlsplit(url)
+        environ = {
+            "REQUEST_METHOD": "GET", "PATH_INFO": parts.path, "QUERY_STRING": parts.query,
+            "SERVER_NAME": "localhost", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+            "wsgi.input": io.BytesIO(), "wsgi.url_scheme": "http",
+        }
+        statuses = []
+        start = time.perf_counter()
+        response = handler(environ, lambda status, headers: statuses.append(int(status[:3])))
+        b"".join(response)
+        response.close()
+        return (time.perf_counter() - start) * 1000, statuses[0]
+
+    async def asgi_request(handler, url):
+        parts = urlsplit(url)
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http",
+            "method": "GET", "path": parts.path, "query_string": parts.query.encode(),
+            "headers": [(b"host", b"localhost")], "server": ("localhost", 80),
+        }
+        disconnected = asyncio.Event()
+        requested = False
+        statuses = []
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                disconnected.set()
+
+        start = time.perf_counter()
+        await handler(scope, receive, send)
+        return (time.perf_counter() - start) * 1000, statuses[0]
+
+    def run_wsgi(urls_, concurrency):
+        handler = WSGIHandler()
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(lambda url: wsgi_request(handler, url), urls_))
+
+    async def run_asgi(urls_, concurrency):
+        handler = ASGIHandler()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(url):
+            async with slots:
+                return await asgi_request(handler, url)
+
+        return await asyncio.gather(*(one(url) for url in urls_))
+
+    rng = random.Random(0)
+    # STORE_CACHE_TIMEOUT=0 keeps every request on the query path.
+    with override_settings(STORE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=["localhost"]):
+        for size in sizes:
+            categories = seed_products(size)
+            ids = list(Product.objects.filter(slug__startswith="benchmark-").values_list("id", flat=True)[:1000])
+            mix = []
+            for _ in range(400):
+                mix.append(rng.choice([
+                    f"/api/products/?page_size=20&category={rng.choice(categories).id}",
+                    f"/api/products/{rng.choice(ids)}/",
+                    "/api/categories/",
+                ]))
+            for concurrency in (1, 8, 64):
+                for mode, urlconf, drive in (
+                    ("wsgi", None, lambda: run_wsgi(mix, concurrency)),
+                    ("asgi-sync", None, lambda: asyncio.run(run_asgi(mix, concurrency))),
+                    ("asgi-async", AsyncURLConf, lambda: asyncio.run(run_asgi(mix, concurrency))),
+                ):
+                    overrides = {"ROOT_URLCONF": urlconf} if urlconf else {}
+                    with override_settings(**overrides):
+                        start = time.perf_counter()
+                        results = drive()
+                        elapsed = time.perf_counter() - start
+                    errors = sum(status != 200 for _, status in results)
+                    out.write(
+                        f"asgi size={size} concurrency={concurrency} mode={mode} rps={len(mix) / elapsed:.0f} "
+                        f"{summarize([timing for timing, _ in results])} errors={errors}"
+                    )
+
+
+@scenario("images")
+def image_benchmark(sizes, out):
+    import io
+    import tempfile
+
+    from django.core.files.base import ContentFile
+    from django.test import override_settings
+    from PIL import Image, ImageFilter
+
+    from . import images
+
+    def photo(width, seed):
+        # Smooth gradients plus grain compress roughly like a product photo.
+        height = width * 3 // 4
+        channels = [
+            Image.linear_gradient("L").rotate(seed * 40 + 90 * i).resize((width, height)) for i in range(3)
+        ]
+        grain = Image.effect_noise((width, height), 24).convert("RGB")
+        image = Image.blend(Image.merge("RGB", channels), grain, 0.15).filter(ImageFilter.GaussianBlur(1))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=90)
+        return buffer.getvalue()
+
+    page = 20
+    with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+        seed_products(page)
+        products = list(Product.objects.filter(slug__startswith="benchmark-")[:page])
+        for size in sizes:
+            originals, timings = 0, []
+            for i, product in enumerate(products):
+                data = photo(size, i)
+                originals += len(data)
+                product.image.save(f"benchmark-{size}-{i}.jpg", ContentFile(data))
+                timings.extend(timed(lambda: images.process(product.id, product.image.name), 1))
+            variants = list(Product.objects.filter(pk__in=[p.id for p in products]).values_list("image_variants", flat=True))
+
+            def page_bytes(mime, width):
+                # The variant a browser picks from the srcset for a ``width`` px slot.
+                total = 0
+                for entry in variants:
+                    candidates = entry[mime]
+                    path = next((path for w, path in candidates if w >= width), candidates[-1][1])
+                    total += images.storage().size(path)
+                return total
+
+            sizes_kib = " ".join(
+                f"{label}={total / 1024:.0f}KiB" for label, total in (
+                    ("original", originals),
+                    ("jpeg-320", page_bytes("image/jpeg", 320)),
+                    ("webp-320", page_bytes("image/webp", 320)),
+                    ("webp-640", page_bytes("image/webp", 640)),
+                )
+            )
+            out.write(f"images source={size}px page={page} {sizes_kib} derive {summarize(timings)}")
+
+
+@scenario("media")
+def media_benchmark(sizes, out):
+    import os
+    import tempfile
+
+    from django.test import RequestFactory, override_settings
+    from django.views import static
+
+    from . import media
+
+    factory = RequestFactory()
+
+    def fetch(view, headers, **kwargs):
+        response = view(factory.get("/media/file.bin", headers=headers), "file.bin", **kwargs)
+        body = b"".join(response)
+        response.close()
+        return len(body)
+
+    with tempfile.TemporaryDirectory() as root, override_settings(MEDIA_ROOT=root):
+        for size in sizes:
+            with open(os.path.join(root, "file.bin"), "wb") as file:
+                file.write(os.urandom(size * 1024))
+            etag = media.serve(factory.get("/media/file.bin"), "file.bin")["ETag"]
+            for label, view, headers, kwargs in (
+                ("static", static.serve, {}, {"document_root": root}),
+                ("media", media.serve, {}, {}),
+                ("media-304", media.serve, {"If-None-Match": etag}, {}),
+                ("media-range-64k", media.serve, {"Range": "bytes=0-65535"}, {}),
+            ):
+                timed(lambda: fetch(view, headers, **kwargs), 20)  # warm up
+                sent = []
+                timings = timed(lambda: sent.append(fetch(view, headers, **kwargs)), 200)
+                seconds = sum(timings) / 1000
+                out.write(
+                    f"media size={size}KiB {label} rps={len(timings) / seconds:.0f} "
+                    f"throughput={sum(sent) / seconds / 2 ** 20:.0f}MiB/s {summarize(timings)}"
+                )
+
+
+@scenario("user-delete")
+def user_delete_benchmark(sizes, out):
+    from .deletion import purge_user
+    from .models import Order, OrderItem, UserDeletion
+
+    for size in sizes:
+        seed_products(size)
+        supplier = User.objects.get(username="benchmark-supplier")
+        customer, _ = User.objects.get_or_create(username="benchmark-customer")
+        products = list(Product.objects.filter(supplier=supplier).values_list("id", "price"))
+        Order.objects.bulk_create([Order(user=customer, supplier=supplier) for _ in range(size // 2)], batch_size=5000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=order_id, product_id=products[(i + line) % len(products)][0], quantity=1,
+                      price=products[(i + line) % len(products)][1])
+            for i, order_id in enumerate(Order.objects.filter(supplier=supplier).values_list("id", flat=True))
+            for line in range(2)
+        ], batch_size=5000)
+
+        def collector():
+            with transaction.atomic():
+                User.objects.get(pk=supplier.pk).delete()
+                transaction.set_rollback(True)
+
+        batches = []
+
+        def batched():
+            with transaction.atomic():
+                deletion = UserDeletion.objects.create(user_id=supplier.pk, username=supplier.username)
+                last = time.perf_counter()
+
+                def lap(step, count):
+                    nonlocal last
+                    now = time.perf_counter()
+                    batches.append((now - last) * 1000)
+                    last = now
+
+                purge_user(deletion, on_batch=lap)
+                transaction.set_rollback(True)
+
+        for label, func in (("collector", collector), ("batched", batched)):
+            elapsed, peak = measured(func)
+            longest = max(batches) if label == "batched" else elapsed
+            out.write(
+                f"user-delete products={size} orders={size // 2} {label} time={elapsed:.0f}ms "
+                f"longest-transaction={longest:.1f}ms peak={peak:.1f}MiB"
+            )
+
+
+@scenario("slugs")
+def slug_benchmark(sizes, out):
+    from django.db import connection
+    from django.utils.text import slugify
+
+    from .serializers import ProductSerializer
+
+    supplier, _ = User.objects.get_or_create(username="benchmark-supplier")
+    category = seed_products(0)[0]
+    data = {"name": "Benchmark Tee", "price": "9.99", "stock": 1, "category_id": category.pk}
+
+    def create():
+        serializer = ProductSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(supplier=supplier)
+
+    def legacy():
+        # The exists() loop ProductSerializer used before store.slugs.
+        slug, counter = slugify(data["name"]), 1
+        while Product.objects.filter(slug=slug).exists():
+            slug, counter = f"{slugify(data['name'])}-{counter}", counter + 1
+        return slug
+
+    def counting(execute, *args):
+        executed[0] += 1
+        return execute(*args)
+
+    executed, inserted = [0], 0
+    with connection.execute_wrapper(counting):
+        for size in sizes:
+            timings, queries = [], 0
+            while inserted < size:
+                executed[0] = 0
+                timings.extend(timed(create, 1))
+                queries = max(queries, executed[0])
+                inserted += 1
+            executed[0] = 0
+            legacy_ms = timed(legacy, 1)[0]
+            out.write(
+                f"slugs same-name={size} allocator {summarize(timings)} max-queries/insert={queries} | "
+                f"legacy next slug {legacy_ms:.0f}ms queries={executed[0]}"
+            )
+
+
+@scenario("import")
+def import_benchmark(sizes, out):
+    import csv
+    import io
+    import json
+
+    from django.db import reset_queries
+
+    from .imports import import_products, read_records
+    from .serializers import ProductSerializer
+
+    supplier, _ = User.objects.get_or_create(username="benchmark-supplier")
+    categories = seed_products(0)
+
+    def rows(count, price):
+        rng = random.Random(count)
+        for i in range(count):
+            yield {
+                "name": " ".join([rng.choice(BRANDS), *rng.sample(WORDS, 2)]), "slug": f"benchmark-import-{i}",
+                "description": " ".join(rng.sample(WORDS, 12)), "price": price, "stock": rng.randint(0, 500),
+                "category": categories[i % len(categories)].slug,
+            }
+
+    def ndjson(count, price):
+        for row in rows(count, price):
+            yield (json.dumps(row) + "\n").encode()
+
+    def csv_lines(count, price):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, ["name", "slug", "description", "price", "stock", "category"])
+        writer.writeheader()
+        for row in rows(count, price):
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+        yield buffer.getvalue().encode()
+
+    for size in sizes:
+        passes = (
+            ("ndjson insert", "ndjson", ndjson(size, "9.99")),
+            ("csv upsert", "csv", csv_lines(size, "8.99")),
+            ("ndjson upsert traced", "ndjson", ndjson(size, "7.99")),
+        )
+        for label, import_type, lines in passes:
+            reports = []
+
+            def run_import():
+                # With DEBUG on, the query log would keep every batch INSERT.
+                reports.append(import_products(
+                    read_records(lines, import_type), supplier, on_batch=lambda report: reset_queries(),
+                ))
+
+            if label.endswith("traced"):
+                # tracemalloc slows the import several times; only memory counts here.
+                elapsed, peak = measured(run_import)
+                out.write(f"import rows={size} {label} peak={peak:.1f}MiB")
+                continue
+            elapsed = timed(run_import, 1)[0]
+            report = reports[0]
+            out.write(
+                f"import rows={size} {label} time={elapsed:.0f}ms rate={size / elapsed * 1000:.0f} rows/s "
+                f"created={report.created} updated={report.updated} failed={report.failed}"
+            )
+
+    # The per-product POST path, for scale.
+    sample = list(rows(500, "9.99"))
+    for row in sample:
+        row.update(slug=None, name=f"{row['name']} single", category_id=categories[0].pk)
+
+    def one_by_one():
+        for row in sample:
+            serializer = ProductSerializer(data=row)
+            serializer.is_valid(raise_exception=True)
+            serializer.save(supplier=supplier)
+
+    elapsed = timed(one_by_one, 1)[0]
+    out.write(f"import serializer create one-by-one rate={len(sample) / elapsed * 1000:.0f} rows/s")
+
+
+@scenario("analytics")
+def analytics_benchmark(sizes, out):
+    from datetime import timedelta
+
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncDate
+    from django.utils import timezone
+
+    from . import analytics
+    from .models import Order, OrderItem
+
+    customer, _ = User.objects.get_or_create(username="benchmark-customer")
+    for size in sizes:
+        # size order lines over size / 2 orders, spread over a year
+        seed_products(max(1000, size // 100))
+        supplier = User.objects.get(username="benchmark-supplier")
+        products = list(Product.objects.filter(supplier=supplier).values_list("id", "price"))
+        existing = Order.objects.filter(user=customer).count()
+        orders = Order.objects.bulk_create(
+            [Order(user=customer, supplier=supplier) for _ in range(existing, size // 2)], batch_size=5000,
+        )
+        now = timezone.now()
+        for day in range(365):
+            Order.objects.filter(pk__in=[order.pk for order in orders[day::365]]).update(
+                created_at=now - timedelta(days=day)
+            )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=products[(i * 7 + line) % len(products)][0], quantity=1 + line,
+                      price=products[(i * 7 + line) % len(products)][1])
+            for i, order in enumerate(orders) for line in range(2)
+        ], batch_size=5000)
+        Order.objects.filter(user=customer).refresh_totals()
+
+        elapsed = timed(analytics.rebuild, 1)[0]
+        out.write(f"analytics lines={size} rebuild time={elapsed:.0f}ms")
+        last_month = timezone.localdate() - timedelta(days=30)
+        for group in analytics.GROUPS:
+            timings = timed(lambda: analytics.sales_report(group, start=last_month), 20)
+            out.write(f"analytics lines={size} rollup group={group} {summarize(timings)}")
+        direct = OrderItem.objects.filter(order__created_at__date__gte=last_month).values(
+            day=TruncDate("order__created_at")
+        ).annotate(orders=Count("order_id", distinct=True), units=Sum("quantity"), revenue=Sum(analytics.LINE_REVENUE))
+        timings = timed(lambda: list(direct.order_by("-day")[:50]), 5)
+        out.write(f"analytics lines={size} direct from OrderItem group=day {summarize(timings)}")
+
+
+@scenario("related")
+def related_benchmark(sizes, out):
+    from django.db import reset_queries
+    from django.test import override_settings
+
+    from . import recommend
+    from .models import CoPurchase, Order, OrderItem, RelatedProduct
+
+    customer, _ = User.objects.get_or_create(username="benchmark-customer")
+
+    def place(lines, rng, products):
+        # orders of 1-5 lines; a few products sell far more than the rest
+        placed = 0
+        while placed < lines:
+            orders = Order.objects.bulk_create([Order(user=customer) for _ in range(2000)])
+            items = []
+            for order in orders:
+                for product in {products[int(len(products) * rng.random() ** 3)] for _ in range(rng.randint(1, 5))}:
+                    items.append(OrderItem(order=order, product_id=product, quantity=1, price=Decimal("1.00")))
+            OrderItem.objects.bulk_create(items, batch_size=5000)
+            placed += len(items)
+            reset_queries()
+        return placed
+
+    for size in sizes:
+        seed_products(max(1000, size // 100))
+        products = list(Product.objects.filter(slug__startswith="benchmark-").values_list("id", flat=True))
+        rng = random.Random(size)
+        lines = OrderItem.objects.filter(order__user=customer).count()
+        if lines < size:
+            place(size - lines, rng, products)
+
+        # Count the orders just seeded rather than waiting for them to settle.
+        settle = override_settings(STORE_RELATED_SETTLE=0)
+        elapsed = timed(settle(lambda: recommend.build(full=True)), 1)[0]
+        out.write(
+            f"related lines={size} products={len(products)} full build time={elapsed:.0f}ms "
+            f"pairs={CoPurchase.objects.count()} neighbours={RelatedProduct.objects.count()}"
+        )
+        added = place(size // 100, rng, products)
+        elapsed = timed(settle(recommend.build), 1)[0]
+        out.write(f"related lines={size} incremental build of {added} new lines time={elapsed:.0f}ms")
+        sample = rng.sample(products, 200)
+        timings = timed(lambda: list(recommend.related_products(rng.choice(sample)).values("id", "name")), 200)
+        out.write(f"related lines={size} lookup {summarize(timings)}")
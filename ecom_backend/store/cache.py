@@ -0,0 +1,153 @@
+import functools
+import hashlib
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.http import urlencode
+from rest_framework.response import Response
+
+from .models import Category, Order, Product, Profile
+
+# Read-through cache for the anonymous catalog endpoints.
+#
+# Every cached response is keyed on the generation counters of the models
+# it was built from, so a write only has to bump a counter: entries built
+# from older generations are never looked up again and age out of the
+# cache through its own eviction (LocMemCache is LRU). Writers bump once
+# their transaction commits (bump_on_commit).
+#
+# STORE_CACHE_ALIAS picks the cache from settings.CACHES, so the same code
+# runs on local memory, the file backend or redis.
+
+stats = Counter()
+
+
+def get_cache():
+    return caches[getattr(settings, "STORE_CACHE_ALIAS", "default")]
+
+
+def generation_key(name):
+    return f"store:generation:{name}"
+
+
+def get_generation(name):
+    cache = get_cache()
+    generation = cache.get(generation_key(name))
+    if generation is None:
+        # Seed from the clock so a counter that was evicted never comes back
+        # with a value an older entry was stored under.
+        cache.add(generation_key(name), time.time_ns() // 1000, timeout=None)
+        generation = cache.get(generation_key(name))
+    return generation
+
+
+def bump_generation(name):
+    cache = get_cache()
+    try:
+        cache.incr(generation_key(name))
+    except ValueError:
+        cache.add(generation_key(name), time.time_ns() // 1000, timeout=None)
+
+
+def bump_on_commit(name):
+    """
+    bump_generation once the current transaction commits (at once outside
+    one). Bumping earlier lets a reader see the new generation with the
+    old rows and cache them under it.
+    """
+    transaction.on_commit(lambda: bump_generation(name))
+
+
+def response_key(request, generations):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    digest = hashlib.md5(f"{request.get_host()}{request.path}?{params}".encode()).hexdigest()
+    versions = ":".join(str(get_generation(name)) for name in generations)
+    return f"store:response:{versions}:{digest}"
+
+
+def cached_response(*generations):
+    """
+    Cache the data of a successful DRF response under the current
+    generations of ``generations`` (e.g. "product", "category").
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            cache = get_cache()
+            key = response_key(request, generations)
+            data = cache.get(key)
+            if data is not None:
+                stats["hits"] += 1
+                return Response(data, headers={"X-Cache": "HIT"})
+            stats["misses"] += 1
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, getattr(settings, "STORE_CACHE_TIMEOUT", 300))
+            response["X-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
+
+
+async def acached_data(request, generations, produce):
+    """
+    cached_response for the async views: return ``(data, hit)``, awaiting
+    ``produce()`` on a miss. Entries are shared with the sync views.
+    """
+    cache = get_cache()
+    key = response_key(request, generations)
+    data = cache.get(key)
+    if data is not None:
+        stats["hits"] += 1
+        return data, True
+    stats["misses"] += 1
+    data = await produce()
+    cache.set(key, data, getattr(settings, "STORE_CACHE_TIMEOUT", 300))
+    return data, False
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, **kwargs):
+    bump_on_commit("product")
+
+
+def unseen_orders_generation(user_id):
+    # Per-customer counter behind the unseen-order count and its ETag.
+    return f"unseen-orders:{user_id}"
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance, **kwargs):
+    if instance.user_id is not None:
+        bump_on_commit(unseen_orders_generation(instance.user_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    bump_on_commit("category")
+
+
+# User columns that appear in product responses (UserSerializer).
+SUPPLIER_FIELDS = {"username", "email", "first_name", "last_name", "is_staff", "is_superuser"}
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Profile)
+def supplier_changed(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # Product responses embed the supplier and their profile. A user that
+    # was just created supplies nothing yet, and writes such as last_login
+    # or password updates do not touch what is embedded.
+    if raw or (sender is User and (created or (update_fields and not SUPPLIER_FIELDS & set(update_fields)))):
+        return
+    user_id = instance.user_id if sender is Profile else instance.pk
+    if Product.objects.filter(supplier_id=user_id).exists():
+        bump_on_commit("product")
@@ -0,0 +1,107 @@
+import functools
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, urlencode
+
+from .cache import get_generation
+from .models import Category
+
+# Conditional GET for catalog resources. Validators are derived from
+# updated_at columns (plus the cache generation, which also moves when an
+# embedded supplier changes) so a request carrying a current ETag or
+# If-Modified-Since gets a 304 before anything is serialized.
+#
+# Collections only get an ETag: their latest updated_at does not move
+# when a row is deleted, an embedded supplier changes or two writes land
+# in the same second, so a Last-Modified would let If-Modified-Since
+# revalidate a list that changed.
+
+
+def make_validators(request, parts, last_modified, generations=()):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    versions = [get_generation(name) for name in generations]
+    digest = hashlib.sha1(repr((request.path, params, parts, versions)).encode()).hexdigest()
+    return quote_etag(digest), int(last_modified.timestamp()) if last_modified else None
+
+
+def collection_validators(view, request, generations):
+    """Validators for a list: row count and latest update of the filtered queryset."""
+    queryset = view.filter_queryset(view.get_queryset()).order_by()
+    parts = queryset.aggregate(count=Count("pk"), last=Max("updated_at"))
+    if has_category(queryset.model):
+        # Categories are few; taking the latest of all of them avoids a join
+        # over the product table.
+        parts["category_last"] = Category.objects.aggregate(last=Max("updated_at"))["last"]
+    return collection_result(request, parts, generations)
+
+
+async def acollection_validators(queryset, request, generations):
+    """collection_validators for the async views, given the filtered queryset."""
+    queryset = queryset.order_by()
+    parts = await queryset.aaggregate(count=Count("pk"), last=Max("updated_at"))
+    if has_category(queryset.model):
+        parts["category_last"] = (await Category.objects.aaggregate(last=Max("updated_at")))["last"]
+    return collection_result(request, parts, generations)
+
+
+def has_category(model):
+    return any(field.name == "category" for field in model._meta.fields)
+
+
+def collection_result(request, parts, generations):
+    return make_validators(request, sorted(parts.items()), None, generations)
+
+
+def detail_validators(view, request, generations):
+    """Validators for a single row: its own and its category's updated_at."""
+    model = view.get_queryset().model
+    try:
+        row = model.objects.filter(pk=view.kwargs[view.lookup_field]).values_list(*detail_fields(model)).first()
+    except ValueError:
+        row = None
+    return detail_result(request, row, generations)
+
+
+async def adetail_validators(model, pk, request, generations):
+    """detail_validators for the async views."""
+    try:
+        row = await model.objects.filter(pk=pk).values_list(*detail_fields(model)).afirst()
+    except ValueError:
+        row = None
+    return detail_result(request, row, generations)
+
+
+def detail_fields(model):
+    return ["updated_at", "category__updated_at"] if has_category(model) else ["updated_at"]
+
+
+def detail_result(request, row, generations):
+    if row is None:
+        return None, None
+    return make_validators(request, row, max(row), generations)
+
+
+def conditional_response(validators, *generations):
+    """
+    Answer GETs with 304 (carrying the ETag) when the client's validators
+    are current and stamp ETag/Last-Modified on full responses. ``validators`` is one of the
+    functions above.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            etag, last_modified = validators(self, request, generations)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                not_modified["ETag"] = etag
+                return not_modified
+            response = method(self, request, *args, **kwargs)
+            if etag and response.status_code == 200:
+                response["ETag"] = etag
+                if last_modified:
+                    response["Last-Modified"] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
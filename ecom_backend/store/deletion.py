@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import router, transaction
+from django.utils import timezone
+
+from . import images, suggest
+from .cache import bump_on_commit, unseen_orders_generation
+from .models import Order, OrderItem, Product, RelatedProduct
+from .search import get_search_backend
+
+# Chunked deletion of a user and everything that cascades from them.
+#
+# user.delete() runs Django's collector: it loads every product, supplier
+# order and order item of the user into memory and deletes them in one
+# transaction, which holds the SQLite write lock for as long as that takes.
+# Here each step instead walks its rows STORE_DELETE_BATCH ids at a time,
+# every batch in its own short transaction, deleting with plain
+# DELETE ... WHERE id IN (...) statements. The signal handlers those skip
+# (search index, suggestions, cache generations, image files) are run by
+# hand.
+#
+# Every step only looks at the rows that are still there, so a purge that
+# was interrupted picks up where it stopped when run again. Rows handled
+# per step are recorded on the UserDeletion as progress.
+
+
+def batch_size():
+    return getattr(settings, "STORE_DELETE_BATCH", 500)
+
+
+def raw_delete(queryset):
+    """One DELETE statement: no collector, no signals, nothing loaded."""
+    return queryset._raw_delete(router.db_for_write(queryset.model))
+
+
+def delete_supplier_orders(ids):
+    # Items go first, in the same transaction, so an order placed after the
+    # user was disabled cannot leave dangling items behind.
+    raw_delete(OrderItem.objects.filter(order_id__in=ids))
+    customers = set(Order.objects.filter(pk__in=ids, user__isnull=False).values_list("user_id", flat=True))
+    raw_delete(Order.objects.filter(pk__in=ids))
+    for customer in customers:
+        bump_on_commit(unseen_orders_generation(customer))
+
+
+def delete_products(ids):
+    # Items in other suppliers' orders keep their line, as on_delete=SET_NULL would.
+    OrderItem.objects.filter(product_id__in=ids).update(product=None)
+    get_search_backend().remove_products(ids)
+    files = set()
+    for image, variants in Product.objects.filter(pk__in=ids).values_list("image", "image_variants"):
+        files |= images.files_of(image, variants)
+    raw_delete(RelatedProduct.objects.filter(product_id__in=ids))
+    raw_delete(RelatedProduct.objects.filter(related_id__in=ids))
+    raw_delete(Product.objects.filter(pk__in=ids))
+    if files:
+        images.remove_files.delay(sorted(files))
+    suggest.invalidate()
+    bump_on_commit("product")
+    bump_on_commit("related")
+
+
+def detach_customer_orders(ids):
+    Order.objects.filter(pk__in=ids).update(user=None)
+
+
+# (name, rows still to handle, what to do with a batch of their ids)
+STEPS = (
+    ("supplier_orders", lambda user_id: Order.objects.filter(supplier_id=user_id), delete_supplier_orders),
+    ("products", lambda user_id: Product.objects.filter(supplier_id=user_id), delete_products),
+    ("customer_orders", lambda user_id: Order.objects.filter(user_id=user_id), detach_customer_orders),
+)
+
+
+def purge_user(deletion, on_batch=None):
+    """
+    Run ``deletion`` to the end. ``on_batch(step, count)`` is called after
+    every committed batch.
+    """
+    deletion.status = "Running"
+    deletion.save(update_fields=["status", "updated_at"])
+    for step, remaining, handle in STEPS:
+        while True:
+            with transaction.atomic():
+                ids = list(remaining(deletion.user_id).order_by("pk").values_list("pk", flat=True)[:batch_size()])
+                if not ids:
+                    break
+                handle(ids)
+                deletion.progress[step] = deletion.progress.get(step, 0) + len(ids)
+                deletion.save(update_fields=["progress", "updated_at"])
+            if on_batch:
+                on_batch(step, len(ids))
+
+    with transaction.atomic():
+        # What is left cascades to a handful of rows (profile, admin log).
+        User.objects.filter(pk=deletion.user_id).delete()
+        deletion.status, deletion.finished_at = "Done", timezone.now()
+        deletion.save(update_fields=["status", "finished_at", "updated_at"])
+    if on_batch:
+        on_batch("user", 1)
+    return deletion
@@ -0,0 +1,236 @@
+import asyncio
+import functools
+import json
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework.renderers import BaseRenderer
+
+# Order events pushed to dashboards and customers (see OrderEventsView).
+#
+# Publishers hand an event and the channels it belongs to ("user:<id>",
+# "supplier:<id>", "staff") to the hub; every event gets an increasing
+# sequence number, which is also the SSE event id, so a client that
+# reconnects with Last-Event-ID gets what it missed while the event is
+# still buffered. STORE_EVENTS_BACKEND picks the backend:
+#
+# - MemoryBackend keeps a ring buffer in process memory. Publishers and
+#   subscribers must live in the same process (single-node deployments).
+# - CacheBackend writes events to the STORE_CACHE_ALIAS cache, so every
+#   worker sharing that cache (redis, memcached, file) sees them. Tests run
+#   it against local memory.
+
+
+class BaseEventBackend:
+    # Whether calls may block on I/O; the ASGI stream then runs them in a thread.
+    blocking_io = True
+
+    def publish(self, channels, event):
+        """Store ``event`` for ``channels`` and return its sequence number."""
+        raise NotImplementedError
+
+    def read(self, channels, after):
+        """Return the (seq, event) pairs after ``after`` on any of ``channels``."""
+        raise NotImplementedError
+
+    def last(self):
+        """Sequence number of the latest event."""
+        raise NotImplementedError
+
+    def wait(self, after, timeout):
+        """Block until an event newer than ``after`` may exist, or ``timeout`` runs out."""
+        time.sleep(min(timeout, getattr(settings, "STORE_EVENTS_POLL_INTERVAL", 0.5)))
+
+
+class MemoryBackend(BaseEventBackend):
+    blocking_io = False
+
+    def __init__(self, size=None):
+        self.events = deque(maxlen=size or getattr(settings, "STORE_EVENTS_BUFFER", 1000))
+        self.seq = 0
+        self.condition = threading.Condition()
+
+    def publish(self, channels, event):
+        with self.condition:
+            self.seq += 1
+            self.events.append((self.seq, frozenset(channels), event))
+            self.condition.notify_all()
+            return self.seq
+
+    def read(self, channels, after):
+        with self.condition:
+            # Newest events are on the right; stop at the first one already seen.
+            matches = []
+            for seq, targets, event in reversed(self.events):
+                if seq <= after:
+                    break
+                if targets & channels:
+                    matches.append((seq, event))
+        return matches[::-1]
+
+    def last(self):
+        return self.seq
+
+    def wait(self, after, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq > after, timeout)
+
+
+class CacheBackend(BaseEventBackend):
+    prefix = "store:events"
+
+    def __init__(self, alias=None, size=None):
+        self.cache = caches[alias or getattr(settings, "STORE_CACHE_ALIAS", "default")]
+        self.size = size or getattr(settings, "STORE_EVENTS_BUFFER", 1000)
+        self.timeout = getattr(settings, "STORE_EVENTS_TIMEOUT", 300)
+
+    def publish(self, channels, event):
+        self.cache.add(f"{self.prefix}:seq", 0, timeout=None)
+        seq = self.cache.incr(f"{self.prefix}:seq")
+        self.cache.set(f"{self.prefix}:{seq}", (sorted(channels), event), self.timeout)
+        return seq
+
+    def read(self, channels, after):
+        last = self.last()
+        start = max(after, last - self.size)
+        keys = [f"{self.prefix}:{seq}" for seq in range(start + 1, last + 1)]
+        stored = self.cache.get_many(keys)
+        newest = max((int(key.rsplit(":", 1)[1]) for key in stored), default=0)
+        matches = []
+        for seq in range(start + 1, last + 1):
+            entry = stored.get(f"{self.prefix}:{seq}")
+            if entry is None:
+                if seq > newest:
+                    # Sequence taken but not written yet; pick it up next read.
+                    break
+                continue  # expired
+            targets, event = entry
+            if channels.intersection(targets):
+                matches.append((seq, event))
+        return matches
+
+    def last(self):
+        return self.cache.get(f"{self.prefix}:seq") or 0
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend():
+    return import_string(getattr(settings, "STORE_EVENTS_BACKEND", "store.events.MemoryBackend"))()
+
+
+def channels_for(user, context):
+    """The channels a user may listen on, from their auth context."""
+    channels = {f"user:{user.id}"}
+    if context.role == "Supplier":
+        channels.add(f"supplier:{user.id}")
+    if context.is_staff:
+        channels.add("staff")
+    return frozenset(channels)
+
+
+def publish_order(order, event_type):
+    """Publish ``event_type`` for ``order`` once the current transaction commits."""
+    event = {
+        "type": event_type,
+        "order": {
+            "id": order.id,
+            "status": order.status,
+            "is_seen": order.is_seen,
+            "user": order.user_id,
+            "supplier": order.supplier_id,
+        },
+    }
+    channels = {"staff"}
+    if order.user_id is not None:
+        channels.add(f"user:{order.user_id}")
+    if order.supplier_id is not None:
+        channels.add(f"supplier:{order.supplier_id}")
+    transaction.on_commit(lambda: get_backend().publish(channels, event))
+
+
+def poll(channels, after, timeout):
+    """Long-poll fallback: wait up to ``timeout`` seconds for events after ``after``."""
+    backend = get_backend()
+    deadline = time.monotonic() + timeout
+    while True:
+        seen = backend.last()
+        events = backend.read(channels, after)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            return events
+        backend.wait(seen, remaining)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets clients send Accept: text/event-stream. The stream itself is a
+    StreamingHttpResponse; only error bodies are rendered, as JSON.
+    """
+    media_type = "text/event-stream"
+    format = "event-stream"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+def format_event(seq, event):
+    return f"id: {seq}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+def stream(channels, after, duration):
+    """
+    SSE body for WSGI servers: pending events, then new ones as they are
+    published, with a comment line as heartbeat. Ends after ``duration``
+    seconds; EventSource reconnects with Last-Event-ID.
+    """
+    backend = get_backend()
+    heartbeat = getattr(settings, "STORE_EVENTS_HEARTBEAT", 15)
+    deadline = time.monotonic() + duration
+    idle_since = time.monotonic()
+    yield f"retry: {getattr(settings, 'STORE_EVENTS_RETRY_MS', 3000)}\n\n".encode()
+    while True:
+        seen = backend.last()
+        events = backend.read(channels, after)
+        for seq, event in events:
+            after = seq
+            yield format_event(seq, event)
+        now = time.monotonic()
+        if now >= deadline:
+            return
+        if events:
+            idle_since = now
+        elif now - idle_since >= heartbeat:
+            idle_since = now
+            yield b": keep-alive\n\n"
+        backend.wait(seen, min(heartbeat - (now - idle_since), deadline - now))
+
+
+async def astream(channels, after, duration):
+    """The same stream for ASGI servers; waiting never holds a thread."""
+    backend = get_backend()
+    heartbeat = getattr(settings, "STORE_EVENTS_HEARTBEAT", 15)
+    interval = getattr(settings, "STORE_EVENTS_POLL_INTERVAL", 0.5)
+    deadline = time.monotonic() + duration
+    idle_since = time.monotonic()
+    yield f"retry: {getattr(settings, 'STORE_EVENTS_RETRY_MS', 3000)}\n\n".encode()
+    read = sync_to_async(backend.read, thread_sensitive=False) if backend.blocking_io else None
+    while True:
+        events = await read(channels, after) if read else backend.read(channels, after)
+        for seq, event in events:
+            after = seq
+            yield format_event(seq, event)
+        now = time.monotonic()
+        if now >= deadline:
+            return
+        if events:
+            idle_since = now
+        elif now - idle_since >= heartbeat:
+            idle_since = now
+            yield b": keep-alive\n\n"
+        await asyncio.sleep(min(interval, deadline - now))
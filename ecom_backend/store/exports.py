@@ -0,0 +1,105 @@
+import csv
+import io
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+
+from . import fast
+
+# Streaming exports for the product and order viewsets. Rows are read with
+# iterator(chunk_size=...) and turned into NDJSON or CSV lines one chunk at
+# a time, so memory stays flat however many rows the queryset matches.
+# Each NDJSON line is the same object the list endpoints return.
+
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+PRODUCT_CSV_HEADER = [
+    "id", "name", "slug", "description", "price", "stock", "image",
+    "category_id", "category_name", "supplier_id", "supplier_username",
+]
+
+ORDER_CSV_HEADER = [
+    "order_id", "created_at", "status", "is_seen", "user_id", "user_email", "order_total",
+    "item_id", "product_id", "product_name", "quantity", "price", "subtotal",
+]
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def product_objects(queryset, request):
+    to_dict = fast.compile_product_mapper(request)
+    for row in fast.product_values(queryset).iterator(chunk_size=CHUNK_SIZE):
+        yield to_dict(row)
+
+
+def order_objects(queryset, request):
+    # Orders are pulled in chunks so each chunk's items load in one query.
+    rows = fast.order_values(queryset).iterator(chunk_size=CHUNK_SIZE)
+    for chunk in chunks(rows, CHUNK_SIZE):
+        yield from fast.serialize_orders(chunk, request)
+
+
+def product_csv_rows(products):
+    yield PRODUCT_CSV_HEADER
+    for product in products:
+        category, supplier = product["category"], product["supplier"] or {}
+        yield [
+            product["id"], product["name"], product["slug"], product["description"], product["price"],
+            product["stock"], product["image"] or "", category["id"], category["name"],
+            supplier.get("id", ""), supplier.get("username", ""),
+        ]
+
+
+def order_csv_rows(orders):
+    # One line per order item; orders without items still get a line.
+    yield ORDER_CSV_HEADER
+    for order in orders:
+        user = order["user"] or {}
+        head = [
+            order["id"], order["created_at"], order["status"], order["is_seen"],
+            user.get("id", ""), user.get("email", ""), order["total"],
+        ]
+        for item in order["items"] or [{}]:
+            product = item.get("product") or {}
+            yield head + [
+                item.get("id", ""), product.get("id", ""), product.get("name", ""),
+                item.get("quantity", ""), item.get("price", ""), item.get("subtotal", ""),
+            ]
+
+
+def ndjson_lines(objects):
+    for obj in objects:
+        yield fast.dumps(obj) + b"\n"
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for chunk in chunks(rows, 500):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_response(objects, csv_rows, export_type, filename):
+    if export_type == "csv":
+        lines = csv_lines(csv_rows(objects))
+    else:
+        export_type = "ndjson"
+        lines = ndjson_lines(objects)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[export_type])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{export_type}"'
+    return response
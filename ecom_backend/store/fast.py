@@ -0,0 +1,149 @@
+import decimal
+
+from django.conf import settings
+from rest_framework import fields as drf_fields
+from rest_framework.renderers import JSONRenderer
+
+from . import images
+from .models import OrderItem, Product
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the standard DRF renderer
+    orjson = None
+
+# Read-only fast path for the compact product and order lists.
+#
+# Instead of building model instances and walking DRF fields, rows come
+# from .values() and are mapped straight to the dicts ProductSerializer and
+# OrderSerializer would produce in their compact form. Formatting of
+# decimals, datetimes and images reuses the DRF field implementations, so
+# the JSON is byte-for-byte the same (see FastSerializationParityTests).
+# Enabled with settings.STORE_FAST_SERIALIZATION.
+
+PRODUCT_COLUMNS = (
+    "id", "name", "slug", "description", "price", "stock", "image", "image_variants", "created_at",
+    "category_id", "category__name", "supplier_id", "supplier__username", "supplier__email",
+)
+
+ORDER_COLUMNS = (
+    "id", "created_at", "status", "is_seen", "user_id", "user__username", "user__email", "total", "item_count",
+)
+
+ORDER_ITEM_COLUMNS = ("id", "order_id", "quantity", "price") + tuple(
+    f"product__{column}" for column in PRODUCT_COLUMNS
+)
+
+
+def enabled(request):
+    # Only the default compact representation has a fast path.
+    params = request.query_params
+    return getattr(settings, "STORE_FAST_SERIALIZATION", False) and not params.get("expand") and not params.get("fields")
+
+
+def compile_product_mapper(request, prefix=""):
+    """Return a function turning a values() row into a compact product dict."""
+    price = drf_fields.DecimalField(max_digits=10, decimal_places=2).to_representation
+    storage = Product._meta.get_field("image").storage
+    absolute = request.build_absolute_uri if request is not None else (lambda url: url)
+    keys = {column: prefix + column for column in PRODUCT_COLUMNS}
+
+    def image(name):
+        return absolute(storage.url(name)) if name else None
+
+    def to_dict(row):
+        supplier_id = row[keys["supplier_id"]]
+        return {
+            "id": row[keys["id"]],
+            "name": row[keys["name"]],
+            "slug": row[keys["slug"]],
+            "description": row[keys["description"]],
+            "price": price(row[keys["price"]]),
+            "stock": row[keys["stock"]],
+            "image": image(row[keys["image"]]),
+            "srcset": images.srcset(row[keys["image"]], row[keys["image_variants"]], request),
+            "category": {"id": row[keys["category_id"]], "name": row[keys["category__name"]]},
+            "supplier": {
+                "id": supplier_id,
+                "username": row[keys["supplier__username"]],
+                "email": row[keys["supplier__email"]],
+            } if supplier_id is not None else None,
+        }
+    return to_dict
+
+
+def product_values(queryset):
+    return queryset.values(*PRODUCT_COLUMNS)
+
+
+def serialize_products(rows, request):
+    to_dict = compile_product_mapper(request)
+    return [to_dict(row) for row in rows]
+
+
+def order_values(queryset):
+    return queryset.values(*ORDER_COLUMNS)
+
+
+def order_item_values(order_ids):
+    return OrderItem.objects.filter(order_id__in=order_ids).order_by("id").values(*ORDER_ITEM_COLUMNS)
+
+
+def serialize_orders(rows, request):
+    rows = list(rows)
+    return build_orders(rows, order_item_values([row["id"] for row in rows]), request)
+
+
+def build_orders(rows, item_rows, request):
+    """Nest ``item_rows`` (from order_item_values) under their order rows."""
+    created_at = drf_fields.DateTimeField().to_representation
+    price = drf_fields.DecimalField(max_digits=10, decimal_places=2).to_representation
+    product = compile_product_mapper(request, prefix="product__")
+
+    items = {row["id"]: [] for row in rows}
+    for item in item_rows:
+        quantity = item["quantity"] if item["quantity"] is not None else 0
+        unit_price = item["price"] if item["price"] is not None else 0
+        items[item["order_id"]].append({
+            "id": item["id"],
+            "product": product(item) if item["product__id"] is not None else None,
+            "quantity": item["quantity"],
+            "price": price(item["price"]),
+            "subtotal": quantity * unit_price,
+        })
+
+    return [{
+        "id": row["id"],
+        "user": {
+            "id": row["user_id"], "username": row["user__username"], "email": row["user__email"],
+        } if row["user_id"] is not None else None,
+        "created_at": created_at(row["created_at"]),
+        "status": row["status"],
+        "is_seen": row["is_seen"],
+        "items": items[row["id"]],
+        "total": row["total"],
+        "item_count": row["item_count"],
+    } for row in rows]
+
+
+def default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError
+
+
+def dumps(data):
+    """Encode ``data`` exactly like DRF's compact JSONRenderer."""
+    if orjson is None:
+        return JSONRenderer().render(data)
+    ret = orjson.dumps(data, default=default)
+    return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer with identical output, encoded by orjson when it is installed."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,186 @@
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import bump_on_commit
+from .models import Product
+from .tasks import task
+
+# Resized derivatives of Product.image for the catalog grid.
+#
+# When a product is saved with a new image, a background task decodes it
+# once and writes one WebP and one JPEG file per width bucket
+# (STORE_IMAGE_WIDTHS, never wider than the upload). Files are named after
+# the hash of their bytes, so a URL always serves the same content and can
+# be cached forever. The result is recorded on Product.image_variants:
+#
+#     {"source": "products/a.jpg",
+#      "image/webp": [[160, "products/derived/160w-<hash>.webp"], ...],
+#      "image/jpeg": [[160, "products/derived/160w-<hash>.jpg"], ...]}
+#
+# and exposed by the serializers as a srcset string per MIME type. Variants
+# of an image that has since been replaced are not exposed.
+#
+# Once a product's image is replaced or removed, or the product deleted,
+# the old upload and its derivatives are deleted by remove_files, except
+# the ones another product still refers to (identical derivatives are one
+# shared file).
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = "products/derived"
+
+
+def storage():
+    return Product._meta.get_field("image").storage
+
+
+def widths_for(source_width):
+    buckets = sorted(getattr(settings, "STORE_IMAGE_WIDTHS", (160, 320, 640, 1280)))
+    widths = [width for width in buckets if width < source_width]
+    if source_width <= buckets[-1]:
+        widths.append(source_width)
+    return widths
+
+
+def resize(image, width):
+    if width >= image.width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def encode_webp(image):
+    buffer = io.BytesIO()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    image.save(buffer, "WEBP", quality=getattr(settings, "STORE_IMAGE_QUALITY", 80), method=4)
+    return buffer.getvalue()
+
+
+def encode_jpeg(image):
+    buffer = io.BytesIO()
+    if "A" in image.getbands() or image.mode == "P":
+        # JPEG has no alpha channel; flatten transparent images onto white.
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, "white")
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    image.save(buffer, "JPEG", quality=getattr(settings, "STORE_IMAGE_QUALITY", 80), optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+# Served in this order of preference through <picture> <source> elements.
+FORMATS = (
+    ("image/webp", "webp", encode_webp),
+    ("image/jpeg", "jpg", encode_jpeg),
+)
+
+
+def derive(name):
+    """Write the derivatives of the stored image ``name`` and return the variants map."""
+    with storage().open(name) as file:
+        image = Image.open(file)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    variants = {"source": name, **{mime: [] for mime, _, _ in FORMATS}}
+    for width in widths_for(image.width):
+        resized = resize(image, width)
+        for mime, extension, encode in FORMATS:
+            data = encode(resized)
+            target = f"{DERIVED_DIR}/{width}w-{hashlib.sha256(data).hexdigest()[:16]}.{extension}"
+            if not storage().exists(target):
+                target = storage().save(target, ContentFile(data))
+            variants[mime].append([width, target])
+    return variants
+
+
+def files_of(image, variants):
+    """The media files of a product: its upload and the derivatives in ``variants``."""
+    files = {path for mime, _, _ in FORMATS for _, path in variants.get(mime, ())}
+    return files | {name for name in (image, variants.get("source")) if name}
+
+
+@task()
+def remove_files(names):
+    """Delete the files among ``names`` that no product's image or variants refer to."""
+    names = set(names)
+    used = set(Product.objects.filter(image__in=names).values_list("image", flat=True))
+    # Hashed names are unique enough to find as substrings of the JSON.
+    mentioned = Q()
+    for name in names:
+        mentioned |= Q(image_variants__icontains=name)
+    for image, variants in Product.objects.filter(mentioned).values_list("image", "image_variants"):
+        used |= files_of(image, variants)
+    for name in sorted(names - used):
+        storage().delete(name)
+
+
+@task()
+def process(product_id, name):
+    """Derive ``name`` and store the variants unless the product's image changed meanwhile."""
+    try:
+        variants = derive(name)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        # Missing or undecodable upload: retrying will not help. Remember
+        # the attempt so every later save does not queue it again.
+        logger.exception("Could not derive images from %s", name)
+        variants = {"source": name}
+    with transaction.atomic():
+        previous = Product.objects.select_for_update().filter(pk=product_id).values_list("image_variants", flat=True).first()
+        # updated_at moves so the product's ETag and cached responses change.
+        updated = Product.objects.filter(pk=product_id, image=name).update(
+            image_variants=variants, updated_at=timezone.now()
+        )
+        if updated:
+            bump_on_commit("product")
+            stale = files_of(None, previous) - files_of(name, variants)
+        else:
+            # The image changed (or the product went) while deriving: nothing
+            # will ever point at these files.
+            stale = files_of(name, variants)
+        if stale:
+            remove_files.delay(sorted(stale))
+    return variants
+
+
+def srcset(name, variants, request=None):
+    """``{mime: "url 160w, url 320w"}`` for the current image, empty until it is derived."""
+    if not name or variants.get("source") != name:
+        return {}
+    absolute = request.build_absolute_uri if request is not None else (lambda url: url)
+    url = storage().url
+    return {
+        mime: ", ".join(f"{absolute(url(path))} {width}w" for width, path in variants[mime])
+        for mime, _, _ in FORMATS if variants.get(mime)
+    }
+
+
+@receiver(post_save, sender=Product)
+def product_image_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    name = instance.image.name if instance.image else ""
+    if name and instance.image_variants.get("source") != name:
+        process.delay(instance.pk, name)
+    elif not name and instance.image_variants:
+        remove_files.delay(sorted(files_of(None, instance.image_variants)))
+        Product.objects.filter(pk=instance.pk).update(image_variants={})
+        instance.image_variants = {}
+
+
+@receiver(post_delete, sender=Product)
+def product_image_deleted(sender, instance, **kwargs):
+    files = files_of(instance.image.name if instance.image else None, instance.image_variants)
+    if files:
+        remove_files.delay(sorted(files))
@@ -0,0 +1,255 @@
+import csv
+import json
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.text import slugify
+
+from . import suggest
+from .cache import bump_on_commit
+from .exports import chunks
+from .models import Category, Product
+from .search import get_search_backend
+
+# Bulk product import for `POST /api/products/import/` and
+# `manage.py import_products`: the counterpart of store.exports.
+#
+# Rows come from a CSV (with a header line) or NDJSON stream and are read
+# lazily, STORE_IMPORT_BATCH at a time. Each batch is validated by hand
+# (a serializer per row costs more than the write), then upserted by slug
+# with one INSERT ... ON CONFLICT (slug) DO UPDATE in its own transaction.
+# Existing products keep their supplier, image and created_at. A row
+# without a slug gets slugify(name), so importing the same file twice
+# updates rather than duplicates.
+#
+# Rows that fail validation are reported by line number and skipped; the
+# rest of the batch is written. A stream that stops being readable (bytes
+# that are not UTF-8, a CSV the csv module rejects) ends the import with
+# an ImportFormatError naming the line; batches before it stay written and
+# the error carries their report. Suppliers only update their own products
+# (a product another supplier creates between the ownership check and the
+# write is updated but keeps its supplier). Like store.deletion, the bulk writes skip
+# the Product signals, so the search index, suggestions and the product
+# cache generation are updated once per batch here.
+
+FORMATS = ("csv", "ndjson")
+
+REQUIRED = ("name", "price", "category")
+
+UPDATE_FIELDS = ["name", "description", "price", "stock", "category", "updated_at"]
+
+SLUG_RE = re.compile(r"^[-a-zA-Z0-9_]+$")
+
+# Errors kept in the report; later failures are only counted.
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(ValueError):
+    """
+    The stream cannot be read (unknown format, missing columns, bad bytes).
+    import_products sets ``report`` to the ImportReport of the batches
+    written before it.
+    """
+    report = None
+
+
+def batch_size():
+    return getattr(settings, "STORE_IMPORT_BATCH", 1000)
+
+
+def text_lines(lines):
+    for number, line in enumerate(lines):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode("utf-8-sig" if number == 0 else "utf-8")
+            except UnicodeDecodeError:
+                raise ImportFormatError(f"Line {number + 1} is not valid UTF-8.") from None
+        yield line
+
+
+def csv_records(lines):
+    """(line number, row dict) for every CSV row after the header."""
+    reader = csv.DictReader(text_lines(lines))
+    try:
+        missing = [column for column in REQUIRED if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ImportFormatError(f"Missing CSV columns: {', '.join(missing)}.")
+        for record in reader:
+            yield reader.line_num, record
+    except csv.Error as exc:
+        raise ImportFormatError(f"Line {reader.line_num + 1}: {exc}.") from None
+
+
+def ndjson_records(lines):
+    """(line number, object) for every non-blank NDJSON line; None when it is not an object."""
+    for number, line in enumerate(text_lines(lines), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield number, record if isinstance(record, dict) else None
+
+
+def guess_type(content_type, filename=""):
+    """The import type of a body or upload, NDJSON unless it looks like CSV."""
+    return "csv" if "csv" in (content_type or "") or filename.lower().endswith(".csv") else "ndjson"
+
+
+def read_records(lines, import_type):
+    if import_type == "csv":
+        return csv_records(lines)
+    if import_type == "ndjson":
+        return ndjson_records(lines)
+    raise ImportFormatError(f"Unknown import type {import_type!r}; use one of {', '.join(FORMATS)}.")
+
+
+def text(record, name):
+    value = record.get(name)
+    return "" if value is None else str(value).strip()
+
+
+def has_null(value):
+    # Not storable in a PostgreSQL text column.
+    return "\x00" in value
+
+
+def clean_record(record, categories):
+    """
+    Validate one row the way ProductSerializer would and return
+    (field values, errors); ``categories`` maps category slugs to ids.
+    """
+    if record is None:
+        return None, {"non_field_errors": ["Not a JSON object."]}
+    errors, values = {}, {}
+
+    name = text(record, "name")
+    if not name:
+        errors["name"] = ["This field is required."]
+    elif has_null(name):
+        errors["name"] = ["Null characters are not allowed."]
+    elif len(name) > 200:
+        errors["name"] = ["Ensure this field has no more than 200 characters."]
+    values["name"] = name
+
+    slug = text(record, "slug") or slugify(name)
+    if not SLUG_RE.match(slug):
+        errors["slug"] = ["Enter a valid slug."]
+    elif len(slug) > 50:
+        errors["slug"] = ["Ensure this field has no more than 50 characters."]
+    values["slug"] = slug
+
+    values["description"] = text(record, "description")
+    if has_null(values["description"]):
+        errors["description"] = ["Null characters are not allowed."]
+
+    try:
+        price = Decimal(text(record, "price"))
+        if not price.is_finite():
+            raise InvalidOperation
+    except InvalidOperation:
+        errors["price"] = ["A valid number is required."]
+    else:
+        sign, digits, exponent = price.as_tuple()
+        if exponent < -2:
+            errors["price"] = ["Ensure that there are no more than 2 decimal places."]
+        elif len(digits) + exponent > 8:
+            errors["price"] = ["Ensure that there are no more than 8 digits before the decimal point."]
+        values["price"] = price
+
+    stock = text(record, "stock") or "0"
+    try:
+        values["stock"] = int(stock)
+    except ValueError:
+        errors["stock"] = ["A valid integer is required."]
+    else:
+        low, high = connection.ops.integer_field_range("PositiveIntegerField")
+        if values["stock"] < 0:
+            errors["stock"] = ["Ensure this value is greater than or equal to 0."]
+        elif high is not None and values["stock"] > high:
+            errors["stock"] = [f"Ensure this value is less than or equal to {high}."]
+
+    category = text(record, "category")
+    if category not in categories:
+        errors["category"] = [f"No category with slug {category!r}." if category else "This field is required."]
+    values["category_id"] = categories.get(category)
+
+    return values, errors
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = self.created = self.updated = self.failed = 0
+        self.errors = []
+
+    def error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows, "created": self.created, "updated": self.updated,
+            "failed": self.failed, "errors": self.errors,
+        }
+
+
+def write_batch(rows, supplier, update_any, report):
+    """Upsert ``rows`` ({slug: (line, values)}) in one transaction."""
+    with transaction.atomic():
+        owners = dict(Product.objects.filter(slug__in=list(rows)).values_list("slug", "supplier_id"))
+        products = []
+        for slug, (line, values) in rows.items():
+            if slug in owners and not update_any and owners[slug] != supplier.pk:
+                report.error(line, {"slug": ["A product with this slug belongs to another supplier."]})
+                continue
+            products.append(Product(supplier=supplier, **values))
+        if not products:
+            return
+        Product.objects.bulk_create(
+            products, update_conflicts=True, unique_fields=["slug"], update_fields=UPDATE_FIELDS,
+        )
+        ids = [product.pk for product in products]
+        if None in ids:
+            # Backends that cannot return ids from an upsert.
+            ids = list(Product.objects.filter(slug__in=[p.slug for p in products]).values_list("pk", flat=True))
+        get_search_backend().index_products(ids)
+        suggest.invalidate()
+        bump_on_commit("product")
+    updated = sum(1 for product in products if product.slug in owners)
+    report.created += len(products) - updated
+    report.updated += updated
+
+
+def import_products(records, supplier, update_any=False, on_batch=None):
+    """
+    Upsert the products of ``records`` ((line, dict) pairs, see
+    read_records) and return an ImportReport. New products belong to
+    ``supplier``; existing ones of other suppliers are only updated with
+    ``update_any``. ``on_batch(report)`` is called after every batch.
+    """
+    categories = dict(Category.objects.values_list("slug", "id"))
+    report = ImportReport()
+    try:
+        for chunk in chunks(records, batch_size()):
+            rows = {}
+            for line, record in chunk:
+                report.rows += 1
+                values, errors = clean_record(record, categories)
+                if errors:
+                    report.error(line, errors)
+                else:
+                    # A slug repeated within the batch: the last row wins, as it
+                    # would have row by row.
+                    rows.pop(values["slug"], None)
+                    rows[values["slug"]] = (line, values)
+            write_batch(rows, supplier, update_any, report)
+            if on_batch:
+                on_batch(report)
+    except ImportFormatError as exc:
+        exc.report = report
+        raise
+    return report
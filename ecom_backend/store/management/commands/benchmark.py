@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Run a performance scenario against throwaway data (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=sorted(benchmarks.SCENARIOS))
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10000, 100000, 1000000])
+
+    def handle(self, *args, **options):
+        benchmarks.run(options["scenario"], options["sizes"], self.stdout)
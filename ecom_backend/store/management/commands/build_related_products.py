@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import recommend
+
+
+class Command(BaseCommand):
+    help = "Count the orders placed since the last run into the co-purchase matrix and refresh products/{id}/related/."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recount every order instead.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        build = recommend.build(full=options["full"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Full' if build.full else 'Incremental'} build: {build.orders} orders counted, "
+            f"{build.products} products with related products, in {time.perf_counter() - start:.1f}s."
+        ))
@@ -0,0 +1,50 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
+
+from store import imports
+
+
+class Command(BaseCommand):
+    help = "Upsert products by slug from a CSV or NDJSON file (see store.imports)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='File to read, or "-" for stdin.')
+        parser.add_argument("--supplier", required=True, help="Username that new products belong to.")
+        parser.add_argument("--type", choices=imports.FORMATS, help="Defaults to the file extension, else NDJSON.")
+        parser.add_argument("--own-only", action="store_true", help="Skip products of other suppliers.")
+
+    def handle(self, *args, **options):
+        try:
+            supplier = User.objects.get(username=options["supplier"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['supplier']!r}.")
+        import_type = options["type"] or imports.guess_type("", options["path"])
+        try:
+            stream = sys.stdin.buffer if options["path"] == "-" else open(options["path"], "rb")
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        def progress(report):
+            reset_queries()  # DEBUG would otherwise keep every batch INSERT in memory
+            self.stdout.write(
+                f"  {report.rows} rows: {report.created} created, {report.updated} updated, {report.failed} failed"
+            )
+
+        try:
+            with stream:
+                report = imports.import_products(
+                    imports.read_records(stream, import_type), supplier,
+                    update_any=not options["own_only"], on_batch=progress,
+                )
+        except imports.ImportFormatError as exc:
+            raise CommandError(str(exc))
+        for failure in report.errors:
+            self.stderr.write(f"line {failure['line']}: {failure['errors']}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f"... {report.failed - len(report.errors)} more failed rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.created + report.updated} products ({report.created} new), {report.failed} rows failed."
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.deletion import purge_user
+from store.models import UserDeletion
+
+
+class Command(BaseCommand):
+    help = "Finish user deletions that were requested but have not completed (e.g. after a restart)."
+
+    def handle(self, *args, **options):
+        for deletion in UserDeletion.objects.exclude(status="Done").order_by("created_at"):
+            self.stdout.write(f"Purging {deletion.username} (id {deletion.user_id})")
+
+            def report(step, count):
+                self.stdout.write(f"  {step}: {deletion.progress.get(step, count)}")
+
+            purge_user(deletion, on_batch=report)
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deletion.username}."))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import analytics
+
+
+class Command(BaseCommand):
+    help = "Recompute the sales and status rollups behind /api/analytics/ from the orders."
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = analytics.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written['sales']} sales and {written['status']} status rollups "
+            f"in {time.perf_counter() - start:.1f}s."
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.tasks import DatabaseBackend
+
+
+class Command(BaseCommand):
+    help = "Run tasks queued by store.tasks.DatabaseBackend until interrupted (or once with --once)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit once no task is due.")
+        parser.add_argument("--batch", type=int, default=10, help="Tasks claimed per poll.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when idle.")
+
+    def handle(self, *args, **options):
+        backend = DatabaseBackend()
+        total = 0
+        while True:
+            ran = backend.run_due(options["batch"])
+            total += ran
+            if not ran:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Ran {total} task(s)."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = "Compare the stored Order.total/item_count with the sums of the order items; --fix rewrites them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Recompute the orders that are off.")
+        parser.add_argument("--batch", type=int, default=5000, help="Orders checked per query.")
+
+    def handle(self, *args, **options):
+        checked, wrong, last = 0, 0, 0
+        while True:
+            # Walk the orders by id so each query sums one bounded slice.
+            ids = list(Order.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:options["batch"]])
+            if not ids:
+                break
+            last, checked = ids[-1], checked + len(ids)
+            off = list(Order.objects.filter(pk__in=ids).computed_totals().filter(
+                ~Q(total=F("computed_total")) | ~Q(item_count=F("computed_item_count"))
+            ).values_list("pk", "total", "computed_total", "item_count", "computed_item_count"))
+            for pk, total, computed_total, item_count, computed_item_count in off[:max(0, 20 - wrong)]:
+                self.stderr.write(
+                    f"order {pk}: total {total} (items {computed_total}), "
+                    f"item_count {item_count} (items {computed_item_count})"
+                )
+            if options["fix"] and off:
+                Order.objects.filter(pk__in=[row[0] for row in off]).refresh_totals()
+            wrong += len(off)
+
+        if wrong and options["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"Checked {checked} orders, fixed {wrong}."))
+        elif wrong:
+            self.stdout.write(self.style.ERROR(f"Checked {checked} orders, {wrong} out of step."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Checked {checked} orders, all consistent."))
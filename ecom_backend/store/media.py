@@ -0,0 +1,163 @@
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+# Serves MEDIA_ROOT in production, replacing django.conf.urls.static (which
+# only works with DEBUG on and sends no caching headers).
+#
+# - ETag/Last-Modified come from the file's stat, so revalidation is a 304
+#   without opening the file.
+# - Content-hashed names (store.images derivatives) never change content
+#   and are sent as immutable for a year; other files get
+#   STORE_MEDIA_MAX_AGE.
+# - With STORE_MEDIA_ACCEL set, the front proxy sends the body:
+#   "nginx" answers with X-Accel-Redirect to STORE_MEDIA_ACCEL_PREFIX + path
+#   (an `internal` location aliased to MEDIA_ROOT), "sendfile" with an
+#   X-Sendfile header naming the file (Apache mod_xsendfile, lighttpd).
+#   The proxy then handles Range itself. nginx URL-decodes the redirect,
+#   so it is sent quoted; X-Sendfile is taken literally, so a path that
+#   does not fit a latin-1 header is served by Django instead.
+# - Otherwise the body is a FileResponse. WSGI servers with a
+#   wsgi.file_wrapper (gunicorn, uWSGI) send it with sendfile(); single
+#   byte ranges are served from the seeked file the same way.
+
+HASHED_NAME = re.compile(r"-[0-9a-f]{16}\.\w+$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FileRange:
+    """Reads at most ``length`` bytes of ``file`` from its current position."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+        self.name = file.name
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, inclusive; None to send the
+    whole file (absent, malformed or multi-range header); raises ValueError
+    when no byte of the file is in range.
+    """
+    match = RANGE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None  # invalid, ignored as RFC 9110 allows
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(0, size - int(last)), size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def range_applies(request, etag, mtime):
+    """If-Range: only serve the range when the client's copy is current."""
+    condition = request.headers.get("If-Range")
+    if not condition:
+        return True
+    if condition.startswith(('"', 'W/')):
+        return condition == etag
+    return parse_http_date_safe(condition) == int(mtime)
+
+
+def cache_control(path):
+    if HASHED_NAME.search(path):
+        return IMMUTABLE
+    return f"public, max-age={getattr(settings, 'STORE_MEDIA_MAX_AGE', 3600)}"
+
+
+def latin1(value):
+    try:
+        value.encode("latin-1")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+@require_safe
+def serve(request, path):
+    path = posixpath.normpath(path).lstrip("/")
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        info = os.stat(fullpath)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404("No such media file.")
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404("No such media file.")
+
+    etag = quote_etag(f"{info.st_mtime_ns:x}-{info.st_size:x}")
+    headers = {
+        "Cache-Control": cache_control(path), "Accept-Ranges": "bytes",
+        "ETag": etag, "Last-Modified": http_date(info.st_mtime),
+    }
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(info.st_mtime))
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified[name] = value
+        return not_modified
+
+    content_type, encoding = mimetypes.guess_type(path)
+    # Compressed files are sent as they are, not as a Content-Encoding.
+    content_type = content_type if content_type and not encoding else "application/octet-stream"
+
+    accel = getattr(settings, "STORE_MEDIA_ACCEL", None)
+    if accel == "nginx":
+        prefix = getattr(settings, "STORE_MEDIA_ACCEL_PREFIX", "/protected-media/")
+        return HttpResponse(content_type=content_type, headers={**headers, "X-Accel-Redirect": quote(prefix + path)})
+    if accel and latin1(fullpath):
+        return HttpResponse(content_type=content_type, headers={**headers, "X-Sendfile": fullpath})
+
+    start, length, status = 0, info.st_size, 200
+    header = request.headers.get("Range")
+    if header and range_applies(request, etag, info.st_mtime):
+        try:
+            bounds = byte_range(header, info.st_size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{info.st_size}"
+            return HttpResponse(status=416, headers=headers)
+        if bounds is not None:
+            start, end = bounds
+            length, status = end - start + 1, 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{info.st_size}"
+
+    file = open(fullpath, "rb")
+    if status == 206:
+        file.seek(start)
+        file = FileRange(file, length)
+    response = FileResponse(file, status=status, content_type=content_type, headers=headers)
+    response["Content-Length"] = length
+    response.block_size = 64 * 1024
+    return response
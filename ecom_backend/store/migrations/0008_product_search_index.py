@@ -0,0 +1,49 @@
+from django.db import migrations
+
+FTS_TABLE = "store_product_fts"
+PG_INDEX = "store_product_search_gin"
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        from django.db import OperationalError
+
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                "name, description, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to the basic backend.
+            return
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, category) "
+            "SELECT p.id, p.name, p.description, c.name FROM store_product p "
+            "JOIN store_category c ON c.id = p.category_id"
+        )
+    elif connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON store_product USING GIN (("
+            "setweight(to_tsvector('english'::regconfig, COALESCE(name, '')), 'A') || "
+            "setweight(to_tsvector('english'::regconfig, COALESCE(description, '')), 'B')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {PG_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_order_is_seen'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at', 'id'], name='order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', 'id'], name='order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['supplier', '-created_at', 'id'], name='order_supplier_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', 'id'], name='product_created_idx'),
+        ),
+        # auth_user belongs to django.contrib.auth, so its keyset index for
+        # the admin user list is created here with plain SQL.
+        migrations.RunSQL(
+            "CREATE INDEX user_joined_idx ON auth_user (date_joined DESC, id)",
+            "DROP INDEX user_joined_idx",
+        ),
+    ]
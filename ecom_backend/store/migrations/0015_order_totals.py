@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:36
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_totals(apps, schema_editor):
+    # The same sums as store.models.order_items_total/count, on the
+    # historical models; one UPDATE for all orders.
+    Order = apps.get_model("store", "Order")
+    OrderItem = apps.get_model("store", "OrderItem")
+    items = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+    line = ExpressionWrapper(F("quantity") * F("price"), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+    Order.objects.update(
+        total=Coalesce(
+            Subquery(items.annotate(total=Sum(line)).values("total")), Value(0),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        item_count=Coalesce(Subquery(items.annotate(count=Sum("quantity")).values("count")), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_user_deletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
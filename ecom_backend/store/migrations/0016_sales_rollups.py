@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_order_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('order', 'Order'), ('category', 'Category'), ('product', 'Product')], max_length=10)),
+                ('key', models.IntegerField()),
+                ('supplier_id', models.IntegerField()),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', 'day'], name='sales_rollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'supplier_id', 'key', 'day'), name='sales_rollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('supplier_id', models.IntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('supplier_id', 'status'), name='status_rollup_unique')],
+            },
+        ),
+    ]
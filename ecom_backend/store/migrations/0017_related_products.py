@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProductsBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('full', models.BooleanField(default=False)),
+                ('last_order_id', models.IntegerField()),
+                ('orders', models.IntegerField(default=0)),
+                ('products', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.IntegerField()),
+                ('other_id', models.IntegerField()),
+                ('orders', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product_id', 'other_id'), name='copurchase_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('orders', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_products', to='store.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='store.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'position'), name='related_product_unique')],
+            },
+        ),
+    ]
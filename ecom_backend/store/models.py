@@ -1,13 +1,18 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models import ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 # Create your models here.
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return self.name
 
@@ -20,12 +25,35 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
     image = models.ImageField(upload_to="products/", blank=True, null=True)  # put placeholders if none
+    # resized WebP/JPEG copies of image, written by store.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination order used by the product list
+            models.Index(fields=['-created_at', 'id'], name='product_created_idx'),
+            # the same order within one category or supplier (?category=, ?supplier=)
+            models.Index(fields=['category', '-created_at', 'id'], name='product_category_created_idx'),
+            models.Index(fields=['supplier', '-created_at', 'id'], name='product_supplier_created_idx'),
+            # covers the count/max(updated_at) behind the list ETag
+            models.Index(fields=['updated_at'], name='product_updated_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+class OrderQuerySet(models.QuerySet):
+    def computed_totals(self):
+        """Annotate computed_total/computed_item_count summed from the items."""
+        return self.annotate(computed_total=order_items_total(), computed_item_count=order_items_count())
+
+    def refresh_totals(self):
+        """Recompute the stored total and item_count of these orders from their items in one UPDATE."""
+        return self.update(total=order_items_total(), item_count=order_items_count())
+
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ('Pending', 'Pending'),
@@ -38,10 +66,25 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
     is_seen = models.BooleanField(default=False)
+    # Sum of the items' quantity * price and of their quantities, written
+    # by store.orders.place_order and kept in step by the OrderItem signal
+    # handlers below (`manage.py verify_order_totals` checks them).
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
     # address and other fields can be added
 
-    def total(self):
-        return sum([item.subtotal() for item in self.items.all()])
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination order for the admin, supplier and customer order lists
+            models.Index(fields=['-created_at', 'id'], name='order_created_idx'),
+            models.Index(fields=['user', '-created_at', 'id'], name='order_user_created_idx'),
+            models.Index(fields=['supplier', '-created_at', 'id'], name='order_supplier_created_idx'),
+            # unseen orders are a small, hot subset; only they are indexed
+            models.Index(fields=['user'], condition=models.Q(is_seen=False), name='order_user_unseen_idx'),
+            models.Index(fields=['supplier'], condition=models.Q(is_seen=False), name='order_supplier_unseen_idx'),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
@@ -49,12 +92,55 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    def delete(self, *args, **kwargs):
+        deleted = super().delete(*args, **kwargs)
+        Order.objects.filter(pk=self.order_id).refresh_totals()
+        return deleted
+
     def subtotal(self):
         # Ensure quantity and price are not None before multiplication
         qty = self.quantity if self.quantity is not None else 0
         prc = self.price if self.price is not None else 0
         return qty * prc
 
+
+# Correlated subqueries over an order's items: only the orders in the
+# outer query are summed, each through the item table's order_id index.
+def order_items_total():
+    items = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+    line = ExpressionWrapper(F("quantity") * F("price"), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+    return Coalesce(
+        Subquery(items.annotate(total=Sum(line)).values("total")), Value(0),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def order_items_count():
+    items = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+    return Coalesce(Subquery(items.annotate(count=Sum("quantity")).values("count")), Value(0))
+
+
+# Saved items refresh their order's stored totals. Deleting one item does
+# the same (OrderItem.delete); a post_delete receiver instead would make
+# deleting an order load and refresh every item it cascades to. Bulk item
+# writes are left to `manage.py verify_order_totals --fix`.
+@receiver(post_save, sender=OrderItem)
+def order_item_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Order.objects.filter(pk=instance.order_id).refresh_totals()
+
+
+class ProfileManager(models.Manager):
+    def for_user(self, user):
+        """Return the user's profile, creating it for users that have none yet."""
+        try:
+            return user.profile
+        except Profile.DoesNotExist:
+            profile, _ = self.get_or_create(user=user)
+            user.profile = profile
+            return profile
+
+
 class Profile(models.Model):
     ROLE_CHOICES = (
         ('Client', 'Client'),
@@ -66,14 +152,160 @@ class Profile(models.Model):
     is_approved = models.BooleanField(default=False)
     age = models.PositiveIntegerField(null=True, blank=True)
 
+    objects = ProfileManager()
+
+    class Meta:
+        indexes = [
+            # approved/pending supplier lookups
+            models.Index(fields=['role', 'is_approved'], name='profile_role_approved_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user.username} Profile'
 
+    def update(self, **fields):
+        """
+        Set ``fields`` and save only those whose value actually changed.
+        Returns the names written; nothing is written if none changed.
+        """
+        changed = []
+        for name, value in fields.items():
+            value = self._meta.get_field(name).to_python(value)
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed.append(name)
+        if changed:
+            self.save(update_fields=changed)
+        return changed
+
+class BackgroundTask(models.Model):
+    """A queued call for store.tasks.DatabaseBackend; deleted once it succeeds."""
+    STATUS_CHOICES = (
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Failed', 'Failed'),
+    )
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # when the task is next due; for a running task, when its lease runs out
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the worker's poll for due tasks; failed tasks stay out of it
+            models.Index(fields=['run_after'], condition=~models.Q(status='Failed'), name='task_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+class UserDeletion(models.Model):
+    """Progress of a chunked account deletion (store.deletion)."""
+    STATUS_CHOICES = (
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+    )
+    # a plain id rather than a foreign key: the record outlives the user
+    user_id = models.IntegerField(unique=True)
+    username = models.CharField(max_length=150)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    # rows handled so far, per step
+    progress = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Deletion of {self.username} ({self.status})'
+
+class SalesRollup(models.Model):
+    """
+    Orders, units and revenue of one day and supplier (store.analytics):
+    overall (dimension "order", key 0) or for one category or product.
+    Ids are plain integers, 0 for none, so rows outlive what they count.
+    """
+    DIMENSION_CHOICES = (
+        ('order', 'Order'),
+        ('category', 'Category'),
+        ('product', 'Product'),
+    )
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.IntegerField()
+    supplier_id = models.IntegerField()
+    day = models.DateField()
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # the upsert target of store.analytics.record_order; also serves
+            # the supplier-scoped reports
+            models.UniqueConstraint(
+                fields=['dimension', 'supplier_id', 'key', 'day'], name='sales_rollup_unique',
+            ),
+        ]
+        indexes = [
+            # all-supplier reports over a date range
+            models.Index(fields=['dimension', 'day'], name='sales_rollup_day_idx'),
+        ]
+
+class StatusRollup(models.Model):
+    """Number of a supplier's orders currently in each status (store.analytics)."""
+    supplier_id = models.IntegerField()
+    status = models.CharField(max_length=20)
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['supplier_id', 'status'], name='status_rollup_unique'),
+        ]
+
+class CoPurchase(models.Model):
+    """
+    Number of orders containing both ``product_id`` and ``other_id``: one
+    non-zero cell of the co-purchase matrix (store.recommend), stored for
+    both orderings of a pair. Plain ids, like the sales rollups.
+    """
+    product_id = models.IntegerField()
+    other_id = models.IntegerField()
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # the upsert target of store.recommend.count_pairs
+            models.UniqueConstraint(fields=['product_id', 'other_id'], name='copurchase_unique'),
+        ]
+
+class RelatedProduct(models.Model):
+    """One of a product's top co-purchase neighbours, ``position`` 1 being the best."""
+    product = models.ForeignKey(Product, related_name='related_products', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='related_to', on_delete=models.CASCADE)
+    position = models.PositiveSmallIntegerField()
+    orders = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            # serves products/{id}/related/ in position order
+            models.UniqueConstraint(fields=['product', 'position'], name='related_product_unique'),
+        ]
+
+class RelatedProductsBuild(models.Model):
+    """A run of store.recommend.build; the latest one is where the next starts."""
+    full = models.BooleanField(default=False)
+    # orders with a higher id are left to the next run
+    last_order_id = models.IntegerField()
+    orders = models.IntegerField(default=0)
+    products = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
@@ -0,0 +1,84 @@
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+
+from . import analytics
+from .cache import bump_on_commit
+from .models import Order, OrderItem, Product
+
+
+class OrderError(Exception):
+    status_code = 400
+
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class ProductNotFound(OrderError):
+    status_code = 404
+
+
+class InsufficientStock(OrderError):
+    pass
+
+
+def normalize_items(items):
+    """Return an ordered ``{product_id: quantity}`` map, merging repeated products."""
+    if not isinstance(items, list):
+        raise OrderError("Items must be a list.")
+    lines = OrderedDict()
+    for item in items:
+        try:
+            product_id = int(item["product_id"])
+            quantity = int(item.get("quantity", 1))
+        except (KeyError, TypeError, ValueError):
+            raise OrderError("Each item needs an integer product_id and quantity.")
+        if quantity < 1:
+            raise OrderError("Quantity must be at least 1.")
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    if not lines:
+        raise OrderError("An order needs at least one item.")
+    return lines
+
+
+@transaction.atomic
+def place_order(user, items):
+    """
+    Create an order and reserve its stock in one transaction.
+
+    Products are loaded in a single locked query, stock is decremented with
+    conditional UPDATEs so concurrent checkouts can never take a product
+    below zero, and the lines are inserted with one bulk INSERT. Any
+    failure rolls the whole order back.
+    """
+    lines = normalize_items(items)
+    products = Product.objects.select_for_update().in_bulk(list(lines))
+    missing = [product_id for product_id in lines if product_id not in products]
+    if missing:
+        raise ProductNotFound(f"Product {missing[0]} does not exist.")
+
+    for product_id, quantity in lines.items():
+        reserved = Product.objects.filter(pk=product_id, stock__gte=quantity).update(
+            stock=F("stock") - quantity, updated_at=Now()
+        )
+        if not reserved:
+            raise InsufficientStock(f"Not enough stock for {products[product_id].name}.")
+
+    first_product = products[next(iter(lines))]
+    # bulk_create skips the OrderItem signals; the totals are set up front.
+    order = Order.objects.create(
+        user=user, supplier_id=first_product.supplier_id,
+        total=sum(products[product_id].price * quantity for product_id, quantity in lines.items()),
+        item_count=sum(lines.values()),
+    )
+    order_items = OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=products[product_id], quantity=quantity, price=products[product_id].price)
+        for product_id, quantity in lines.items()
+    ])
+    analytics.record_order(order, order_items)
+    # Stock is part of the cached product responses.
+    bump_on_commit("product")
+    return order
@@ -0,0 +1,24 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (-created_at, id), backed by the composite
+    indexes on Product and Order. Pages hold 24 rows unless ?page_size=
+    asks for another size.
+    """
+    ordering = ("-created_at", "id")
+    page_size = 24
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class UserCursorPagination(CreatedAtCursorPagination):
+    ordering = ("-date_joined", "id")
+
+
+class SearchPagination(LimitOffsetPagination):
+    # Pagination is opt-in through ?limit=&offset= so clients that expect
+    # a plain list keep working.
+    default_limit = None
+    max_limit = 100
@@ -1,10 +1,13 @@
 from rest_framework import permissions
 
+from .authentication import auth_context, is_approved_supplier
+
 class IsOwnerOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user and request.user.is_staff:
             return True
-        return obj.supplier == request.user
+        # Anonymous users have no id; they must not match supplier-less rows.
+        return bool(request.user and request.user.is_authenticated) and obj.supplier_id == request.user.id
 
 class IsApprovedSupplierOrAdmin(permissions.BasePermission):
     """
@@ -12,26 +15,18 @@ class IsApprovedSupplierOrAdmin(permissions.BasePermission):
     """
 
     def has_permission(self, request, view):
+        context = auth_context(request)
         # Allow admin users to perform any action
-        if request.user and request.user.is_staff:
+        if context.is_staff:
             return True
 
         # Allow approved suppliers to perform specific actions (e.g., update order status)
-        if request.user and request.user.is_authenticated and hasattr(request.user, 'profile'):
-            if request.user.profile.role == 'Supplier' and request.user.profile.is_approved:
-                # For now, allow approved suppliers to access if they are authenticated and approved.
-                # Further view-level checks might be needed for specific actions.
-                return True
-        return False
+        # Further view-level checks might be needed for specific actions.
+        return is_approved_supplier(context)
 
     def has_object_permission(self, request, view, obj):
-        # Object-level permissions are not strictly needed for this use case (updating status on an order)
-        # but can be added if suppliers should only update *their own* orders.
-        # For now, assuming approved suppliers can update any order status.
-        if request.user and request.user.is_staff:
+        # Suppliers may only act on objects they supply.
+        context = auth_context(request)
+        if context.is_staff:
             return True
-
-        if request.user and request.user.is_authenticated and hasattr(request.user, 'profile'):
-            if request.user.profile.role == 'Supplier' and request.user.profile.is_approved:
-                return obj.supplier == request.user
-        return False
+        return is_approved_supplier(context) and obj.supplier_id == request.user.id
@@ -0,0 +1,37 @@
+from django.db.models import Prefetch
+
+from .models import Order, OrderItem, Product
+
+# Query plans shared by every endpoint that serializes products or orders.
+# The select_related/prefetch trees mirror the nesting of ProductSerializer
+# and OrderSerializer so a list response costs a fixed number of queries.
+
+PRODUCT_RELATED = ("category", "supplier__profile")
+# The compact list representation embeds no supplier profile.
+PRODUCT_COMPACT_RELATED = ("category", "supplier")
+
+
+def product_queryset(queryset=None, compact=False):
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.select_related(*(PRODUCT_COMPACT_RELATED if compact else PRODUCT_RELATED))
+
+
+def order_item_queryset(compact=False):
+    return OrderItem.objects.select_related(
+        *[f"product__{path}" for path in (PRODUCT_COMPACT_RELATED if compact else PRODUCT_RELATED)]
+    ).order_by("id")
+
+
+def order_queryset(queryset=None, compact=False):
+    """
+    Attach everything OrderSerializer touches: the customer and profile in
+    the main query and all items with their product/category/supplier in
+    one prefetch (the total is a stored column). ``compact`` skips the
+    profile joins the compact list representation does not use.
+    """
+    if queryset is None:
+        queryset = Order.objects.all()
+    return queryset.select_related("user" if compact else "user__profile").prefetch_related(
+        Prefetch("items", queryset=order_item_queryset(compact))
+    )
@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .cache import bump_on_commit
+from .models import CoPurchase, Order, OrderItem, Product, RelatedProduct, RelatedProductsBuild
+
+# "Frequently bought together" for products/{id}/related/.
+#
+# CoPurchase is the sparse product x product co-occurrence matrix: a row
+# per pair of products that share at least one order, counting those
+# orders. RelatedProduct keeps the STORE_RELATED_TOP_K best cells of each
+# product's row, so the endpoint is one join through the
+# (product, position) unique index.
+#
+# `manage.py build_related_products` runs build(). Both steps happen in
+# the database: the pairs of an order are a self-join of OrderItem on
+# order_id, counted with GROUP BY and added to the matrix with
+# INSERT ... ON CONFLICT DO UPDATE; the top K are a ROW_NUMBER() window
+# over the matrix rows of the products involved.
+#
+# A run only reads the orders placed since the previous one (by id), and
+# only re-ranks the products those orders contain. Ids are handed out
+# before an order commits, so a run stops short of the orders placed in
+# the last STORE_RELATED_SETTLE seconds: an order still committing with a
+# lower id than one already visible would otherwise be passed over for
+# good. Runs are serialized, so two never count the same orders. Items
+# edited or deleted after they were counted (admin edits, purged users)
+# are not followed; `--full` recounts everything.
+
+# pg_advisory_xact_lock key serializing builds on PostgreSQL
+LOCK_KEY = 0x5245_4C41
+
+
+def top_k():
+    return getattr(settings, "STORE_RELATED_TOP_K", 10)
+
+
+def settle_seconds():
+    return getattr(settings, "STORE_RELATED_SETTLE", 60)
+
+
+def lock_builds():
+    """Hold the build lock until the current transaction ends."""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LOCK_KEY])
+    else:
+        # A write statement, even one matching nothing, takes SQLite's single
+        # write lock, so a second build waits before reading the watermark.
+        RelatedProductsBuild.objects.filter(pk__lt=0).update(full=False)
+
+
+def related_products(product_id, queryset=None):
+    """The products stored as related to ``product_id``, best first."""
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.filter(related_to__product_id=product_id).order_by("related_to__position")
+
+
+def count_pairs(after, upto):
+    """Add the product pairs of the orders with ``after`` < id <= ``upto`` to the matrix."""
+    table, items = CoPurchase._meta.db_table, OrderItem._meta.db_table
+    with connection.cursor() as cursor:
+        # An order listing a product twice still counts once.
+        cursor.execute(
+            f"INSERT INTO {table} (product_id, other_id, orders) "
+            f"SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id) "
+            f"FROM {items} a JOIN {items} b ON b.order_id = a.order_id AND b.product_id <> a.product_id "
+            f"WHERE a.order_id > %s AND a.order_id <= %s "
+            f"GROUP BY a.product_id, b.product_id "
+            f"ON CONFLICT (product_id, other_id) DO UPDATE SET orders = {table}.orders + excluded.orders",
+            [after, upto],
+        )
+
+
+def rank(after=None, upto=None):
+    """
+    Replace the stored neighbours of the products ordered with ``after`` <
+    id <= ``upto``, or of every product without bounds. Returns how many
+    products have neighbours now.
+    """
+    table, related, products = CoPurchase._meta.db_table, RelatedProduct._meta.db_table, Product._meta.db_table
+    where, params = "", []
+    if after is not None:
+        where = f"WHERE c.product_id IN (SELECT product_id FROM {OrderItem._meta.db_table} WHERE order_id > %s AND order_id <= %s)"
+        params = [after, upto]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {related} WHERE product_id IN (SELECT c.product_id FROM {table} c {where})", params)
+        # Pairs of deleted products stay in the matrix; only existing
+        # products are ranked.
+        cursor.execute(
+            f"INSERT INTO {related} (product_id, related_id, position, orders) "
+            f"SELECT product_id, other_id, position, orders FROM ("
+            f"SELECT c.product_id, c.other_id, c.orders, "
+            f"ROW_NUMBER() OVER (PARTITION BY c.product_id ORDER BY c.orders DESC, c.other_id) AS position "
+            f"FROM {table} c JOIN {products} p ON p.id = c.product_id JOIN {products} o ON o.id = c.other_id "
+            f"{where}) ranked WHERE position <= %s",
+            [*params, top_k()],
+        )
+        cursor.execute(f"SELECT COUNT(DISTINCT product_id) FROM {related}")
+        return cursor.fetchone()[0]
+
+
+@transaction.atomic
+def build(full=False):
+    """
+    Count the orders placed since the last build into the matrix and
+    re-rank the products they contain, or start over with ``full``.
+    Returns the RelatedProductsBuild recorded.
+    """
+    lock_builds()
+    previous = RelatedProductsBuild.objects.order_by("-pk").first()
+    after = 0 if full or previous is None else previous.last_order_id
+    settled = Order.objects.filter(created_at__lte=timezone.now() - timedelta(seconds=settle_seconds()))
+    upto = max(settled.aggregate(last=Max("pk"))["last"] or 0, after)
+    if after == 0:
+        full = True
+        CoPurchase.objects.all().delete()
+        RelatedProduct.objects.all().delete()
+    orders = Order.objects.filter(pk__gt=after, pk__lte=upto).count()
+    count_pairs(after, upto)
+    products = rank() if full else rank(after, upto)
+    bump_on_commit("related")
+    return RelatedProductsBuild.objects.create(full=full, last_order_id=upto, orders=orders, products=products)
@@ -0,0 +1,220 @@
+import functools
+import operator
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Category, Product
+
+# Product search backends. Each backend turns a free-text query into a
+# relevance-ordered Product queryset and keeps its index in sync with the
+# catalog through the signal handlers at the bottom of this module.
+#
+# The backend is picked from settings.STORE_SEARCH_BACKEND (a dotted path)
+# or, when unset, from the database vendor.
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+class BaseSearchBackend:
+    def search(self, query):
+        """Return a Product queryset matching ``query``, best match first."""
+        raise NotImplementedError
+
+    def index_product(self, product):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+    def index_products(self, product_ids):
+        """(Re)index many products at once, for writes that bypass signals."""
+        for product in Product.objects.select_related("category").filter(pk__in=product_ids):
+            self.index_product(product)
+
+    def remove_products(self, product_ids):
+        """Drop many products at once, for deletions that bypass signals."""
+        for product_id in product_ids:
+            self.remove_product(product_id)
+
+    def index_category(self, category):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """
+    Unindexed fallback for databases without a full-text engine: icontains
+    matching where every word must hit one of the columns, with name
+    matches ranked first.
+    """
+
+    def index_products(self, product_ids):
+        pass
+
+    def search(self, query):
+        words = tokenize(query)
+        if not words:
+            return Product.objects.none()
+        matches = [
+            Q(name__icontains=word) | Q(description__icontains=word) | Q(category__name__icontains=word)
+            for word in words
+        ]
+        name_match = functools.reduce(operator.or_, [Q(name__icontains=word) for word in words])
+        return Product.objects.filter(*matches).alias(
+            name_hit=ExpressionWrapper(name_match, output_field=BooleanField())
+        ).order_by("-name_hit", "-created_at", "id")
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 inverted index over product name, description and category
+    name, ranked with bm25. The virtual table is created by migration 0008.
+    """
+
+    table = "store_product_fts"
+    # bm25 column weights: name, description, category
+    weights = (10.0, 1.0, 5.0)
+
+    def match_expression(self, words):
+        # Prefix-match every word so results show up while the user is
+        # still typing. Words are AND-ed: OR-ing a common word would make
+        # every query rank a large share of the catalog.
+        return " ".join(f'"{word}"*' for word in words)
+
+    def search(self, query):
+        words = tokenize(query)
+        if not words:
+            return Product.objects.none()
+        weights = ", ".join(str(weight) for weight in self.weights)
+        # Join the FTS table in so SQLite drives the query from the index and
+        # bm25() is evaluated once per hit.
+        return Product.objects.extra(
+            tables=[self.table],
+            where=[f"{self.table}.rowid = {Product._meta.db_table}.id", f"{self.table} MATCH %s"],
+            params=[self.match_expression(words)],
+            select={"search_rank": f"bm25({self.table}, {weights})"},
+        ).order_by("search_rank", "id")
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description, category) VALUES (%s, %s, %s, %s)",
+                [product.pk, product.name, product.description, product.category.name],
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product_id])
+
+    def index_products(self, product_ids):
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", list(product_ids))
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description, category) "
+                f"SELECT p.id, p.name, p.description, c.name FROM {Product._meta.db_table} p "
+                f"JOIN {Category._meta.db_table} c ON c.id = p.category_id WHERE p.id IN ({placeholders})",
+                list(product_ids),
+            )
+
+    def remove_products(self, product_ids):
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", list(product_ids))
+
+    def index_category(self, category):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {self.table} SET category = %s WHERE rowid IN "
+                f"(SELECT id FROM {Product._meta.db_table} WHERE category_id = %s)",
+                [category.name, category.pk],
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description, category) "
+                f"SELECT p.id, p.name, p.description, c.name FROM {Product._meta.db_table} p "
+                f"JOIN {Category._meta.db_table} c ON c.id = p.category_id"
+            )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL tsvector search. Migration 0008 adds a GIN expression index
+    matching ``vector()`` so the database maintains the index itself.
+    """
+
+    config = "english"
+
+    def index_products(self, product_ids):
+        pass
+
+    def vector(self):
+        from django.contrib.postgres.search import SearchVector
+
+        return SearchVector("name", weight="A", config=self.config) + SearchVector(
+            "description", weight="B", config=self.config
+        )
+
+    def search(self, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        words = tokenize(query)
+        if not words:
+            return Product.objects.none()
+        search_query = SearchQuery(" & ".join(f"{word}:*" for word in words), search_type="raw", config=self.config)
+        category_ids = Category.objects.filter(
+            functools.reduce(operator.or_, [Q(name__icontains=word) for word in words])
+        ).values("id")
+        return Product.objects.annotate(
+            search_vector=self.vector(), search_rank=SearchRank(self.vector(), search_query)
+        ).filter(Q(search_vector=search_query) | Q(category_id__in=category_ids)).order_by("-search_rank", "id")
+
+
+VENDOR_BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_search_backend():
+    path = getattr(settings, "STORE_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == "sqlite" and SQLiteSearchBackend.table not in connection.introspection.table_names():
+        # FTS5 missing from this SQLite build; migration 0008 skipped the table.
+        return BasicSearchBackend()
+    return VENDOR_BACKENDS.get(connection.vendor, BasicSearchBackend)()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product(sender, instance, **kwargs):
+    get_search_backend().remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        get_search_backend().index_category(instance)
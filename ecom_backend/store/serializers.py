@@ -1,10 +1,93 @@
 from rest_framework import serializers
-from .models import Category, Product, Order, OrderItem, Profile
+from rest_framework.validators import UniqueValidator
+from .models import Category, Product, Order, OrderItem, Profile, UserDeletion
+from . import images, slugs
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.utils.text import slugify
 
-class CategorySerializer(serializers.ModelSerializer):
+
+def query_param_set(request, name):
+    if request is None:
+        return set()
+    return {value.strip() for value in request.query_params.get(name, "").split(",") if value.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Lets the client shape responses through query params:
+
+    - ``?fields=id,name`` keeps only those top-level fields.
+    - ``?expand=category,supplier`` returns full nested objects for those
+      fields when the view asked for compact output (``context["compact"]``,
+      set on list endpoints). Compact output replaces each entry of
+      ``compact_fields`` with a small id-plus-name representation.
+    """
+    compact_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if self.context.get("compact"):
+            expand = query_param_set(request, "expand")
+            for name, compact_field in self.compact_fields.items():
+                if name in fields and name not in expand:
+                    fields[name] = compact_field()
+        root = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+        if root is None:
+            only = query_param_set(request, "fields")
+            if only:
+                fields = {name: field for name, field in fields.items() if name in only or field.write_only}
+        return fields
+
+
+class CategoryRefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ["id", "name"]
+
+
+class UserRefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ["id", "username", "email"]
+
+
+class UniqueSlugMixin:
+    """
+    Fills in ``slug`` from ``slug_source`` when the client does not send
+    one, unique among the model's rows (store.slugs). Renaming a row
+    re-derives its slug unless it still fits the new name.
+    """
+    slug_source = "name"
+
+    def create(self, validated_data):
+        if validated_data.get("slug"):
+            return super().create(validated_data)
+        create = super().create
+        return slugs.save_with_slug(
+            self.Meta.model.objects.all(),
+            slugify(validated_data[self.slug_source]),
+            lambda slug: create({**validated_data, "slug": slug}),
+        )
+
+    def update(self, instance, validated_data):
+        if self.slug_source not in validated_data or validated_data.get("slug"):
+            return super().update(instance, validated_data)
+        update = super().update
+        return slugs.save_with_slug(
+            self.Meta.model.objects.exclude(pk=instance.pk),
+            slugify(validated_data[self.slug_source]),
+            lambda slug: update(instance, {**validated_data, "slug": slug}),
+            current=instance.slug,
+        )
+
+
+class CategorySerializer(UniqueSlugMixin, serializers.ModelSerializer):
+    slug = serializers.SlugField(
+        max_length=50, required=False, validators=[UniqueValidator(queryset=Category.objects.all())]
+    )
+
     class Meta:
         model = Category
         fields = "__all__"
@@ -14,14 +97,15 @@ class ProfileSerializer(serializers.ModelSerializer):
         model = Profile
         fields = ['role', 'is_approved', 'age']
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     profile = ProfileSerializer(read_only=True)
     class Meta:
         model = User
         fields = ["id", "username", "email", "first_name", "last_name", "is_staff", "is_superuser", "profile"]
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(UniqueSlugMixin, SparseFieldsMixin, serializers.ModelSerializer):
     image = serializers.ImageField(required=False)
+    srcset = serializers.SerializerMethodField()
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(), source="category", write_only=True
@@ -29,33 +113,17 @@ class ProductSerializer(serializers.ModelSerializer):
     slug = serializers.SlugField(read_only=True) # Make slug read-only
     supplier = UserSerializer(read_only=True)
 
+    compact_fields = {
+        "category": lambda: CategoryRefSerializer(read_only=True),
+        "supplier": lambda: UserRefSerializer(read_only=True),
+    }
+
     class Meta:
         model = Product
-        fields = ["id","name","slug","description","price","stock","image","category","category_id", "supplier"]
-
-    def create(self, validated_data):
-        # Generate slug if not provided (though it's read_only, this handles potential direct API calls)
-        if 'slug' not in validated_data or not validated_data['slug']:
-            validated_data['slug'] = slugify(validated_data['name'])
-            # Ensure uniqueness for the generated slug
-            original_slug = validated_data['slug']
-            counter = 1
-            while Product.objects.filter(slug=validated_data['slug']).exists():
-                validated_data['slug'] = f"{original_slug}-{counter}"
-                counter += 1
-        return super().create(validated_data)
+        fields = ["id","name","slug","description","price","stock","image","srcset","category","category_id", "supplier"]
 
-    def update(self, instance, validated_data):
-        # If name is updated, regenerate slug unless a slug is explicitly provided
-        if 'name' in validated_data and 'slug' not in validated_data:
-            validated_data['slug'] = slugify(validated_data['name'])
-            # Ensure uniqueness for the generated slug during update
-            original_slug = validated_data['slug']
-            counter = 1
-            while Product.objects.filter(slug=validated_data['slug']).exclude(pk=instance.pk).exists():
-                validated_data['slug'] = f"{original_slug}-{counter}"
-                counter += 1
-        return super().update(instance, validated_data)
+    def get_srcset(self, obj):
+        return images.srcset(obj.image.name, obj.image_variants, self.context.get("request"))
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -63,17 +131,19 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ["id","product","quantity","price","subtotal"]
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
-    total = serializers.SerializerMethodField()
+    # the stored Decimal, rendered as a JSON number as before
+    total = serializers.ReadOnlyField()
     user = UserSerializer(read_only=True)
 
+    compact_fields = {
+        "user": lambda: UserRefSerializer(read_only=True),
+    }
+
     class Meta:
         model = Order
-        fields = ["id","user","created_at","status","is_seen","items","total"]
-
-    def get_total(self, obj):
-        return obj.total()
+        fields = ["id","user","created_at","status","is_seen","items","total","item_count"]
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -97,7 +167,9 @@ class RegisterSerializer(serializers.ModelSerializer):
             last_name=validated_data.get("last_name", ""),
             password=validated_data["password"]
         )
-        user.is_staff = False
-        user.is_superuser = False
-        user.save()
         return user
+
+class UserDeletionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserDeletion
+        fields = ["user_id", "username", "status", "progress", "created_at", "updated_at", "finished_at"]
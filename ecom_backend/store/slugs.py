@@ -0,0 +1,87 @@
+import re
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.db.models.functions import Length
+
+# Unique slugs for rows named by users (products, categories).
+#
+# A name whose slug is taken gets the next numeric suffix: "t-shirt",
+# "t-shirt-1", "t-shirt-2", ... The next suffix is found with a single
+# query: the slug's variants are a contiguous prefix range of the unique
+# slug index, and the longest, then greatest, of them carries the highest
+# number. Two requests can still pick the same slug; the loser's
+# INSERT/UPDATE fails on the unique constraint inside a savepoint and it
+# picks again.
+
+ATTEMPTS = 5
+
+# Room kept for "-<number>" in the column: bases longer than
+# max_length - SUFFIX_ROOM are cut, so every variant fits.
+SUFFIX_ROOM = 8
+
+
+def numbered(base):
+    return re.compile(rf"^{re.escape(base)}-([0-9]+)$")
+
+
+def is_variant(slug, base):
+    return slug == base or bool(numbered(base).match(slug or ""))
+
+
+def variants_range(queryset, base, field):
+    if connections[queryset.db].vendor == "sqlite":
+        # SQLite's LIKE is case-insensitive and cannot use the (binary)
+        # unique index; a range over it can.
+        return Q(**{f"{field}__gte": f"{base}-", f"{field}__lt": f"{base}."})
+    # Elsewhere startswith uses the pattern index Django creates for unique
+    # slugs, and a range would depend on the column's collation.
+    return Q(**{f"{field}__startswith": f"{base}-"})
+
+
+def next_free_slug(queryset, base, field="slug"):
+    """The first unused slug for ``base`` among the rows of ``queryset``."""
+    pattern = numbered(base)
+    taken = queryset.filter(Q(**{field: base}) | variants_range(queryset, base, field)).order_by(
+        Length(field).desc(), f"-{field}"
+    ).values_list(field, flat=True)
+    # Other names sharing the prefix ("t-shirt-red") are skipped here rather
+    # than with a regex lookup, which SQLite evaluates in Python per row.
+    for slug in taken.iterator(chunk_size=100):
+        if slug == base:
+            return f"{base}-1"
+        match = pattern.match(slug)
+        if match:
+            return f"{base}-{int(match.group(1)) + 1}"
+    return base
+
+
+def clean_base(queryset, base, field="slug"):
+    max_length = queryset.model._meta.get_field(field).max_length
+    base = base or queryset.model._meta.model_name
+    # Cut whenever a suffix would not fit, not only when the bare slug does
+    # not: the database may not check the length (SQLite) or may reject it
+    # with an error that is not an IntegrityError (PostgreSQL).
+    return base if len(base) <= max_length - SUFFIX_ROOM else base[:max_length - SUFFIX_ROOM].rstrip("-")
+
+
+def save_with_slug(queryset, base, save, current=None, field="slug"):
+    """
+    Call ``save(slug)`` with a free slug for ``base`` and return its
+    result. ``current`` is kept when it already is a variant of ``base``
+    (renaming "Hat" to "hat" keeps "hat-3"). Exclude the row being updated
+    from ``queryset``.
+    """
+    name, base = base, clean_base(queryset, base, field)
+    # A slug allocated before bases were cut that short is kept too.
+    if current and (current == name or is_variant(current, base)):
+        return save(current)
+    for attempt in range(1, ATTEMPTS + 1):
+        slug = next_free_slug(queryset, base, field)
+        try:
+            with transaction.atomic():
+                return save(slug)
+        except IntegrityError:
+            # Lost the race for this slug; anything else is not ours to retry.
+            if attempt == ATTEMPTS or not queryset.filter(**{field: slug}).exists():
+                raise
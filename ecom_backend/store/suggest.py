@@ -0,0 +1,88 @@
+import bisect
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, Product
+
+# In-memory prefix index for search-box suggestions. Terms are the words of
+# every product name plus whole category names, kept in one sorted list so a
+# prefix lookup is a bisect plus a slice. The index is built on first use,
+# dropped by the signal handlers below whenever the catalog changes, and
+# also expires after STORE_SUGGEST_TTL seconds so other worker processes
+# pick up changes they did not see.
+
+WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+class PrefixIndex:
+    def __init__(self, terms):
+        self.terms = sorted(set(terms))
+
+    def lookup(self, prefix, limit):
+        start = bisect.bisect_left(self.terms, prefix)
+        matches = []
+        for term in self.terms[start:start + limit]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+
+def catalog_terms():
+    for name in Product.objects.values_list("name", flat=True).iterator(chunk_size=2000):
+        yield from WORD_RE.findall(name.lower())
+    for name in Category.objects.values_list("name", flat=True):
+        yield name.lower()
+
+
+_index = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+
+def get_index():
+    global _index, _built_at
+    ttl = getattr(settings, "STORE_SUGGEST_TTL", 300)
+    index = _index
+    if index is not None and time.monotonic() - _built_at < ttl:
+        return index
+    with _lock:
+        if _index is None or time.monotonic() - _built_at >= ttl:
+            _index = PrefixIndex(catalog_terms())
+            _built_at = time.monotonic()
+        return _index
+
+
+def invalidate():
+    global _index
+    _index = None
+
+
+def suggest(query, limit=10):
+    words = WORD_RE.findall(query.lower())
+    if not words:
+        return []
+    # Complete the word being typed; the whole query is tried first so
+    # multi-word category names still match.
+    phrase = " ".join(words)
+    index = get_index()
+    results = index.lookup(phrase, limit) if len(words) > 1 else []
+    for term in index.lookup(words[-1], limit):
+        if len(results) >= limit:
+            break
+        if term not in results:
+            results.append(term)
+    return results
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_suggestions(sender, **kwargs):
+    invalidate()
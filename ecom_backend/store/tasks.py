@@ -0,0 +1,167 @@
+import functools
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import BackgroundTask, UserDeletion
+
+# Background tasks for the slow side effects of writes.
+#
+# Functions decorated with @task run inline when called and are queued with
+# .delay(*args, **kwargs); arguments must be JSON-serializable. A failing
+# task is retried up to max_attempts times, waiting retry_delay seconds
+# doubled on every attempt. STORE_TASKS_BACKEND picks the executor:
+#
+# - ThreadPoolBackend runs tasks in a pool of STORE_TASKS_WORKERS threads
+#   of the web process once the enqueuing transaction commits. Tasks still
+#   queued when the process exits are lost.
+# - DatabaseBackend writes a BackgroundTask row in the enqueuing
+#   transaction, so the task exists exactly when the write does, and
+#   `manage.py run_tasks` workers execute it. A worker that dies mid-task
+#   leaves the row to be picked up again once STORE_TASKS_LEASE runs out.
+# - ImmediateBackend runs tasks once the transaction commits, on the same
+#   thread (tests, scripts).
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+class Task:
+    def __init__(self, func, name, max_attempts, retry_delay):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        functools.update_wrapper(self, func)
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue a call of the task with ``get_backend()``."""
+        get_backend().enqueue(self.name, list(args), kwargs)
+
+    def backoff(self, attempt):
+        """Seconds to wait before retrying after failed attempt number ``attempt``."""
+        return self.retry_delay * 2 ** (attempt - 1)
+
+
+def task(name=None, max_attempts=3, retry_delay=5):
+    def register(func):
+        registered = Task(func, name or f"{func.__module__}.{func.__qualname__}", max_attempts, retry_delay)
+        TASKS[registered.name] = registered
+        return registered
+    return register
+
+
+class BaseTaskBackend:
+    def enqueue(self, name, args, kwargs):
+        raise NotImplementedError
+
+
+class ImmediateBackend(BaseTaskBackend):
+    def enqueue(self, name, args, kwargs):
+        transaction.on_commit(lambda: self.run(name, args, kwargs))
+
+    def run(self, name, args, kwargs):
+        current = TASKS[name]
+        for attempt in range(1, current.max_attempts + 1):
+            try:
+                return current(*args, **kwargs)
+            except Exception:
+                logger.exception("Task %s failed (attempt %d of %d)", name, attempt, current.max_attempts)
+
+
+class ThreadPoolBackend(BaseTaskBackend):
+    def __init__(self, workers=None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or getattr(settings, "STORE_TASKS_WORKERS", 2), thread_name_prefix="store-tasks",
+        )
+
+    def enqueue(self, name, args, kwargs):
+        transaction.on_commit(lambda: self.executor.submit(self.run, name, args, kwargs, 1))
+
+    def run(self, name, args, kwargs, attempt):
+        current = TASKS[name]
+        try:
+            current(*args, **kwargs)
+        except Exception:
+            logger.exception("Task %s failed (attempt %d of %d)", name, attempt, current.max_attempts)
+            if attempt < current.max_attempts:
+                retry = threading.Timer(
+                    current.backoff(attempt), self.executor.submit, (self.run, name, args, kwargs, attempt + 1),
+                )
+                retry.daemon = True
+                retry.start()
+        finally:
+            # Pool threads outlive requests; do not leave their connections open.
+            connections.close_all()
+
+
+class DatabaseBackend(BaseTaskBackend):
+    def enqueue(self, name, args, kwargs):
+        BackgroundTask.objects.create(name=name, args=args, kwargs=kwargs)
+
+    def claim(self, limit):
+        """Lease up to ``limit`` due tasks to this worker and return them."""
+        now = timezone.now()
+        lease = now + timedelta(seconds=getattr(settings, "STORE_TASKS_LEASE", 300))
+        due = BackgroundTask.objects.filter(run_after__lte=now).exclude(status="Failed").order_by("run_after")
+        claimed = []
+        for candidate in due[:limit]:
+            # Only the worker whose update matches the row it read gets the task.
+            won = BackgroundTask.objects.filter(pk=candidate.pk, run_after=candidate.run_after).exclude(
+                status="Failed"
+            ).update(status="Running", attempts=F("attempts") + 1, run_after=lease)
+            if won:
+                candidate.attempts += 1
+                claimed.append(candidate)
+        return claimed
+
+    def run_due(self, limit=10):
+        """Run up to ``limit`` due tasks; returns how many ran."""
+        claimed = self.claim(limit)
+        for queued in claimed:
+            self.run(queued)
+        return len(claimed)
+
+    def run(self, queued):
+        current = TASKS.get(queued.name)
+        try:
+            if current is None:
+                raise LookupError(f"Unknown task {queued.name}")
+            current(*queued.args, **queued.kwargs)
+        except Exception:
+            logger.exception("Task %s failed (attempt %d)", queued.name, queued.attempts)
+            retry = current is not None and queued.attempts < current.max_attempts
+            BackgroundTask.objects.filter(pk=queued.pk).update(
+                status="Pending" if retry else "Failed",
+                run_after=timezone.now() + timedelta(seconds=current.backoff(queued.attempts) if retry else 0),
+                last_error=traceback.format_exc(),
+            )
+        else:
+            BackgroundTask.objects.filter(pk=queued.pk).delete()
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend():
+    return import_string(getattr(settings, "STORE_TASKS_BACKEND", "store.tasks.ThreadPoolBackend"))()
+
+
+@task()
+def delete_user(user_id):
+    """Run the pending UserDeletion of ``user_id`` (see store.deletion); resumes a partial one."""
+    from .deletion import purge_user
+
+    deletion = UserDeletion.objects.filter(user_id=user_id).exclude(status="Done").first()
+    if deletion is not None:
+        purge_user(deletion)
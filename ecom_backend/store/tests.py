@@ -1,3 +1,1653 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import quote
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.text import slugify
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import analytics, async_views, authentication, deletion, events, images, recommend, slugs, tasks
+from . import urls as store_urls
+from .cache import generation_key as cache_generation_key, get_generation
+from .models import BackgroundTask, Category, CoPurchase, Product, Order, OrderItem, Profile, RelatedProduct, UserDeletion
+from .orders import InsufficientStock, place_order
+from .queries import order_queryset
+from .search import BasicSearchBackend, get_search_backend
+from .suggest import suggest
+from .views import OrderViewSet
 
 # Create your tests here.
+
+
+fast_hashing = override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+
+
+class StoreFixtures:
+    def setUp(self):
+        cache.clear()
+        # The task backend is built once; pick up per-test STORE_TASKS_BACKEND.
+        tasks.get_backend.cache_clear()
+        self.addCleanup(tasks.get_backend.cache_clear)
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username="admin", password="pass12345", is_staff=True)
+        self.customer = User.objects.create_user(username="customer", password="pass12345")
+        self.supplier = User.objects.create_user(username="supplier", password="pass12345")
+        self.supplier.profile.role = 'Supplier'
+        self.supplier.profile.is_approved = True
+        self.supplier.profile.save()
+        self.category = Category.objects.create(name="Phones", slug="phones")
+
+    def make_product(self, name="Phone", price="10.00", stock=100, **kwargs):
+        kwargs.setdefault("supplier", self.supplier)
+        kwargs.setdefault("category", self.category)
+        kwargs.setdefault("slug", f"{slugify(name)}-{Product.objects.count()}")
+        return Product.objects.create(name=name, price=Decimal(price), stock=stock, **kwargs)
+
+    def make_order(self, user=None, lines=2):
+        order = Order.objects.create(user=user or self.customer, supplier=self.supplier)
+        for i in range(lines):
+            product = self.make_product(name=f"Item {i}")
+            OrderItem.objects.create(order=order, product=product, quantity=i + 1, price=product.price)
+        return order
+
+
+@fast_hashing
+class StoreTestCase(StoreFixtures, TestCase):
+    pass
+
+
+class OrderQueryPlanTests(StoreTestCase):
+    def assert_constant_queries(self, url, user, expected):
+        self.client.force_authenticate(user)
+        self.make_order()
+        with self.assertNumQueries(expected):
+            small = self.client.get(url)
+        for _ in range(5):
+            self.make_order(lines=3)
+        with self.assertNumQueries(expected):
+            large = self.client.get(url)
+        self.assertEqual(len(small.data["results"]), 1)
+        self.assertEqual(len(large.data["results"]), 6)
+        return large
+
+    def test_admin_order_list_uses_fixed_query_count(self):
+        # orders + prefetched items
+        response = self.assert_constant_queries("/api/orders/", self.admin, 2)
+        self.assertEqual(response.data["results"][0]["total"], Decimal("60.00"))
+
+    def test_supplier_order_list_uses_fixed_query_count(self):
+        self.assert_constant_queries("/api/orders/", self.supplier, 2)
+
+    def test_my_orders_uses_fixed_query_count(self):
+        self.assert_constant_queries("/api/my-orders/", self.customer, 2)
+
+    def test_total_matches_python_sum(self):
+        order = Order.objects.get(pk=self.make_order(lines=3).pk)
+        items = list(order.items.all())
+        self.assertEqual(order.total, sum(item.subtotal() for item in items))
+        self.assertEqual(order.item_count, sum(item.quantity for item in items))
+
+    def test_empty_order_total_is_zero(self):
+        order = Order.objects.create(user=self.customer)
+        self.assertEqual(order_queryset().get(pk=order.pk).total, 0)
+
+
+class IndexUsageTests(StoreTestCase):
+    """
+    EXPLAIN every query a hot endpoint runs and fail on full scans of the
+    store tables. Postgres would happily seq-scan tables this small, so
+    sequential scans are disabled there first: any that remain have no
+    usable index.
+    """
+    HOT_TABLES = {"store_product", "store_order", "store_orderitem", "store_profile"}
+
+    def setUp(self):
+        super().setUp()
+        self.make_order()
+        self.make_order(user=self.admin)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def full_scans(self, plan):
+        if connection.vendor == "postgresql":
+            return [line for line in plan if any(f"Seq Scan on {table}" in line for table in self.HOT_TABLES)]
+        # SQLite reports "SCAN t" for a table scan, "SCAN t USING INDEX i" for an index walk.
+        return [line for line in plan if re.fullmatch(r"SCAN \w+", line.strip())]
+
+    def assert_uses_indexes(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertIn(response.status_code, (200, 304))
+        explained = 0
+        for query in queries.captured_queries:
+            if query["sql"].startswith("SELECT") and any(table in query["sql"] for table in self.HOT_TABLES):
+                plan = self.explain(query["sql"])
+                explained += 1
+                self.assertFalse(self.full_scans(plan), f"{query['sql']}\n{plan}")
+        self.assertTrue(explained)
+
+    def test_product_lists(self):
+        self.assert_uses_indexes(lambda: self.client.get("/api/products/"))
+        self.assert_uses_indexes(lambda: self.client.get("/api/products/", {"category": self.category.id}))
+        self.assert_uses_indexes(lambda: self.client.get("/api/products/", {"supplier": self.supplier.id}))
+
+    def test_order_lists(self):
+        self.client.force_authenticate(self.customer)
+        self.assert_uses_indexes(lambda: self.client.get("/api/my-orders/"))
+        self.client.force_authenticate(self.supplier)
+        self.assert_uses_indexes(lambda: self.client.get("/api/orders/"))
+
+    def test_order_list_walks_the_pagination_index(self):
+        self.client.force_authenticate(self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/my-orders/")
+        plan = " ".join(self.explain(queries.captured_queries[0]["sql"]))
+        self.assertIn("order_user_created_idx", plan)
+        if connection.vendor == "sqlite":
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_unseen_orders_and_supplier_profiles(self):
+        unseen = Order.objects.filter(user=self.customer, is_seen=False)
+        self.assertIn("order_user_unseen_idx", unseen.explain())
+        pending = Profile.objects.filter(role="Supplier", is_approved=False)
+        self.assertIn("profile_role_approved_idx", pending.explain())
+
+    def test_stock_cannot_go_negative(self):
+        product = self.make_product(stock=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product.objects.filter(pk=product.pk).update(stock=F("stock") - 2)
+
+
+class ProductSearchTests(StoreTestCase):
+    def search(self, query, **params):
+        return self.client.get("/api/products/search/", {"q": query, **params})
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.make_product(name="Leather case", description="Fits every phone")
+        self.make_product(name="Phone stand")
+        response = self.search("phone")
+        self.assertEqual([p["name"] for p in response.data], ["Phone stand", "Leather case"])
+
+    def test_prefix_and_category_matches(self):
+        self.make_product(name="Galaxy S24")
+        self.assertEqual(len(self.search("gala").data), 1)
+        self.assertEqual(len(self.search("phones").data), 1)
+
+    def test_index_follows_updates_and_deletes(self):
+        product = self.make_product(name="Old name")
+        product.name = "Brand new"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(len(self.search("old").data), 0)
+        self.assertEqual(len(self.search("brand").data), 1)
+        self.category.name = "Tablets"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        self.assertEqual(len(self.search("tablets").data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(len(self.search("brand").data), 0)
+
+    def test_limit_offset_pagination(self):
+        for i in range(5):
+            self.make_product(name=f"Cable {i}")
+        response = self.search("cable", limit=2, offset=2)
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_punctuation_only_query_returns_nothing(self):
+        self.make_product(name="Cable")
+        self.assertEqual(self.search('"*').data, [])
+
+    def test_basic_backend_matches_indexed_backend(self):
+        self.make_product(name="Leather case", description="Fits every phone")
+        self.make_product(name="Phone stand")
+        self.make_product(name="Desk lamp")
+        for query in ("phone", "leather phone", "phones lamp"):
+            self.assertEqual(
+                set(BasicSearchBackend().search(query).values_list("id", flat=True)),
+                set(get_search_backend().search(query).values_list("id", flat=True)),
+            )
+
+
+class ProductSuggestTests(StoreTestCase):
+    def suggest(self, query):
+        return self.client.get("/api/products/suggest/", {"q": query}).data
+
+    def test_suggests_name_words_and_categories(self):
+        self.make_product(name="Gaming Mouse")
+        self.make_product(name="Game-pad")
+        self.assertEqual(self.suggest("gam"), ["game", "gaming"])
+        self.assertEqual(self.suggest("ph"), ["phones"])
+        self.assertEqual(self.suggest("wireless gam"), ["game", "gaming"])
+
+    def test_index_is_invalidated_by_catalog_changes(self):
+        product = self.make_product(name="Keyboard")
+        self.assertEqual(self.suggest("key"), ["keyboard"])
+        product.name = "Monitor"
+        product.save()
+        self.assertEqual(self.suggest("key"), [])
+        self.category.delete()
+        self.assertEqual(self.suggest("mon"), [])
+
+    def test_lookup_runs_no_queries_once_loaded(self):
+        self.make_product(name="Keyboard")
+        suggest("key")
+        with self.assertNumQueries(0):
+            self.assertEqual(suggest("keyb"), ["keyboard"])
+
+
+class PaginationTests(StoreTestCase):
+    def collect(self, url, **params):
+        seen, response = [], self.client.get(url, params)
+        while True:
+            seen.extend(item["id"] for item in response.data["results"])
+            if not response.data["next"]:
+                return seen
+            response = self.client.get(response.data["next"])
+
+    def test_product_pages_walk_the_catalog_once(self):
+        products = [self.make_product(name=f"Item {i}") for i in range(7)]
+        # identical timestamps must not lose or repeat rows between pages
+        Product.objects.update(created_at=products[0].created_at)
+        ids = self.collect("/api/products/", page_size=3)
+        self.assertEqual(ids, sorted(p.id for p in products))
+
+    def test_product_list_filters(self):
+        other = Category.objects.create(name="Laptops", slug="laptops")
+        self.make_product(name="Phone")
+        laptop = self.make_product(name="Laptop", category=other)
+        response = self.client.get("/api/products/", {"category": other.id})
+        self.assertEqual([p["id"] for p in response.data["results"]], [laptop.id])
+
+    def test_order_and_user_lists_are_paginated(self):
+        for _ in range(3):
+            self.make_order(lines=1)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(len(self.collect("/api/orders/", page_size=2)), 3)
+        self.assertEqual(len(self.collect("/api/users/", page_size=2)), 3)
+
+
+class CatalogCacheTests(StoreTestCase):
+    def test_product_list_is_served_from_cache(self):
+        self.make_product(name="Phone")
+        first = self.client.get("/api/products/")
+        # only the ETag aggregates run; the body comes from the cache
+        with self.assertNumQueries(2):
+            second = self.client.get("/api/products/")
+        self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(first.data, second.data)
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get("/api/products/", {"page_size": 1})
+        self.assertEqual(self.client.get("/api/products/", {"page_size": 2})["X-Cache"], "MISS")
+
+    def test_writes_invalidate_cached_responses(self):
+        product = self.make_product(name="Phone", stock=5)
+        self.client.get(f"/api/products/{product.id}/")
+        self.client.get("/api/categories/")
+        product.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(self.client.get(f"/api/products/{product.id}/").data["name"], "Renamed")
+        self.category.name = "Mobiles"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        self.assertEqual(self.client.get("/api/categories/").data[0]["name"], "Mobiles")
+
+    def test_generations_move_when_the_write_commits(self):
+        before = get_generation("product")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_product(name="Phone")
+            # A reader inside this window must not cache the old rows under a new generation.
+            self.assertEqual(get_generation("product"), before)
+        self.assertNotEqual(get_generation("product"), before)
+
+    def test_order_placement_invalidates_stock(self):
+        product = self.make_product(name="Phone", stock=5)
+        self.client.get(f"/api/products/{product.id}/")
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.customer, [{"product_id": product.id, "quantity": 2}])
+        self.assertEqual(self.client.get(f"/api/products/{product.id}/").data["stock"], 3)
+
+    def test_stats_endpoint(self):
+        self.client.get("/api/categories/")
+        self.client.get("/api/categories/")
+        self.client.force_authenticate(self.admin)
+        data = self.client.get("/api/cache/stats/").data
+        self.assertGreaterEqual(data["hits"], 1)
+        self.assertGreaterEqual(data["misses"], 1)
+
+
+class ConditionalGetTests(StoreTestCase):
+    def test_matching_etag_returns_304_without_serializing(self):
+        self.make_product(name="Phone")
+        etag = self.client.get("/api/products/")["ETag"]
+        # product and category aggregates only
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+    def test_etag_changes_with_the_resource(self):
+        product = self.make_product(name="Phone")
+        url = f"/api/products/{product.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.category.name = "Mobiles"
+        self.category.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_collection_etag_depends_on_filters_and_rows(self):
+        self.make_product(name="Phone")
+        etag = self.client.get("/api/products/")["ETag"]
+        self.assertNotEqual(self.client.get("/api/products/", {"page_size": 1})["ETag"], etag)
+        self.make_product(name="Case")
+        self.assertEqual(self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since(self):
+        product = self.make_product(name="Phone")
+        last_modified = self.client.get(f"/api/products/{product.id}/")["Last-Modified"]
+        response = self.client.get(f"/api/products/{product.id}/", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_collections_revalidate_by_etag_only(self):
+        phone = self.make_product(name="Phone")
+        self.make_product(name="Case")
+        response = self.client.get("/api/products/")
+        self.assertNotIn("Last-Modified", response)
+        # A deletion leaves the latest updated_at where it was.
+        phone.delete()
+        since = http_date(time.time() + 60)
+        self.assertEqual(self.client.get("/api/products/", HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+        self.assertEqual(self.client.get("/api/products/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_missing_product_is_still_404(self):
+        self.assertEqual(self.client.get("/api/products/999/").status_code, 404)
+
+
+class SparseFieldsTests(StoreTestCase):
+    def test_lists_default_to_compact_nested_objects(self):
+        product = self.make_product(name="Phone")
+        listed = self.client.get("/api/products/").data["results"][0]
+        self.assertEqual(listed["category"], {"id": self.category.id, "name": "Phones"})
+        self.assertEqual(set(listed["supplier"]), {"id", "username", "email"})
+        detail = self.client.get(f"/api/products/{product.id}/").data
+        self.assertIn("profile", detail["supplier"])
+
+    def test_expand_returns_full_objects(self):
+        self.make_product(name="Phone")
+        listed = self.client.get("/api/products/", {"expand": "supplier"}).data["results"][0]
+        self.assertIn("profile", listed["supplier"])
+        self.assertEqual(set(listed["category"]), {"id", "name"})
+
+    def test_fields_limits_top_level_fields(self):
+        self.make_product(name="Phone")
+        listed = self.client.get("/api/products/", {"fields": "id,name"}).data["results"][0]
+        self.assertEqual(set(listed), {"id", "name"})
+
+    def test_compact_order_list(self):
+        self.make_order()
+        self.client.force_authenticate(self.admin)
+        order = self.client.get("/api/orders/", {"fields": "id,user,items"}).data["results"][0]
+        self.assertEqual(set(order), {"id", "user", "items"})
+        self.assertEqual(set(order["user"]), {"id", "username", "email"})
+        self.assertEqual(set(order["items"][0]["product"]["supplier"]), {"id", "username", "email"})
+
+
+class FastSerializationParityTests(StoreTestCase):
+    def assert_same_bytes(self, url, params=None):
+        responses = []
+        for fast_path in (False, True):
+            cache.clear()
+            with self.settings(STORE_FAST_SERIALIZATION=fast_path):
+                responses.append(self.client.get(url, params or {}))
+        self.assertEqual(responses[0].status_code, 200)
+        self.assertEqual(responses[0].content, responses[1].content)
+        return responses[1]
+
+    def setUp(self):
+        super().setUp()
+        self.make_product(
+            name="Caf\u00e9 \u2028 \u00fcber \U0001f600", description='quote " slash \\ ctrl \x01', image="products/a b.jpg",
+            image_variants={
+                "source": "products/a b.jpg",
+                "image/webp": [[160, "products/derived/160w-0123.webp"], [320, "products/derived/320w-4567.webp"]],
+                "image/jpeg": [[160, "products/derived/160w-89ab.jpg"]],
+            },
+        )
+        self.make_product(name="Orphan", supplier=None, price="0.10")
+        order = self.make_order(lines=3)
+        OrderItem.objects.filter(order=order).first().product.delete()
+        Order.objects.create(user=self.customer)
+
+    def test_product_list(self):
+        self.assert_same_bytes("/api/products/")
+        self.assert_same_bytes("/api/products/", {"page_size": 2, "category": self.category.id})
+
+    def test_search(self):
+        self.assert_same_bytes("/api/products/search/", {"q": "item"})
+        self.assert_same_bytes("/api/products/search/", {"q": "item", "limit": 1, "offset": 1})
+
+    def test_my_orders(self):
+        self.client.force_authenticate(self.customer)
+        response = self.assert_same_bytes("/api/my-orders/")
+        self.assertEqual(len(response.data["results"]), 2)
+
+
+class ExportTests(StoreTestCase):
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_product_ndjson_matches_list_representation(self):
+        self.make_product(name="Phone")
+        self.make_product(name="Tablet", category=Category.objects.create(name="Tablets", slug="tablets"))
+        self.client.force_authenticate(self.supplier)
+        response, body = self.export("/api/products/export/", category=self.category.id)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(rows, json.loads(self.client.get("/api/products/", {"category": self.category.id}).content)["results"])
+
+    def test_product_csv(self):
+        self.make_product(name='Phone, "XL"')
+        self.client.force_authenticate(self.admin)
+        response, body = self.export("/api/products/export/", type="csv")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        header, row = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(header[:3], ["id", "name", "slug"])
+        self.assertEqual(row[1], 'Phone, "XL"')
+
+    def test_order_export_is_scoped_like_the_list(self):
+        mine = self.make_order(lines=3)
+        self.make_order(user=self.admin)
+        Order.objects.create(user=self.customer)
+        self.client.force_authenticate(self.customer)
+        _, body = self.export("/api/orders/export/")
+        orders = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(orders), 2)
+        self.assertEqual([len(order["items"]) for order in orders], [0, 3])
+        mine.refresh_from_db()
+        self.assertEqual(Decimal(str(orders[1]["total"])), mine.total)
+
+        _, body = self.export("/api/orders/export/", type="csv")
+        # One line per item, plus one for the empty order and the header.
+        self.assertEqual(len(list(csv.reader(io.StringIO(body)))), 5)
+
+    def test_anonymous_users_cannot_change_supplierless_products(self):
+        product = self.make_product(name="Orphan", supplier=None)
+        url = f"/api/products/{product.id}/"
+        self.assertIn(self.client.patch(url, {"name": "Mine"}).status_code, (401, 403))
+        self.assertIn(self.client.delete(url).status_code, (401, 403))
+        product.refresh_from_db()
+        self.assertEqual(product.name, "Orphan")
+
+    def test_export_permissions(self):
+        self.assertEqual(self.client.get("/api/orders/export/").status_code, 401)
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get("/api/products/export/").status_code, 403)
+
+
+class AuthenticationTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        authentication.clear()
+        self.addCleanup(authentication.clear)
+
+    def login(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_user_and_profile_load_in_one_query(self):
+        self.login(self.supplier)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/users/me/")
+        self.assertEqual(response.data["profile"]["role"], "Supplier")
+
+    def test_permission_checks_add_no_queries(self):
+        order = self.make_order()
+        self.login(self.supplier)
+        # Auth, order list page with its items.
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get("/api/orders/").status_code, 200)
+        # Auth, the order, its items, then in a savepoint the locked status
+        # read, the update and the status rollup.
+        with self.assertNumQueries(8):
+            response = self.client.post(f"/api/orders/{order.id}/update_status/", {"status": "Shipped"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_unapproved_supplier_is_still_refused(self):
+        self.supplier.profile.is_approved = False
+        self.supplier.profile.save()
+        self.login(self.supplier)
+        self.assertEqual(self.client.get("/api/products/export/").status_code, 403)
+
+    @override_settings(STORE_AUTH_CACHE_TTL=60)
+    def test_ttl_cache_skips_the_user_query_until_the_profile_changes(self):
+        self.login(self.supplier)
+        self.client.get("/api/users/me/")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/users/me/").data["profile"]["role"], "Supplier")
+
+        self.supplier.profile.is_approved = False
+        self.supplier.profile.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/api/users/me/").data["profile"]["is_approved"], False)
+        self.assertEqual(self.client.get("/api/products/export/").status_code, 403)
+
+    @override_settings(STORE_AUTH_CACHE_TTL=60, STORE_AUTH_CACHE_USERS=2)
+    def test_ttl_cache_stays_bounded_across_token_refreshes(self):
+        clock = [1000.0]
+        with mock.patch("store.authentication.time.monotonic", lambda: clock[0]):
+            for iat in range(100):
+                authentication.cache_user(self.supplier, iat, 60)
+                clock[0] += 31
+            # Only the tokens cached within the last TTL are kept.
+            self.assertEqual(sorted(authentication._users[str(self.supplier.pk)]), [98, 99])
+            self.assertIsNotNone(authentication.cached_user(self.supplier.pk, 99))
+            authentication.cache_user(self.customer, 0, 60)
+            authentication.cache_user(self.admin, 0, 60)
+        self.assertEqual(list(authentication._users), [str(self.customer.pk), str(self.admin.pk)])
+
+
+class AccountWriteTests(StoreTestCase):
+    def test_register(self):
+        # Username check, user, profile, approval, and the two supplier checks
+        # the product cache makes for profile writes.
+        with self.assertNumQueries(6):
+            response = self.client.post("/api/users/register/", {
+                "username": "new", "email": "new@example.com", "password": "Xy7!kq93ab", "password2": "Xy7!kq93ab",
+            })
+        self.assertEqual(response.status_code, 201)
+        profile = User.objects.get(username="new").profile
+        self.assertEqual((profile.role, profile.is_approved), ("Client", True))
+
+    def test_login(self):
+        with self.assertNumQueries(1):
+            response = self.client.post("/api/auth/token/", {"username": "customer", "password": "pass12345"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_password_change_writes_only_the_password(self):
+        self.client.force_authenticate(self.customer)
+        with self.assertNumQueries(1):
+            response = self.client.post("/api/users/change-password/", {"old_password": "pass12345", "new_password": "Other!pass99"})
+        self.assertEqual(response.status_code, 200)
+        self.customer.refresh_from_db()
+        self.assertTrue(self.customer.check_password("Other!pass99"))
+
+    def test_worker_registration_and_approval(self):
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(6):
+            response = self.client.post("/api/users/workers/register/", {"username": "worker", "password": "pw12345"})
+        self.assertEqual(response.status_code, 201)
+        worker = User.objects.select_related("profile").get(username="worker")
+        self.assertTrue(worker.is_staff)
+        self.assertEqual((worker.profile.role, worker.profile.is_approved), ("Supplier", False))
+
+        url = f"/api/users/workers/{worker.id}/approve/"
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.post(url, {"action": "approve"}).status_code, 200)
+        # Approving again changes nothing, so nothing is written.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.post(url, {"action": "approve"}).status_code, 200)
+        worker.profile.refresh_from_db()
+        self.assertTrue(worker.profile.is_approved)
+
+    def test_users_without_a_profile_get_one_on_demand(self):
+        Profile.objects.filter(user=self.customer).delete()
+        customer = User.objects.get(pk=self.customer.pk)
+        self.client.force_authenticate(customer)
+        response = self.client.post("/api/users/request-supplier/", {"age": 30})
+        self.assertEqual(response.status_code, 200)
+        profile = Profile.objects.get(user=self.customer)
+        self.assertEqual((profile.role, profile.is_approved, profile.age), ("Supplier", False, 30))
+
+
+class UnseenOrderTests(StoreTestCase):
+    url = "/api/my-orders/unseen-count/"
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.customer)
+        self.orders = [self.make_order(lines=1) for _ in range(3)]
+        self.make_order(user=self.admin)
+
+    def test_count_is_cached_and_etagged(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data, {"unseen": 3})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data, {"unseen": 3})
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_seen_and_status_changes_move_the_count(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/api/orders/{self.orders[0].id}/mark_as_seen/")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data), (200, {"unseen": 2}))
+
+        self.client.force_authenticate(self.supplier)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/orders/{self.orders[0].id}/update_status/", {"status": "Shipped"})
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(self.url).data, {"unseen": 3})
+
+    def test_mark_all_seen_is_one_update(self):
+        with self.assertNumQueries(1):
+            response = self.client.post("/api/my-orders/mark-all-seen/")
+        self.assertEqual(response.data, {"updated": 3})
+        self.assertEqual(self.client.get(self.url).data, {"unseen": 0})
+        self.assertEqual(Order.objects.filter(is_seen=False).count(), 1)
+
+
+@override_settings(STORE_EVENTS_STREAM_SECONDS=0, STORE_EVENTS_POLL_TIMEOUT=0)
+class OrderEventTests(StoreTestCase):
+    url = "/api/orders/events/"
+
+    def setUp(self):
+        super().setUp()
+        events.get_backend.cache_clear()
+        self.addCleanup(events.get_backend.cache_clear)
+        self.order = self.make_order(lines=1)
+
+    def update_status(self, status):
+        self.client.force_authenticate(self.supplier)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/orders/{self.order.id}/update_status/", {"status": status})
+
+    def poll(self, user, after=0):
+        self.client.force_authenticate(user)
+        return self.client.get(self.url, {"mode": "poll", "after": after}).data
+
+    def test_status_changes_reach_the_customer_supplier_and_staff(self):
+        self.update_status("Shipped")
+        for user in (self.customer, self.supplier, self.admin):
+            data = self.poll(user)
+            self.assertEqual([event["type"] for event in data["events"]], ["order.status"])
+            self.assertEqual(data["events"][0]["order"]["status"], "Shipped")
+        other = User.objects.create_user(username="other", password="pass12345")
+        self.assertEqual(self.poll(other)["events"], [])
+
+    def test_new_orders_are_published(self):
+        product = self.make_product(stock=5)
+        self.client.force_authenticate(self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/create-order/", {"items": [{"product_id": product.id, "quantity": 1}]}, format="json")
+        event = self.poll(self.supplier)["events"][0]
+        self.assertEqual((event["type"], event["order"]["user"]), ("order.created", self.customer.id))
+
+    def test_poll_resumes_after_the_last_id(self):
+        self.update_status("Shipped")
+        self.update_status("Delivered")
+        first = self.poll(self.customer)
+        self.assertEqual(len(first["events"]), 2)
+        self.assertEqual(self.poll(self.customer, after=first["events"][0]["id"])["events"], first["events"][1:])
+        self.assertEqual(self.poll(self.customer, after=first["last"])["events"], [])
+
+    def test_event_stream(self):
+        self.update_status("Shipped")
+        token = RefreshToken.for_user(self.customer).access_token
+        response = self.client.get(self.url, {"token": str(token)}, HTTP_ACCEPT="text/event-stream", HTTP_LAST_EVENT_ID="0")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join(response.streaming_content).decode()
+        self.assertIn("event: order.status\n", body)
+        self.assertIn('"status": "Shipped"', body)
+
+    def test_stream_requires_authentication(self):
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT="text/event-stream").status_code, 401)
+
+    def test_cache_backend_is_shared_between_instances(self):
+        publisher, subscriber = events.CacheBackend(), events.CacheBackend()
+        seq = publisher.publish({"user:1"}, {"type": "order.status"})
+        publisher.publish({"user:2"}, {"type": "order.status"})
+        self.assertEqual(subscriber.read(frozenset({"user:1"}), seq - 1), [(seq, {"type": "order.status"})])
+        self.assertEqual(subscriber.read(frozenset({"user:1"}), seq), [])
+
+
+@override_settings(STORE_TASKS_BACKEND="store.tasks.ImmediateBackend", STORE_IMAGE_WIDTHS=(160, 320, 640))
+class ImageDerivativeTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client.force_authenticate(self.supplier)
+
+    def upload(self, size=(800, 600), mode="RGB", image_format="JPEG"):
+        buffer = io.BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128) if mode == "RGBA" else (200, 30, 30)).save(buffer, image_format)
+        extension = image_format.lower()
+        return SimpleUploadedFile(f"photo.{extension}", buffer.getvalue(), content_type=f"image/{extension}")
+
+    def create(self, image, name="Phone"):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/products/", {
+                "name": name, "price": "5.00", "stock": 1, "category_id": self.category.id, "image": image,
+            })
+        self.assertEqual(response.status_code, 201)
+        return Product.objects.get(pk=response.data["id"])
+
+    def open_variant(self, path):
+        with images.storage().open(path) as file:
+            image = Image.open(file)
+            image.load()
+        return image
+
+    def test_upload_writes_every_width_in_both_formats(self):
+        product = self.create(self.upload())
+        self.assertEqual(product.image_variants["source"], product.image.name)
+        for mime, image_format in (("image/webp", "WEBP"), ("image/jpeg", "JPEG")):
+            variants = product.image_variants[mime]
+            self.assertEqual([width for width, _ in variants], [160, 320, 640])
+            for width, path in variants:
+                self.assertRegex(path, rf"^products/derived/{width}w-[0-9a-f]{{16}}\.(webp|jpg)$")
+                image = self.open_variant(path)
+                self.assertEqual((image.format, image.size), (image_format, (width, width * 3 // 4)))
+
+        srcset = self.client.get(f"/api/products/{product.id}/").data["srcset"]
+        self.assertEqual(set(srcset), {"image/webp", "image/jpeg"})
+        self.assertRegex(srcset["image/webp"], r"^http://testserver/media/products/derived/160w-\w+\.webp 160w, .* 640w$")
+
+    def test_small_images_are_not_upscaled(self):
+        product = self.create(self.upload(size=(200, 100)))
+        self.assertEqual([width for width, _ in product.image_variants["image/jpeg"]], [160, 200])
+
+    def test_identical_derivatives_share_a_file(self):
+        first = self.create(self.upload(), name="First")
+        second = self.create(self.upload(), name="Second")
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_variants["image/webp"], second.image_variants["image/webp"])
+
+    def test_transparent_images_keep_alpha_in_webp_only(self):
+        product = self.create(self.upload(size=(320, 320), mode="RGBA", image_format="PNG"))
+        self.assertEqual(self.open_variant(product.image_variants["image/webp"][0][1]).mode, "RGBA")
+        self.assertEqual(self.open_variant(product.image_variants["image/jpeg"][0][1]).mode, "RGB")
+
+    def test_replaced_or_removed_images(self):
+        product = self.create(self.upload())
+        product.image = "products/elsewhere.jpg"
+        product.save()  # derivation is scheduled but not run
+        self.assertEqual(self.client.get(f"/api/products/{product.id}/").data["srcset"], {})
+        with self.assertLogs("store.images", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+            product.save()  # the missing file is logged and recorded as attempted
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {"source": "products/elsewhere.jpg"})
+        product.image = None
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+
+    def test_replaced_and_deleted_images_leave_no_files_behind(self):
+        product = self.create(self.upload())
+        shared = self.create(self.upload(), name="Shared")
+        old = images.files_of(product.image.name, product.image_variants)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/products/{product.id}/", {"image": self.upload(size=(400, 300))}, format="multipart")
+        self.assertEqual(response.status_code, 200)
+        product.refresh_from_db()
+        new = images.files_of(product.image.name, product.image_variants)
+        kept = images.files_of(None, shared.image_variants)
+        # The old upload is gone; its derivatives only where no other product shares them.
+        self.assertEqual({name for name in old if images.storage().exists(name)}, old & kept)
+        self.assertTrue(all(images.storage().exists(name) for name in new))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertFalse([name for name in new - kept if images.storage().exists(name)])
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.delete_products([shared.id])
+        self.assertFalse([name for name in kept | {shared.image.name} if images.storage().exists(name)])
+
+    def test_fast_path_matches(self):
+        self.create(self.upload())
+        responses = []
+        for fast_path in (False, True):
+            cache.clear()
+            with self.settings(STORE_FAST_SERIALIZATION=fast_path):
+                responses.append(self.client.get("/api/products/").content)
+        self.assertEqual(responses[0], responses[1])
+
+
+class MediaServeTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=media.name, STORE_MEDIA_MAX_AGE=60)
+        override.enable()
+        self.addCleanup(override.disable)
+        os.makedirs(os.path.join(media.name, "products", "derived"))
+        for name in ("products/a.jpg", "products/derived/160w-0123456789abcdef.webp"):
+            with open(os.path.join(media.name, name), "wb") as file:
+                file.write(b"0123456789")
+
+    def get(self, path="products/a.jpg", **headers):
+        response = self.client.get(f"/media/{path}", headers=headers)
+        if response.streaming:
+            response.body = b"".join(response.streaming_content)
+            response.close()
+        return response
+
+    def test_full_response_and_revalidation(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, b"0123456789")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response["Cache-Control"], "public, max-age=60")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(self.get(**{"If-None-Match": response["ETag"]}).status_code, 304)
+        self.assertEqual(self.get(**{"If-Modified-Since": response["Last-Modified"]}).status_code, 304)
+        self.assertEqual(self.get(**{"If-None-Match": '"other"'}).status_code, 200)
+
+    def test_hashed_names_are_immutable(self):
+        response = self.get("products/derived/160w-0123456789abcdef.webp")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Content-Type"], "image/webp")
+
+    def test_ranges(self):
+        for header, body, content_range in (
+            ("bytes=2-5", b"2345", "bytes 2-5/10"),
+            ("bytes=7-", b"789", "bytes 7-9/10"),
+            ("bytes=-3", b"789", "bytes 7-9/10"),
+            ("bytes=8-100", b"89", "bytes 8-9/10"),
+        ):
+            response = self.get(Range=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual((response.body, response["Content-Range"]), (body, content_range))
+            self.assertEqual(response["Content-Length"], str(len(body)))
+
+        response = self.get(Range="bytes=10-")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, "bytes */10"))
+        # Malformed, multi-range and stale If-Range requests get the whole file.
+        self.assertEqual(self.get(Range="bytes=5-2").status_code, 200)
+        self.assertEqual(self.get(Range="bytes=0-1,4-5").status_code, 200)
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(Range="bytes=0-1", **{"If-Range": etag}).status_code, 206)
+        self.assertEqual(self.get(Range="bytes=0-1", **{"If-Range": '"stale"'}).status_code, 200)
+
+    def test_missing_and_outside_files(self):
+        self.assertEqual(self.get("products/missing.jpg").status_code, 404)
+        self.assertEqual(self.get("products").status_code, 404)
+        self.assertEqual(self.get("../settings.py").status_code, 404)
+        self.assertEqual(self.client.post("/media/products/a.jpg").status_code, 405)
+
+    def test_proxy_offload(self):
+        with self.settings(STORE_MEDIA_ACCEL="nginx"):
+            response = self.get()
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/products/a.jpg")
+        self.assertEqual(response.content, b"")
+        self.assertIn("ETag", response)
+        with self.settings(STORE_MEDIA_ACCEL="sendfile"):
+            response = self.get()
+        self.assertEqual(response["X-Sendfile"], os.path.join(settings.MEDIA_ROOT, "products", "a.jpg"))
+
+    def test_proxy_offload_of_unusual_names(self):
+        with open(os.path.join(settings.MEDIA_ROOT, "products", "a b%ф.jpg"), "wb") as file:
+            file.write(b"0123456789")
+        path = "products/" + quote("a b%ф.jpg")
+        with self.settings(STORE_MEDIA_ACCEL="nginx"):
+            response = self.get(path)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/products/a%20b%25%D1%84.jpg")
+        with self.settings(STORE_MEDIA_ACCEL="sendfile"):
+            response = self.get(path)
+        # Not representable in a latin-1 header: Django sends the body.
+        self.assertNotIn("X-Sendfile", response)
+        self.assertEqual(response.body, b"0123456789")
+
+
+calls = []
+
+
+@tasks.task(max_attempts=2, retry_delay=0)
+def flaky_task(key, fail_times=1):
+    calls.append(key)
+    if calls.count(key) <= fail_times:
+        raise RuntimeError(f"failure {calls.count(key)}")
+
+
+class TaskQueueTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    @override_settings(STORE_TASKS_BACKEND="store.tasks.ImmediateBackend")
+    def test_user_deletion_runs_after_the_response(self):
+        self.make_order()
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(f"/api/users/{self.supplier.id}/delete/")
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(User.objects.get(pk=self.supplier.id).is_active)
+        self.assertTrue(Product.objects.filter(supplier=self.supplier).exists())
+        for callback in callbacks:
+            callback()
+        self.assertFalse(User.objects.filter(pk=self.supplier.id).exists())
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Order.objects.filter(supplier_id=self.supplier.id).exists())
+
+    @override_settings(STORE_TASKS_BACKEND="store.tasks.DatabaseBackend")
+    def test_database_backend_retries_then_deletes_the_row(self):
+        flaky_task.delay("a")
+        queued = BackgroundTask.objects.get()
+        self.assertEqual((queued.name, queued.args, queued.status), ("store.tests.flaky_task", ["a"], "Pending"))
+        backend = tasks.DatabaseBackend()
+        with self.assertLogs("store.tasks", "ERROR"):
+            self.assertEqual(backend.run_due(), 1)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ("Pending", 1))
+        self.assertIn("RuntimeError: failure 1", queued.last_error)
+        self.assertEqual(backend.run_due(), 1)
+        self.assertFalse(BackgroundTask.objects.exists())
+        self.assertEqual(calls, ["a", "a"])
+
+    def test_database_backend_gives_up_after_max_attempts(self):
+        BackgroundTask.objects.create(name="store.tests.flaky_task", args=["b"], kwargs={"fail_times": 5})
+        BackgroundTask.objects.create(name="store.tests.missing")
+        backend = tasks.DatabaseBackend()
+        with self.assertLogs("store.tasks", "ERROR"):
+            while backend.run_due():
+                pass
+        self.assertEqual(calls, ["b", "b"])
+        self.assertEqual(
+            sorted(BackgroundTask.objects.values_list("name", "status", "attempts")),
+            [("store.tests.flaky_task", "Failed", 2), ("store.tests.missing", "Failed", 1)],
+        )
+
+    def test_expired_leases_are_claimed_again(self):
+        stuck = BackgroundTask.objects.create(
+            name="store.tests.flaky_task", args=["c"], kwargs={"fail_times": 0}, status="Running", attempts=1,
+            run_after=timezone.now() - timedelta(seconds=1),
+        )
+        leased = BackgroundTask.objects.create(
+            name="store.tests.flaky_task", args=["d"], status="Running", run_after=timezone.now() + timedelta(minutes=5),
+        )
+        out = io.StringIO()
+        call_command("run_tasks", "--once", stdout=out)
+        self.assertIn("Ran 1 task(s).", out.getvalue())
+        self.assertEqual(calls, ["c"])
+        self.assertEqual(list(BackgroundTask.objects.values_list("pk", flat=True)), [leased.pk])
+        self.assertFalse(BackgroundTask.objects.filter(pk=stuck.pk).exists())
+
+    def test_thread_pool_backend_retries(self):
+        backend = tasks.ThreadPoolBackend(workers=1)
+        self.addCleanup(backend.executor.shutdown)
+        with self.assertLogs("store.tasks", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                backend.enqueue("store.tests.flaky_task", ["e"], {})
+            deadline = time.monotonic() + 5
+            while len(calls) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(calls, ["e", "e"])
+
+
+@override_settings(STORE_TASKS_BACKEND="store.tasks.ImmediateBackend", STORE_DELETE_BATCH=2)
+class UserDeletionTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [self.make_product(name=f"Widget {i}") for i in range(5)]
+        for _ in range(3):
+            self.make_order(lines=1)  # one more supplier product each
+        # The supplier's products in another supplier's order, and the
+        # supplier's own purchases.
+        self.foreign = Order.objects.create(user=self.customer, supplier=self.admin)
+        self.foreign_item = OrderItem.objects.create(order=self.foreign, product=self.products[0], price=1)
+        self.purchase = Order.objects.create(user=self.supplier, supplier=self.admin)
+        self.client.force_authenticate(self.admin)
+
+    def purge(self, on_batch=None):
+        return deletion.purge_user(UserDeletion.objects.get(user_id=self.supplier.id), on_batch)
+
+    def test_purges_in_batches_and_reports_progress(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(f"/api/users/{self.supplier.id}/delete/")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data["status"], response.data["progress"]), ("Pending", {}))
+        self.assertFalse(User.objects.get(pk=self.supplier.id).is_active)
+
+        for callback in callbacks:
+            callback()
+        response = self.client.get(f"/api/users/{self.supplier.id}/delete/")
+        self.assertEqual(response.data["status"], "Done")
+        self.assertEqual(response.data["progress"], {"supplier_orders": 3, "products": 8, "customer_orders": 1})
+        self.assertFalse(User.objects.filter(pk=self.supplier.id).exists())
+        self.assertFalse(Product.objects.exists())
+        self.assertEqual(list(Order.objects.order_by("pk")), [self.foreign, self.purchase])
+        self.foreign_item.refresh_from_db()
+        self.assertIsNone(self.foreign_item.product_id)
+        self.purchase.refresh_from_db()
+        self.assertIsNone(self.purchase.user_id)
+        self.assertFalse(get_search_backend().search("widget").exists())
+
+    def test_each_batch_is_bounded(self):
+        UserDeletion.objects.create(user_id=self.supplier.id, username=self.supplier.username)
+        batches = []
+        self.purge(lambda step, count: batches.append((step, count)))
+        self.assertEqual(batches, [
+            ("supplier_orders", 2), ("supplier_orders", 1),
+            ("products", 2), ("products", 2), ("products", 2), ("products", 2),
+            ("customer_orders", 1), ("user", 1),
+        ])
+
+    def test_interrupted_purge_resumes(self):
+        UserDeletion.objects.create(user_id=self.supplier.id, username=self.supplier.username)
+
+        def crash(step, count):
+            if step == "products":
+                raise RuntimeError("worker died")
+
+        with self.assertRaises(RuntimeError):
+            self.purge(crash)
+        stalled = UserDeletion.objects.get(user_id=self.supplier.id)
+        self.assertEqual((stalled.status, stalled.progress), ("Running", {"supplier_orders": 3, "products": 2}))
+        self.assertEqual(Product.objects.count(), 6)
+
+        out = io.StringIO()
+        call_command("purge_users", stdout=out)
+        self.assertIn("Deleted supplier.", out.getvalue())
+        finished = UserDeletion.objects.get(user_id=self.supplier.id)
+        self.assertEqual(finished.progress, {"supplier_orders": 3, "products": 8, "customer_orders": 1})
+        self.assertFalse(User.objects.filter(pk=self.supplier.id).exists())
+
+    def test_progress_of_unknown_deletion(self):
+        self.assertEqual(self.client.get(f"/api/users/{self.customer.id}/delete/").status_code, 404)
+
+
+class SlugAllocationTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.supplier)
+
+    def create(self, name):
+        response = self.client.post("/api/products/", {
+            "name": name, "price": "5.00", "stock": 1, "category_id": self.category.id,
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data["slug"]
+
+    def test_same_name_gets_next_suffix_in_bounded_queries(self):
+        self.make_product(name="T-Shirt Red", slug="t-shirt-red")
+        self.assertEqual(self.create("T-Shirt"), "t-shirt")
+        self.assertEqual(self.create("T-Shirt"), "t-shirt-1")
+        self.make_product(name="T-Shirt", slug="t-shirt-9")
+        # Numbers go on from the highest, never back into gaps.
+        self.assertEqual(self.create("T-Shirt"), "t-shirt-10")
+
+        with CaptureQueriesContext(connection) as few:
+            self.create("T-Shirt")
+        for i in range(20):
+            self.make_product(name="T-Shirt", slug=f"t-shirt-{100 + i}")
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.create("T-Shirt"), "t-shirt-120")
+        self.assertEqual(len(many), len(few))
+
+    def test_lookup_searches_the_slug_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            slugs.next_free_slug(Product.objects.all(), "t-shirt")
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {queries.captured_queries[0]['sql']}")
+            plan = [row[-1] for row in cursor.fetchall()]
+        if connection.vendor == "sqlite":
+            self.assertFalse([line for line in plan if re.fullmatch(r"SCAN \w+", line.strip())], plan)
+
+    def test_long_names_leave_room_for_the_suffix(self):
+        name = "x" * 50
+        self.make_product(name=name, slug=name)
+        taken = [self.create(name) for _ in range(3)]
+        self.assertEqual(taken, ["x" * 42, "x" * 42 + "-1", "x" * 42 + "-2"])
+        legacy = Product.objects.get(slug=name)
+        self.assertEqual(self.client.patch(f"/api/products/{legacy.id}/", {"price": "6.00"}).data["slug"], name)
+
+    def test_update_keeps_own_variant_and_renames(self):
+        self.make_product(name="Hat", slug="hat")
+        product = Product.objects.get(slug=self.create("Hat"))
+        url = f"/api/products/{product.id}/"
+        self.assertEqual(self.client.patch(url, {"name": "HAT"}).data["slug"], "hat-1")
+        self.assertEqual(self.client.patch(url, {"name": "Cap"}).data["slug"], "cap")
+        self.assertEqual(self.client.patch(url, {"name": "Hat"}).data["slug"], "hat-1")
+        self.assertEqual(self.client.patch(url, {"price": "6.00"}).data["slug"], "hat-1")
+
+    def test_retries_a_slug_taken_concurrently(self):
+        self.make_product(name="Mug", slug="mug")
+        # The first pick loses the race: a concurrent insert already took it.
+        picks = iter(["mug", "mug-1"])
+        with mock.patch("store.slugs.next_free_slug", side_effect=lambda *args: next(picks)):
+            self.assertEqual(self.create("Mug"), "mug-1")
+
+    def test_other_integrity_errors_are_not_retried(self):
+        calls = []
+
+        def save(slug):
+            calls.append(slug)
+            raise IntegrityError("CHECK constraint failed: product_stock_non_negative")
+
+        with self.assertRaises(IntegrityError):
+            slugs.save_with_slug(Product.objects.all(), "mug", save)
+        self.assertEqual(calls, ["mug"])
+
+    def test_category_slug_is_optional_and_unique(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post("/api/categories/", {"name": "Phones"})
+        self.assertEqual((response.status_code, response.data["slug"]), (201, "phones-1"))
+        response = self.client.post("/api/categories/", {"name": "Cases", "slug": "phones"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("slug", response.data)
+
+
+@override_settings(STORE_IMPORT_BATCH=2)
+class ProductImportTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cases = Category.objects.create(name="Cases", slug="cases")
+        self.client.force_authenticate(self.supplier)
+
+    def post(self, body, content_type="application/x-ndjson", **params):
+        url = "/api/products/import/" + (f"?type={params['type']}" if params else "")
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.generic("POST", url, body, content_type=content_type)
+
+    def ndjson(self, *rows):
+        return "\n".join(json.dumps(row) for row in rows) + "\n"
+
+    def test_upserts_by_slug(self):
+        self.assertEqual(self.client.get("/api/products/").data["results"], [])
+        response = self.post(self.ndjson(
+            {"name": "Blue Case", "price": "4.50", "stock": 3, "category": "cases"},
+            {"name": "Pixel", "slug": "pixel-9", "price": 499, "category": "phones", "description": "New"},
+            {"name": "Red Case", "price": "4.00", "category": "cases"},
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"rows": 3, "created": 3, "updated": 0, "failed": 0, "errors": []})
+        case = Product.objects.get(slug="blue-case")
+        self.assertEqual((case.supplier, case.category, case.price, case.stock), (self.supplier, self.cases, 4.5, 3))
+        self.assertEqual(len(self.client.get("/api/products/").data["results"]), 3)
+        self.assertEqual(list(get_search_backend().search("pixel").values_list("slug", flat=True)), ["pixel-9"])
+
+        response = self.post(self.ndjson(
+            {"name": "Blue Case XL", "slug": "blue-case", "price": "5.00", "stock": 9, "category": "phones"},
+        ))
+        self.assertEqual((response.data["created"], response.data["updated"]), (0, 1))
+        case.refresh_from_db()
+        self.assertEqual((case.name, case.category, case.stock), ("Blue Case XL", self.category, 9))
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(list(get_search_backend().search("xl").values_list("slug", flat=True)), ["blue-case"])
+
+    def test_reports_failed_rows_and_writes_the_rest(self):
+        body = (
+            "name,slug,price,stock,category\n"
+            "Good,,1.00,1,phones\n"
+            "Pricey,,1.001,1,phones\n"
+            ",,1.00,1,phones\n"
+            "Lost,,1.00,-1,shoes\n"
+            "\"Multi\nline\",,2.00,,cases\n"
+        )
+        response = self.post(body, content_type="text/csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["rows"], response.data["created"], response.data["failed"]), (5, 2, 3))
+        self.assertEqual([error["line"] for error in response.data["errors"]], [3, 4, 5])
+        self.assertEqual(set(response.data["errors"][0]["errors"]), {"price"})
+        self.assertEqual(set(response.data["errors"][1]["errors"]), {"name", "slug"})
+        self.assertEqual(set(response.data["errors"][2]["errors"]), {"stock", "category"})
+        self.assertEqual(sorted(Product.objects.values_list("slug", flat=True)), ["good", "multi-line"])
+
+        response = self.post("name,price\nGood,1\n", content_type="text/csv")
+        self.assertEqual(response.status_code, 400)
+        response = self.post("{not json\n[1]\n")
+        self.assertEqual([error["line"] for error in response.data["errors"]], [1, 2])
+
+    @override_settings(STORE_IMPORT_BATCH=1)
+    def test_unreadable_streams_are_rejected_with_the_line(self):
+        body = self.ndjson({"name": "Hat", "price": "1", "category": "phones"}).encode() + b'{"name": "Caf\xe9"}\n'
+        response = self.post(body)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["detail"], "Line 2 is not valid UTF-8.")
+        self.assertEqual(response.data["created"], 1)
+
+        response = self.post("name,price,category\nBig,1,\"" + "x" * 200000 + "\"\n", content_type="text/csv")
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data["detail"].startswith("Line 2: field larger than field limit"))
+
+        response = self.post(b"name,price,category\nNul\x00led,1,phones\nMug,1,phones\n", content_type="text/csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["created"], response.data["failed"]), (1, 1))
+        self.assertEqual(response.data["errors"][0]["errors"], {"name": ["Null characters are not allowed."]})
+
+        response = self.post(self.ndjson(
+            {"name": "Hoard", "price": "1", "stock": 99999999999999999999, "category": "phones"},
+            {"name": "Cup", "price": "1", "stock": 3, "category": "phones"},
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["created"], response.data["failed"]), (1, 1))
+        self.assertEqual(set(response.data["errors"][0]["errors"]), {"stock"})
+
+    def test_suppliers_only_update_their_own_products(self):
+        theirs = self.make_product(name="Theirs", slug="theirs", supplier=self.admin)
+        row = self.ndjson({"name": "Mine now", "slug": "theirs", "price": "1", "category": "phones"})
+        response = self.post(row)
+        self.assertEqual((response.data["updated"], response.data["failed"]), (0, 1))
+        self.assertIn("slug", response.data["errors"][0]["errors"])
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.post(row).data["updated"], 1)
+        theirs.refresh_from_db()
+        self.assertEqual((theirs.name, theirs.supplier), ("Mine now", self.admin))
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.post(row).status_code, 403)
+
+    def test_repeated_slug_in_a_batch_keeps_the_last_row(self):
+        response = self.post(self.ndjson(
+            {"name": "Hat", "price": "1", "category": "phones"},
+            {"name": "Hat", "price": "2", "category": "phones"},
+        ))
+        self.assertEqual((response.data["rows"], response.data["created"]), (2, 1))
+        self.assertEqual(Product.objects.get(slug="hat").price, 2)
+
+    def test_multipart_upload(self):
+        upload = SimpleUploadedFile("products.csv", b"\xef\xbb\xbfname,price,category\nMug,3.20,cases\n")
+        response = self.client.post("/api/products/import/", {"file": upload})
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(Product.objects.get(slug="mug").category, self.cases)
+        self.assertEqual(self.client.post("/api/products/import/", {}, format="multipart").status_code, 400)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write("name,price,category\nLamp,12,phones\nDesk,x,phones\n")
+        self.addCleanup(os.unlink, file.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command("import_products", file.name, supplier="supplier", stdout=out, stderr=err)
+        self.assertIn("Imported 1 products (1 new), 1 rows failed.", out.getvalue())
+        self.assertIn("line 3:", err.getvalue())
+        self.assertEqual(Product.objects.get(slug="lamp").supplier, self.supplier)
+
+
+class AsyncURLConf:
+    urlpatterns = [path("api/", include(async_views.urlpatterns + store_urls.urlpatterns))]
+
+
+class AsyncReadViewTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.make_product(name="Caf\u00e9 phone", image="products/a.jpg")
+        self.make_product(name="Orphan", supplier=None)
+        self.make_order(lines=2)
+        self.token = f"Bearer {RefreshToken.for_user(self.customer).access_token}"
+
+    def get_async(self, url, params=None, **headers):
+        with self.settings(ROOT_URLCONF=AsyncURLConf):
+            return async_to_sync(AsyncClient().get)(url, params or {}, headers=headers)
+
+    def assert_same_response(self, url, params=None, **headers):
+        for fast_path in (False, True):
+            with self.settings(STORE_FAST_SERIALIZATION=fast_path):
+                cache.clear()
+                expected = self.client.get(url, params or {}, headers=headers)
+                # Drop the cached body but keep the generations in the ETag.
+                generations = cache.get_many([cache_generation_key(name) for name in ("product", "category")])
+                cache.clear()
+                cache.set_many(generations, timeout=None)
+                actual = self.get_async(url, params, **headers)
+            self.assertEqual(actual.status_code, expected.status_code)
+            self.assertEqual(actual.content, expected.content)
+            self.assertEqual(actual.get("ETag"), expected.get("ETag"))
+            self.assertEqual(actual.get("X-Cache"), expected.get("X-Cache"))
+
+    def test_product_list_and_detail(self):
+        self.assert_same_response("/api/products/")
+        self.assert_same_response("/api/products/", {"page_size": 1, "category": self.category.id})
+        self.assert_same_response("/api/products/", {"expand": "supplier"})
+        self.assert_same_response(self.client.get("/api/products/", {"page_size": 1}).data["next"])
+        self.assert_same_response("/api/products/", {"cursor": "bogus"})
+        self.assert_same_response(f"/api/products/{self.product.id}/")
+        self.assert_same_response("/api/products/999999/")
+
+    def test_search_and_categories(self):
+        self.assert_same_response("/api/products/search/", {"q": "phone"})
+        self.assert_same_response("/api/products/search/", {"q": "item", "limit": 1, "offset": 1})
+        self.assert_same_response("/api/categories/")
+
+    def test_my_orders(self):
+        self.assert_same_response("/api/my-orders/", Authorization=self.token)
+        self.assertEqual(self.get_async("/api/my-orders/").status_code, 401)
+        self.assertEqual(self.get_async("/api/my-orders/", Authorization="Bearer nonsense").status_code, 401)
+
+    def test_conditional_get(self):
+        etag = self.get_async("/api/products/")["ETag"]
+        self.assertEqual(self.get_async("/api/products/", **{"If-None-Match": etag}).status_code, 304)
+
+    def test_writes_fall_through_to_the_sync_views(self):
+        token = f"Bearer {RefreshToken.for_user(self.supplier).access_token}"
+        with self.settings(ROOT_URLCONF=AsyncURLConf):
+            response = async_to_sync(AsyncClient().post)("/api/products/", {
+                "name": "Tablet", "price": "5.00", "stock": 1, "category_id": self.category.id,
+            }, headers={"Authorization": token})
+        self.assertEqual(response.status_code, 201)
+
+
+class OrderTotalsTests(StoreTestCase):
+    def stored(self, order):
+        return tuple(Order.objects.filter(pk=order.pk).values_list("total", "item_count").get())
+
+    def test_item_writes_keep_totals(self):
+        order = self.make_order(lines=2)  # 1 x 10.00 + 2 x 10.00
+        self.assertEqual(self.stored(order), (Decimal("30.00"), 3))
+        item = order.items.order_by("id").first()
+        item.quantity, item.price = 4, Decimal("2.50")
+        item.save()
+        self.assertEqual(self.stored(order), (Decimal("30.00"), 6))
+        item.delete()
+        self.assertEqual(self.stored(order), (Decimal("20.00"), 2))
+
+    def test_deleting_an_order_does_not_refresh_each_item(self):
+        small, large = self.make_order(lines=1), self.make_order(lines=20)
+        with CaptureQueriesContext(connection) as few:
+            small.delete()
+        with CaptureQueriesContext(connection) as many:
+            large.delete()
+        self.assertEqual(len(many), len(few))
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_place_order_stores_totals_without_recomputing(self):
+        phone, case = self.make_product(price="100.00"), self.make_product(name="Case", price="5.00")
+        # products + two stock updates + order + items + two rollup upserts + savepoint pair
+        with self.assertNumQueries(9):
+            order = place_order(self.customer, [
+                {"product_id": phone.id, "quantity": 1}, {"product_id": case.id, "quantity": 3},
+            ])
+        self.assertEqual(self.stored(order), (Decimal("115.00"), 4))
+
+    def test_lists_read_the_stored_columns(self):
+        self.make_order(lines=2)
+        self.client.force_authenticate(self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            order = self.client.get("/api/my-orders/").data["results"][0]
+        self.assertEqual((order["total"], order["item_count"]), (Decimal("30.00"), 3))
+        self.assertNotIn("SUM(", queries.captured_queries[0]["sql"].upper())
+        self.assertEqual(Order.objects.filter(total__gte=30).order_by("-total").count(), 1)
+
+    def test_verify_command_finds_and_fixes_drift(self):
+        good, drifted = self.make_order(), self.make_order(lines=3)
+        Order.objects.filter(pk=drifted.pk).update(total=1, item_count=1)
+        out, err = io.StringIO(), io.StringIO()
+        call_command("verify_order_totals", batch=1, stdout=out, stderr=err)
+        self.assertIn("Checked 2 orders, 1 out of step.", out.getvalue())
+        self.assertIn(f"order {drifted.pk}: total 1.00", err.getvalue())
+        self.assertIn("item_count 1 (items 6)", err.getvalue())
+
+        call_command("verify_order_totals", fix=True, stdout=out, stderr=err)
+        self.assertEqual(self.stored(drifted), (Decimal("60.00"), 6))
+        self.assertEqual(self.stored(good), (Decimal("30.00"), 3))
+        out = io.StringIO()
+        call_command("verify_order_totals", stdout=out)
+        self.assertIn("all consistent", out.getvalue())
+
+
+class SalesAnalyticsTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cases = Category.objects.create(name="Cases", slug="cases")
+        self.phone = self.make_product(name="Phone", price="100.00")
+        self.case = self.make_product(name="Case", price="5.00", category=self.cases)
+        self.lamp = self.make_product(name="Lamp", price="20.00", supplier=self.admin)
+        self.first = place_order(self.customer, [
+            {"product_id": self.phone.id, "quantity": 1}, {"product_id": self.case.id, "quantity": 2},
+        ])
+        place_order(self.customer, [{"product_id": self.case.id, "quantity": 4}])
+        place_order(self.customer, [{"product_id": self.lamp.id, "quantity": 1}])
+
+    def report(self, group, **params):
+        response = self.client.get("/api/analytics/sales/", {"group": group, **params})
+        self.assertEqual(response.status_code, 200)
+        return [{key: value for key, value in row.items() if key != "day"} for row in response.data["results"]]
+
+    def test_reports_every_group_from_the_rollups(self):
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.report("day"), [{"orders": 3, "units": 8, "revenue": Decimal("150.00")}])
+        self.assertEqual(self.report("supplier"), [
+            {"id": self.supplier.id, "name": "supplier", "orders": 2, "units": 7, "revenue": Decimal("130.00")},
+            {"id": self.admin.id, "name": "admin", "orders": 1, "units": 1, "revenue": Decimal("20.00")},
+        ])
+        self.assertEqual(self.report("category"), [
+            {"id": self.category.id, "name": "Phones", "orders": 2, "units": 2, "revenue": Decimal("120.00")},
+            {"id": self.cases.id, "name": "Cases", "orders": 2, "units": 6, "revenue": Decimal("30.00")},
+        ])
+        self.assertEqual(self.report("product", limit=1), [
+            {"id": self.phone.id, "name": "Phone", "orders": 1, "units": 1, "revenue": Decimal("100.00")},
+        ])
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(self.report("day", **{"from": tomorrow}), [])
+        self.assertEqual(self.report("supplier", supplier=self.admin.id)[0]["orders"], 1)
+
+    def test_status_funnel_follows_status_changes(self):
+        self.client.force_authenticate(self.supplier)
+        self.client.post(f"/api/orders/{self.first.id}/update_status/", {"status": "Shipped"})
+        self.client.post(f"/api/orders/{self.first.id}/update_status/", {"status": "Shipped"})
+        # A change that read the order before another one committed still
+        # moves it out of the status it is in now.
+        stale = Order.objects.get(pk=self.first.id)
+        with mock.patch.object(OrderViewSet, "get_object", lambda view: stale):
+            Order.objects.filter(pk=stale.pk).update(status="Delivered")
+            analytics.record_status_change(Order(pk=stale.pk, supplier_id=stale.supplier_id, status="Delivered"), "Shipped")
+            self.client.post(f"/api/orders/{self.first.id}/update_status/", {"status": "Shipped"})
+        self.assertEqual(self.client.get("/api/analytics/status/").data, {
+            "Pending": 1, "Shipped": 1, "Delivered": 0, "Cancelled": 0,
+        })
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get("/api/analytics/status/").data["Pending"], 2)
+
+    def test_suppliers_only_see_their_own_sales(self):
+        self.client.force_authenticate(self.supplier)
+        self.assertEqual(self.report("product", supplier=self.admin.id), [
+            {"id": self.phone.id, "name": "Phone", "orders": 1, "units": 1, "revenue": Decimal("100.00")},
+            {"id": self.case.id, "name": "Case", "orders": 2, "units": 6, "revenue": Decimal("30.00")},
+        ])
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get("/api/analytics/sales/").status_code, 403)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.client.force_authenticate(self.admin)
+        self.client.post(f"/api/orders/{self.first.id}/update_status/", {"status": "Delivered"})
+        before = {group: self.report(group) for group in analytics.GROUPS}
+        funnel = self.client.get("/api/analytics/status/").data
+        out = io.StringIO()
+        call_command("rebuild_analytics", stdout=out)
+        self.assertIn("Rebuilt 8 sales and 3 status rollups", out.getvalue())
+        self.assertEqual({group: self.report(group) for group in analytics.GROUPS}, before)
+        self.assertEqual(self.client.get("/api/analytics/status/").data, funnel)
+
+    def test_invalid_parameters(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get("/api/analytics/sales/", {"group": "week"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/analytics/sales/", {"from": "2024-13-01"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/analytics/sales/", {"to": "yesterday"}).status_code, 400)
+        response = self.client.get("/api/analytics/sales/", {"group": "product", "limit": -1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 1)
+
+
+@override_settings(STORE_RELATED_SETTLE=0)
+class RelatedProductsTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.phone, self.case, self.charger, self.lamp = (
+            self.make_product(name=name, stock=100) for name in ("Phone", "Case", "Charger", "Lamp")
+        )
+        for products in ([self.phone, self.case], [self.phone, self.case, self.charger], [self.phone, self.charger], [self.lamp]):
+            place_order(self.customer, [{"product_id": product.id, "quantity": 1} for product in products])
+
+    def build(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return recommend.build(**kwargs)
+
+    def related(self, product):
+        response = self.client.get(f"/api/products/{product.id}/related/")
+        self.assertEqual(response.status_code, 200)
+        return [item["name"] for item in response.json()]
+
+    def test_ranks_products_bought_together(self):
+        build = self.build()
+        self.assertEqual((build.full, build.orders, build.products), (True, 4, 3))
+        # the product, then its neighbours
+        with self.assertNumQueries(2):
+            self.assertEqual(self.related(self.phone), ["Case", "Charger"])
+        self.assertEqual(self.related(self.case), ["Phone", "Charger"])
+        self.assertEqual(self.related(self.lamp), [])
+        self.assertEqual(self.client.get("/api/products/x/related/").status_code, 404)
+        self.assertEqual(self.client.get("/api/products/999/related/").status_code, 404)
+        with override_settings(STORE_RELATED_TOP_K=1):
+            self.build(full=True)
+        self.assertEqual(RelatedProduct.objects.filter(product=self.charger).get().related, self.phone)
+
+    def test_incremental_build_counts_only_new_orders(self):
+        self.build()
+        self.assertEqual(self.related(self.lamp), [])
+        place_order(self.customer, [{"product_id": self.lamp.id, "quantity": 1}, {"product_id": self.charger.id, "quantity": 1}])
+        place_order(self.customer, [{"product_id": self.charger.id, "quantity": 1}, {"product_id": self.case.id, "quantity": 1}])
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("build_related_products", stdout=out)
+        self.assertIn("Incremental build: 2 orders counted, 4 products", out.getvalue())
+        self.assertEqual(self.related(self.lamp), ["Charger"])
+        self.assertEqual(self.related(self.charger), ["Phone", "Case", "Lamp"])
+        incremental = set(CoPurchase.objects.values_list("product_id", "other_id", "orders"))
+        self.build(full=True)
+        self.assertEqual(set(CoPurchase.objects.values_list("product_id", "other_id", "orders")), incremental)
+
+    @override_settings(STORE_RELATED_SETTLE=60)
+    def test_builds_leave_recent_orders_to_the_next_run(self):
+        Order.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        settled = Order.objects.latest("pk").pk
+        place_order(self.customer, [{"product_id": self.lamp.id, "quantity": 1}, {"product_id": self.charger.id, "quantity": 1}])
+        build = self.build()
+        self.assertEqual((build.orders, build.last_order_id), (4, settled))
+        self.assertEqual(self.related(self.lamp), [])
+        Order.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(self.build().orders, 1)
+        self.assertEqual(self.related(self.lamp), ["Charger"])
+
+    def test_deleted_products_drop_out(self):
+        self.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.case.delete()
+        self.assertEqual(self.related(self.phone), ["Charger"])
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.delete_products([self.charger.id])
+        self.assertEqual(self.related(self.phone), [])
+
+
+class CreateOrderTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.customer)
+        self.phone = self.make_product(name="Phone", price="100.00", stock=5)
+        self.case = self.make_product(name="Case", price="5.00", stock=10)
+
+    def order(self, *items):
+        return self.client.post("/api/create-order/", {"items": [
+            {"product_id": product_id, "quantity": quantity} for product_id, quantity in items
+        ]}, format="json")
+
+    def test_places_order_and_reserves_stock(self):
+        response = self.order((self.phone.id, 2), (self.case.id, 3), (self.phone.id, 1))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["total"], Decimal("315.00"))
+        self.assertEqual(len(response.data["items"]), 2)
+        self.phone.refresh_from_db()
+        self.case.refresh_from_db()
+        self.assertEqual((self.phone.stock, self.case.stock), (2, 7))
+
+    def test_insufficient_stock_rolls_back_whole_order(self):
+        response = self.order((self.case.id, 3), (self.phone.id, 6))
+        self.assertEqual(response.status_code, 400)
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.stock, 10)
+        self.assertFalse(Order.objects.exists())
+
+    def test_unknown_product_is_404(self):
+        self.assertEqual(self.order((self.phone.id, 1), (9999, 1)).status_code, 404)
+        self.assertFalse(Order.objects.exists())
+
+    def test_invalid_items_are_rejected(self):
+        self.assertEqual(self.order().status_code, 400)
+        self.assertEqual(self.order((self.phone.id, 0)).status_code, 400)
+        for items in (None, 3, {"product_id": self.phone.id}, [None]):
+            response = self.client.post("/api/create-order/", {"items": items}, format="json")
+            self.assertEqual(response.status_code, 400, items)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        products = [self.make_product(name=f"Bulk {i}") for i in range(10)]
+        # products + one stock update per line + order + items + two rollup upserts + savepoint pair
+        with self.assertNumQueries(len(products) + 7):
+            place_order(self.customer, [{"product_id": p.id, "quantity": 1} for p in products])
+
+
+@fast_hashing
+class ConcurrentCheckoutTests(StoreFixtures, TransactionTestCase):
+    def test_concurrent_orders_never_oversell(self):
+        product = self.make_product(name="Console", stock=50)
+        placed, rejected = [], []
+
+        def checkout():
+            try:
+                for _ in range(5):
+                    while True:
+                        try:
+                            placed.append(place_order(self.customer, [{"product_id": product.id, "quantity": 3}]).pk)
+                        except InsufficientStock:
+                            rejected.append(1)
+                        except OperationalError:
+                            # SQLite reports lock contention; retry like a client would.
+                            time.sleep(0.001)
+                            continue
+                        break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        sold = sum(OrderItem.objects.filter(product=product).values_list("quantity", flat=True))
+        self.assertEqual(len(placed), 16)
+        self.assertEqual(len(rejected), 24)
+        self.assertEqual(product.stock, 2)
+        self.assertEqual(sold + product.stock, 50)
+        self.assertEqual(Order.objects.count(), len(placed))
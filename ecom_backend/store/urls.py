@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, CategoryViewSet, OrderViewSet, create_order, current_user , register_user, ProductSearchView, WorkerRegistrationView, WorkerApprovalView, UserProfileUpdateView, ChangePasswordView, SupplierRequestView, UserListView, UserDeleteView, UserOrderListView
+from .views import ProductViewSet, CategoryViewSet, OrderViewSet, create_order, current_user , register_user, ProductSearchView, ProductSuggestView, WorkerRegistrationView, WorkerApprovalView, UserProfileUpdateView, ChangePasswordView, SupplierRequestView, UserListView, UserDeleteView, UserOrderListView, UnseenOrderCountView, MarkAllOrdersSeenView, OrderEventsView, CacheStatsView, SalesAnalyticsView, StatusFunnelView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
@@ -10,9 +11,14 @@ router.register(r"orders", OrderViewSet, basename="orders")
 
 urlpatterns = [
     path("products/search/", ProductSearchView.as_view(), name="product-search"),
+    path("products/suggest/", ProductSuggestView.as_view(), name="product-suggest"),
+    # before the router, which would read "events" as an order id
+    path("orders/events/", OrderEventsView.as_view(), name="order-events"),
     path("", include(router.urls)),
     path("create-order/", create_order, name="create-order"),
     path("my-orders/", UserOrderListView.as_view(), name="my-orders"),
+    path("my-orders/unseen-count/", UnseenOrderCountView.as_view(), name="my-orders-unseen-count"),
+    path("my-orders/mark-all-seen/", MarkAllOrdersSeenView.as_view(), name="my-orders-mark-all-seen"),
     path("users/me/", current_user, name="current-user"),
     path("users/register/", register_user, name="register-user"),
     path("users/workers/register/", WorkerRegistrationView.as_view(), name="worker-register"),
@@ -22,6 +28,15 @@ urlpatterns = [
     path("users/request-supplier/", SupplierRequestView.as_view(), name="request-supplier"),
     path("users/", UserListView.as_view(), name="user-list"),
     path("users/<int:pk>/delete/", UserDeleteView.as_view(), name="user-delete"),
+    path("cache/stats/", CacheStatsView.as_view(), name="cache-stats"),
+    path("analytics/sales/", SalesAnalyticsView.as_view(), name="analytics-sales"),
+    path("analytics/status/", StatusFunnelView.as_view(), name="analytics-status"),
     path("auth/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("auth/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
 ]
+
+if getattr(settings, "STORE_ASYNC_VIEWS", False):
+    # ASGI deployments: async variants of the read endpoints take the URLs first.
+    from .async_views import urlpatterns as async_urlpatterns
+
+    urlpatterns = async_urlpatterns + urlpatterns
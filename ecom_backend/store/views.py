@@ -1,19 +1,32 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.http import quote_etag
 from rest_framework import viewsets, permissions, status
-from .models import Category, Product, Order, OrderItem, Profile
-from .serializers import CategorySerializer, ProductSerializer, OrderSerializer, UserSerializer, RegisterSerializer, ProfileSerializer
+from .models import Category, Product, Order, Profile, UserDeletion
+from .serializers import CategorySerializer, ProductSerializer, OrderSerializer, UserSerializer, RegisterSerializer, ProfileSerializer, UserDeletionSerializer
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.generics import ListAPIView, RetrieveUpdateAPIView
-from django.db.models import Q
-import functools
-import operator
 from rest_framework.views import APIView
-from django.contrib.auth.hashers import make_password
+from rest_framework.renderers import BrowsableAPIRenderer
+from .authentication import ProfileJWTAuthentication, QueryTokenJWTAuthentication, auth_context
 from .permissions import IsApprovedSupplierOrAdmin, IsOwnerOrAdmin
+from . import analytics, events, exports, fast, imports, recommend, tasks
+from .cache import bump_on_commit, cached_response, get_cache, get_generation, stats as cache_stats, unseen_orders_generation
+from .conditional import collection_validators, conditional_response, detail_validators
+from .fast import FastJSONRenderer
+from .orders import OrderError, place_order
+from .pagination import CreatedAtCursorPagination, SearchPagination, UserCursorPagination
+from .queries import order_queryset, product_queryset
+from .search import get_search_backend
+from .suggest import suggest
 
 
 @api_view(["POST"])
@@ -22,9 +35,7 @@ def register_user(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        if hasattr(user, 'profile'):
-            user.profile.is_approved = True
-            user.profile.save()
+        Profile.objects.for_user(user).update(is_approved=True)
         return Response({"detail": "User registered successfully."}, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -40,14 +51,69 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
+class CompactListMixin:
+    """
+    List actions serialize products and orders in their compact form
+    (nested objects reduced to ids and names) unless ?expand= asks for
+    the full objects.
+    """
+    compact_actions = ('list',)
+
+    def is_compact(self):
+        return getattr(self, 'action', 'list') in self.compact_actions
+
+    def compact_query(self):
+        return self.is_compact() and not self.request.query_params.get('expand')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['compact'] = self.is_compact()
+        return context
+
+
+class FastListMixin:
+    """
+    Serves list responses through store.fast (values() rows mapped to
+    dicts, orjson encoding) when STORE_FAST_SERIALIZATION is on and the
+    request uses the default compact representation.
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    fast_values = None
+    fast_serialize = None
+
+    def list(self, request, *args, **kwargs):
+        if not fast.enabled(request):
+            return super().list(request, *args, **kwargs)
+        rows = type(self).fast_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(type(self).fast_serialize(page, request))
+        return Response(type(self).fast_serialize(rows, request))
+
+
 @method_decorator(csrf_exempt, name='dispatch')
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().order_by("-created_at")
+class ProductViewSet(CompactListMixin, FastListMixin, viewsets.ModelViewSet):
+    queryset = product_queryset().order_by("-created_at")
     serializer_class = ProductSerializer
     parser_classes = [MultiPartParser, FormParser]
+    pagination_class = CreatedAtCursorPagination
+    fast_values = staticmethod(fast.product_values)
+    fast_serialize = staticmethod(fast.serialize_products)
+    compact_actions = ('list', 'related')
+
+    def get_queryset(self):
+        queryset = product_queryset(compact=self.compact_query()).order_by("-created_at")
+        if self.action in ['list', 'export']:
+            category = self.request.query_params.get('category')
+            supplier = self.request.query_params.get('supplier')
+            if category and category.isdigit():
+                queryset = queryset.filter(category_id=category)
+            if supplier and supplier.isdigit():
+                queryset = queryset.filter(supplier_id=supplier)
+        return queryset
 
     def get_permissions(self):
-        if self.action == 'create':
+        if self.action in ['create', 'export', 'import_products']:
             permission_classes = [IsApprovedSupplierOrAdmin]
         elif self.action in ['update', 'partial_update', 'destroy']:
             permission_classes = [IsOwnerOrAdmin]
@@ -55,31 +121,92 @@ class ProductViewSet(viewsets.ModelViewSet):
             permission_classes = [AllowAny]
         return [permission() for permission in permission_classes]
 
+    @conditional_response(collection_validators, "product")
+    @cached_response("product", "category")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response(detail_validators, "product")
+    @cached_response("product", "category")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(supplier=self.request.user)
 
-
-class ProductSearchView(ListAPIView):
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream every matching product as NDJSON (default) or CSV (?type=csv)."""
+        products = exports.product_objects(self.get_queryset(), request)
+        return exports.export_response(products, exports.product_csv_rows, request.query_params.get('type'), 'products')
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_products(self, request):
+        """
+        Upsert products by slug from a CSV or NDJSON body, or a multipart
+        "file" upload (?type=csv|ndjson, else guessed). The body is read as
+        a stream; the response reports counts and the rows that failed.
+        """
+        upload = None
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({"detail": "Upload the rows as \"file\"."}, status=status.HTTP_400_BAD_REQUEST)
+        import_type = request.query_params.get('type') or imports.guess_type(
+            upload.content_type if upload else request.content_type, upload.name if upload else ""
+        )
+        try:
+            records = imports.read_records(upload if upload else request._request, import_type)
+            report = imports.import_products(records, request.user, update_any=request.user.is_staff)
+        except imports.ImportFormatError as exc:
+            # Batches read before the error are written; report them too.
+            written = exc.report.as_dict() if exc.report else {}
+            return Response({"detail": str(exc), **written}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict())
+
+    @action(detail=True, methods=['get'])
+    @cached_response("product", "related")
+    def related(self, request, pk=None):
+        """
+        Products most often ordered together with this one, best first:
+        the neighbours store.recommend stored, in one query after the
+        product itself.
+        """
+        product = self.get_object()
+        products = recommend.related_products(product.pk, self.get_queryset())
+        if fast.enabled(request):
+            return Response(fast.serialize_products(fast.product_values(products), request))
+        return Response(self.get_serializer(products, many=True).data)
+
+
+class ProductSearchView(CompactListMixin, FastListMixin, ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    pagination_class = SearchPagination
+    fast_values = staticmethod(fast.product_values)
+    fast_serialize = staticmethod(fast.serialize_products)
 
     def get_queryset(self):
         query = self.request.query_params.get('q', '')
         if not query:
             return Product.objects.none()
+        return product_queryset(get_search_backend().search(query), compact=self.compact_query())
+
+    @cached_response("product", "category")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
-        query_words = query.split()
-        
-        search_queries = []
-        for word in query_words:
-            search_queries.append(Q(name__icontains=word))
-            search_queries.append(Q(description__icontains=word))
-            search_queries.append(Q(category__name__icontains=word))
-
-        if search_queries:
-            return Product.objects.filter(functools.reduce(operator.or_, search_queries)).distinct()
-        
-        return Product.objects.none()
+
+class ProductSuggestView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 20)
+        except ValueError:
+            limit = 10
+        return Response(suggest(query, limit))
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -93,17 +220,83 @@ class CategoryViewSet(viewsets.ModelViewSet):
             permission_classes = [AllowAny]
         return [permission() for permission in permission_classes]
 
+    @conditional_response(collection_validators, "category")
+    @cached_response("category")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        hits, misses = cache_stats["hits"], cache_stats["misses"]
+        lookups = hits + misses
+        return Response({
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+        })
+
+
+class SalesAnalyticsView(APIView):
+    """
+    Orders, units and revenue from the sales rollups (store.analytics),
+    grouped by ?group=day|supplier|category|product and limited to
+    ?from=/?to= dates. Suppliers see their own sales; staff everyone's or
+    one supplier's (?supplier=).
+    """
+    permission_classes = [IsApprovedSupplierOrAdmin]
+
+    def scope(self, request):
+        if not auth_context(request).is_staff:
+            return request.user.id
+        supplier = request.query_params.get('supplier')
+        return int(supplier) if supplier and supplier.isdigit() else None
+
+    def get(self, request):
+        params = request.query_params
+        group = params.get('group', 'day')
+        if group not in analytics.GROUPS:
+            return Response(
+                {"group": f"Use one of {', '.join(analytics.GROUPS)}."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        dates = {}
+        for name in ('from', 'to'):
+            try:
+                dates[name] = parse_date(params[name]) if params.get(name) else None
+            except ValueError:
+                dates[name] = None
+            if params.get(name) and dates[name] is None:
+                return Response({name: "Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(params.get('limit', 50)), 500))
+        except ValueError:
+            limit = 50
+        results = analytics.sales_report(group, dates['from'], dates['to'], self.scope(request), limit)
+        return Response({"group": group, "results": results})
+
+
+class StatusFunnelView(SalesAnalyticsView):
+    """Number of orders currently in each status, scoped like SalesAnalyticsView."""
+
+    def get(self, request):
+        return Response(analytics.status_funnel(self.scope(request)))
 
-class OrderViewSet(viewsets.ModelViewSet):
+
+class OrderViewSet(CompactListMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_staff:
-            return Order.objects.all().order_by("-created_at")
-        if hasattr(user, 'profile') and user.profile.role == 'Supplier':
-            return Order.objects.filter(supplier=user).order_by("-created_at")
-        return Order.objects.filter(user_id=user.id).order_by("-created_at")
+        compact = self.compact_query()
+        context = auth_context(self.request)
+        if context.is_staff:
+            return order_queryset(compact=compact).order_by("-created_at")
+        if context.role == 'Supplier':
+            return order_queryset(Order.objects.filter(supplier=user), compact).order_by("-created_at")
+        return order_queryset(Order.objects.filter(user_id=user.id), compact).order_by("-created_at")
 
     def get_permissions(self):
         if self.action == 'update_status':
@@ -123,7 +316,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         order.status = status_data
         order.is_seen = False # Mark as unseen when status changes
-        order.save()
+        with transaction.atomic():
+            # The status this change moves the order out of, read under a row
+            # lock so concurrent changes each count a different one.
+            previous = Order.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+            order.save()
+            analytics.record_status_change(order, previous)
+        events.publish_order(order, 'order.status')
         return Response(OrderSerializer(order).data)
 
     @action(detail=True, methods=['patch'])
@@ -133,40 +332,110 @@ class OrderViewSet(viewsets.ModelViewSet):
         order.save()
         return Response(OrderSerializer(order).data)
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the caller's orders as NDJSON (default) or CSV (?type=csv)."""
+        orders = exports.order_objects(self.get_queryset(), request)
+        return exports.export_response(orders, exports.order_csv_rows, request.query_params.get('type'), 'orders')
+
 
-class UserOrderListView(ListAPIView):
+class UserOrderListView(CompactListMixin, FastListMixin, ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    fast_values = staticmethod(fast.order_values)
+    fast_serialize = staticmethod(fast.serialize_orders)
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by("-created_at")
+        return order_queryset(Order.objects.filter(user=self.request.user), self.compact_query()).order_by("-created_at")
+
+class UnseenOrderCountView(APIView):
+    """
+    Number of the caller's orders with news they have not seen. The count
+    comes from the partial order_user_unseen_idx index and is cached and
+    ETagged under a per-user generation, so a poll with a current ETag is
+    answered without touching the database.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        generation = get_generation(unseen_orders_generation(request.user.id))
+        etag = quote_etag(f"unseen-{request.user.id}-{generation}")
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        cache = get_cache()
+        key = f"store:unseen-orders:{request.user.id}:{generation}"
+        count = cache.get(key)
+        if count is None:
+            count = Order.objects.filter(user=request.user, is_seen=False).count()
+            cache.set(key, count, getattr(settings, 'STORE_CACHE_TIMEOUT', 300))
+        # private: the count belongs to the authenticated user
+        return Response({"unseen": count}, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+class MarkAllOrdersSeenView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        updated = Order.objects.filter(user=request.user, is_seen=False).update(is_seen=True)
+        if updated:
+            bump_on_commit(unseen_orders_generation(request.user.id))
+        return Response({"updated": updated})
+
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_order(request):
-    data = request.data
-    items = data.get("items", [])
-    # Determine the supplier for the order
-    order_supplier = None
-    if items:
-        first_product_id = items[0].get("product_id")
-        if first_product_id:
-            try:
-                first_product = Product.objects.get(id=first_product_id)
-                order_supplier = first_product.supplier
-            except Product.DoesNotExist:
-                pass # Handle error or log
-
-    order = Order.objects.create(user=request.user, supplier=order_supplier) # ADD supplier=order_supplier
-    for it in items:
-        product = get_object_or_404(Product, id=it["product_id"])
-        qty = int(it.get("quantity", 1))
-        OrderItem.objects.create(order=order, product=product, quantity=qty, price=product.price)
-        product.stock = max(product.stock - qty, 0)
-        product.save()
+    try:
+        order = place_order(request.user, request.data.get("items", []))
+    except OrderError as e:
+        return Response({"error": e.detail}, status=e.status_code)
+    events.publish_order(order, 'order.created')
+    order = order_queryset().get(pk=order.pk)
     serializer = OrderSerializer(order, context={"request": request})
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+class OrderEventsView(APIView):
+    """
+    Order status and new-order events as Server-Sent Events: customers get
+    their own orders, suppliers the orders they supply, staff every order.
+    ?mode=poll is a long-poll fallback answering with JSON.
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [ProfileJWTAuthentication, QueryTokenJWTAuthentication]
+    renderer_classes = [FastJSONRenderer, events.EventStreamRenderer]
+
+    def get(self, request):
+        channels = events.channels_for(request.user, auth_context(request))
+        last = events.get_backend().last()
+        try:
+            after = int(request.query_params.get('after') or request.headers['Last-Event-ID'])
+        except (KeyError, ValueError):
+            # New subscribers start from now.
+            after = last
+        # An id from before a restart of the hub must not hide newer events.
+        after = min(after, last)
+
+        if request.query_params.get('mode') == 'poll':
+            found = events.poll(channels, after, getattr(settings, 'STORE_EVENTS_POLL_TIMEOUT', 25))
+            return Response({
+                "events": [dict(event, id=seq) for seq, event in found],
+                "last": found[-1][0] if found else after,
+            })
+
+        duration = getattr(settings, 'STORE_EVENTS_STREAM_SECONDS', 300)
+        if isinstance(request._request, ASGIRequest):
+            body = events.astream(channels, after, duration)
+        else:
+            body = events.stream(channels, after, duration)
+        response = StreamingHttpResponse(body, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keep nginx from buffering the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 class WorkerRegistrationView(APIView):
     permission_classes = [IsAdminUser]
 
@@ -189,17 +458,10 @@ class WorkerRegistrationView(APIView):
                 email=email,
                 password=password,
                 first_name=first_name,
-                last_name=last_name
+                last_name=last_name,
+                is_staff=True
             )
-            user.is_staff = True
-            user.save()
-
-            if hasattr(user, 'profile'):
-                user.profile.role = 'Supplier'
-                user.profile.is_approved = False
-                user.profile.save()
-            else:
-                Profile.objects.create(user=user, role='Supplier', is_approved=False)
+            Profile.objects.for_user(user).update(role='Supplier', is_approved=False)
 
             return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
         except Exception as e:
@@ -210,22 +472,21 @@ class WorkerApprovalView(APIView):
 
     def post(self, request, pk):
         try:
-            user = User.objects.get(pk=pk)
+            user = User.objects.select_related('profile').get(pk=pk)
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
         action = request.data.get('action')
+        profile = Profile.objects.for_user(user)
 
-        if not hasattr(user, 'profile') or user.profile.role != 'Supplier':
+        if profile.role != 'Supplier':
             return Response({'error': 'User is not a supplier or has no profile'}, status=status.HTTP_400_BAD_REQUEST)
 
         if action == 'approve':
-            user.profile.is_approved = True
-            user.profile.save()
+            profile.update(is_approved=True)
             return Response({'detail': 'Supplier approved successfully'}, status=status.HTTP_200_OK)
         elif action == 'reject':
-            user.profile.is_approved = False
-            user.profile.save()
+            profile.update(is_approved=False)
             return Response({'detail': 'Supplier rejected successfully'}, status=status.HTTP_200_OK)
         else:
             return Response({'error': 'Invalid action. Must be "approve" or "reject"'}, status=status.HTTP_400_BAD_REQUEST)
@@ -241,7 +502,7 @@ class UserProfileUpdateView(RetrieveUpdateAPIView):
         user = serializer.save()
         profile_data = self.request.data.get('profile', {})
         if profile_data:
-            profile_serializer = ProfileSerializer(user.profile, data=profile_data, partial=True)
+            profile_serializer = ProfileSerializer(Profile.objects.for_user(user), data=profile_data, partial=True)
             profile_serializer.is_valid(raise_exception=True)
             profile_serializer.save()
 
@@ -256,8 +517,8 @@ class ChangePasswordView(APIView):
         if not user.check_password(old_password):
             return Response({'old_password': ['Wrong password.']}, status=status.HTTP_400_BAD_REQUEST)
 
-        user.password = make_password(new_password)
-        user.save()
+        user.set_password(new_password)
+        user.save(update_fields=['password'])
         return Response({'detail': 'Password updated successfully'}, status=status.HTTP_200_OK)
 
 class SupplierRequestView(APIView):
@@ -270,30 +531,34 @@ class SupplierRequestView(APIView):
         if not age:
             return Response({'error': 'Age is required for supplier request.'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if not hasattr(user, 'profile'):
-            Profile.objects.create(user=user)
+        profile = Profile.objects.for_user(user)
 
-        if user.profile.role == 'Supplier':
+        if profile.role == 'Supplier':
             return Response({'detail': 'You are already a supplier.'}, status=status.HTTP_200_OK)
         
-        if user.profile.role == 'Admin':
+        if profile.role == 'Admin':
             return Response({'detail': 'Admins cannot request supplier status.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        user.profile.role = 'Supplier'
-        user.profile.is_approved = False
-        user.profile.age = age
-        user.profile.save()
+        profile.update(role='Supplier', is_approved=False, age=age)
 
         return Response({'detail': 'Supplier request submitted successfully. Awaiting admin approval.'}, status=status.HTTP_200_OK)
 
 class UserListView(ListAPIView):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('profile')
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = UserCursorPagination
 
 class UserDeleteView(APIView):
     permission_classes = [IsAdminUser]
 
+    def get(self, request, pk):
+        """Progress of the user's deletion."""
+        deletion = UserDeletion.objects.filter(user_id=pk).first()
+        if deletion is None:
+            return Response({'error': 'User is not being deleted'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(UserDeletionSerializer(deletion).data)
+
     def delete(self, request, pk):
         try:
             user = User.objects.get(pk=pk)
@@ -303,5 +568,12 @@ class UserDeleteView(APIView):
         if user.is_superuser:
             return Response({'error': 'Cannot delete superuser'}, status=status.HTTP_403_FORBIDDEN)
 
-        user.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        # A supplier's products and orders can take a while to go, so the
+        # account is locked out now and purged in batches by a background
+        # task (store.deletion). Repeating the request resumes a stalled purge.
+        with transaction.atomic():
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+            deletion, _ = UserDeletion.objects.get_or_create(user_id=user.pk, defaults={'username': user.username})
+            tasks.delete_user.delay(user.pk)
+        return Response(UserDeletionSerializer(deletion).data, status=status.HTTP_202_ACCEPTED)